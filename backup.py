@@ -0,0 +1,618 @@
+"""Резервные копии справочников
+
+Копия пишется потоково, страница за страницей, в формате NDJSON — одна JSON-запись на строку:
+    {"metadata": {...}}              заголовок
+    {"table": "works"}               начало таблицы
+    {"row": {...}}                   строки таблицы
+    {"manifest": {"works": {"rows": 123, "sha256": "...", "hashes": {...}}, ...}}
+                                     итог: число строк, контрольная сумма и хэши строк по ключу
+
+Разностная копия ("type": "diff" в заголовке, "parent" — путь к предыдущей копии, "parent_sha256" — хэш
+ее манифеста, по нему видно, что предыдущую копию подменили) вместо "row" содержит
+{"upsert": {...}} для новых и измененных строк и {"delete": "ключ"} для удаленных, а в манифесте — хэши
+только этих строк (null у удаленных). Состояние восстанавливается по цепочке: полная копия и разностные по порядку.
+
+Строки не копятся в памяти, она растет только на хэши строк для манифеста.
+Файлы .gz сжимаются gzip, .zst — zstd (если установлен пакет zstandard). Читаются и новые копии, и старые (один JSON-объект с таблицами).
+
+Восстановление разбито на шаги (очистка таблицы, вставка, обновление или удаление части строк). Группы работ и материалов
+независимы и восстанавливаются параллельно, шаги внутри группы идут по порядку внешних ключей.
+Неудавшиеся шаги повторяются, а то, что не прошло и после повторов, можно дозапустить позже.
+Атомарный режим (restore_atomic) складывает строки на сервер и заменяет таблицы одной транзакцией.
+Разностный (diff_restore_plan) сравнивает копию с таблицами и пишет только отличающиеся строки.
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import getters
+import setters
+from catalog_cache import catalog_cache
+
+BACKUP_VERSION = "2.1"
+
+# Группы выгружаются целиком, таблицы внутри группы — в порядке внешних ключей
+BACKUP_GROUPS = {
+    'works': ['works_categories', 'works', 'sections', 'section_work_category_relations'],
+    'materials': ['materials_categories', 'materials'],
+}
+
+# Хэш строки в манифесте укорочен: он нужен, чтобы заметить изменение, а не для защиты от подделки
+ROW_HASH_LENGTH = 16
+
+# Строк в одном запросе вставки: крупные пакеты упираются в размер запроса и statement_timeout
+RESTORE_CHUNK_SIZE = 500
+RESTORE_RETRIES = 3
+RESTORE_RETRY_DELAY = 0.5
+# При атомарном восстановлении части только складываются на сервер, поэтому они крупнее
+ATOMIC_CHUNK_SIZE = 5000
+
+RestoreStep = namedtuple('RestoreStep', ['group', 'name_of_table', 'action', 'rows'])
+RestoreResult = namedtuple('RestoreResult', ['rows', 'seconds', 'pending', 'errors'])
+
+
+class BackupError(Exception):
+    """Файл резервной копии поврежден или в неизвестном формате"""
+
+
+class BackupCancelled(Exception):
+    """Выгрузка отменена пользователем"""
+
+
+def zstd_available():
+    try:
+        import zstandard
+    except ImportError:
+        return False
+
+    return True
+
+
+def open_backup(file_path, mode='r'):
+    """Открывает файл копии как текст, сжатие выбирается по расширению (.gz, .zst)"""
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, mode + 't', encoding='utf-8')
+
+    if file_path.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise BackupError("Для файлов .zst нужен пакет zstandard")
+
+        raw = open(file_path, mode + 'b')
+        if mode == 'w':
+            stream = zstandard.ZstdCompressor().stream_writer(raw)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw)
+
+        return io.TextIOWrapper(stream, encoding='utf-8')
+
+    return open(file_path, mode, encoding='utf-8')
+
+
+def row_to_json(row):
+    """Каноническая запись строки: по ней же считается контрольная сумма"""
+    return json.dumps(row, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+def row_hash(row):
+    return hashlib.sha256(row_to_json(row).encode('utf-8')).hexdigest()[:ROW_HASH_LENGTH]
+
+
+def row_key(name_of_table, row):
+    """Ключ строки в манифесте: id, а у связей — пара раздел:категория"""
+    if name_of_table == 'section_work_category_relations':
+        return f"{row['section_id']}:{row['category_id']}"
+
+    return str(row['id'])
+
+
+def table_sort_column(name_of_table):
+    return 'section_id' if name_of_table == 'section_work_category_relations' else 'id'
+
+
+def table_sort_key(name_of_table):
+    if name_of_table == 'section_work_category_relations':
+        return lambda row: (row['section_id'], row['category_id'])
+
+    return lambda row: row['id']
+
+
+def write_record(file, record):
+    file.write(json.dumps(record, ensure_ascii=False))
+    file.write('\n')
+
+
+def write_backup(supabase, file_path, groups, progress=None, is_cancelled=None, previous_path=None):
+    """Выгружает группы таблиц в файл по мере загрузки страниц, возвращает манифест
+
+    С previous_path пишется разностная копия: только строки, добавленные и измененные после
+    previous_path (полной или разностной копии), и ключи удаленных строк.
+    progress(name_of_table, rows) вызывается после каждой страницы. При отмене или ошибке
+    недописанный файл удаляется.
+    """
+    tables = [name_of_table for group in groups for name_of_table in BACKUP_GROUPS[group]]
+    metadata = {
+        'backup_date': datetime.now().isoformat(),
+        'version': BACKUP_VERSION,
+        'tables': list(groups),
+        'type': 'full'
+    }
+
+    previous = None
+    if previous_path is not None:
+        chain = backup_chain(previous_path)
+        previous = chain_hashes(chain)
+        missing = [name_of_table for name_of_table in tables if name_of_table not in previous]
+        if missing:
+            raise BackupError(f"В предыдущей копии нет таблиц: {', '.join(missing)}")
+        metadata.update({
+            'type': 'diff',
+            # Путь к предыдущей копии относительно этой: цепочку можно переносить целой папкой
+            'parent': os.path.relpath(os.path.abspath(previous_path), os.path.dirname(os.path.abspath(file_path))),
+            'parent_sha256': manifest_digest(read_manifest(previous_path)),
+            'base': os.path.basename(chain[0])
+        })
+
+    manifest = {}
+
+    try:
+        with open_backup(file_path, 'w') as file:
+            write_record(file, {'metadata': metadata})
+
+            for name_of_table in tables:
+                write_record(file, {'table': name_of_table})
+                digest = hashlib.sha256()
+                old_hashes = previous[name_of_table] if previous is not None else None
+                # У полной копии — хэши всех строк, у разностной — только измененных (None — строка удалена)
+                hashes = {}
+                records = 0
+                rows = 0
+
+                for page in getters.iter_table_pages(supabase, name_of_table, table_sort_column(name_of_table)):
+                    for row in page:
+                        key = row_key(name_of_table, row)
+                        hash_value = row_hash(row)
+                        if old_hashes is None:
+                            line = row_to_json(row)
+                            file.write(f'{{"row": {line}}}\n')
+                        elif old_hashes.pop(key, None) != hash_value:
+                            line = row_to_json({'upsert': row})
+                            file.write(f'{line}\n')
+                        else:
+                            continue
+
+                        digest.update(line.encode('utf-8'))
+                        hashes[key] = hash_value
+                        records += 1
+                    rows += len(page)
+
+                    if is_cancelled is not None and is_cancelled():
+                        raise BackupCancelled()
+                    if progress is not None:
+                        progress(name_of_table, rows)
+
+                # Строки предыдущей копии, которых не оказалось в таблице, удалены
+                for key in old_hashes or ():
+                    line = row_to_json({'delete': key})
+                    file.write(f'{line}\n')
+                    digest.update(line.encode('utf-8'))
+                    hashes[key] = None
+                    records += 1
+
+                manifest[name_of_table] = {'rows': records, 'sha256': digest.hexdigest(), 'hashes': hashes}
+
+            write_record(file, {'manifest': manifest})
+
+    except BaseException:
+        # Оборванная копия хуже отсутствующей: ее могут принять за полную
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+
+    return manifest
+
+
+def iter_backup(file_path):
+    """Читает копию нового формата: отдает ('metadata', dict), ('row', (таблица, строка)),
+    ('upsert', (таблица, строка)), ('delete', (таблица, ключ)) и ('manifest', dict)
+
+    Число записей и контрольные суммы сверяются с манифестом в конце файла.
+    """
+    digests = {}
+    counts = {}
+    current_table = None
+
+    with open_backup(file_path) as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise BackupError(f"Строка {line_number} повреждена")
+
+            kind = next((kind for kind in ('row', 'upsert', 'delete') if kind in record), None)
+            if kind is not None:
+                if current_table is None:
+                    raise BackupError(f"Строка {line_number}: данные вне таблицы")
+                value = record[kind]
+                digests[current_table].update(row_to_json(value if kind == 'row' else record).encode('utf-8'))
+                counts[current_table] += 1
+                yield kind, (current_table, value)
+
+            elif 'table' in record:
+                current_table = record['table']
+                digests[current_table] = hashlib.sha256()
+                counts[current_table] = 0
+
+            elif 'metadata' in record:
+                yield 'metadata', record['metadata']
+
+            elif 'manifest' in record:
+                manifest = record['manifest']
+                for name_of_table, expected in manifest.items():
+                    if counts.get(name_of_table) != expected['rows']:
+                        raise BackupError(f"Таблица {name_of_table}: ожидалось строк {expected['rows']}, "
+                                          f"прочитано {counts.get(name_of_table, 0)}")
+                    if digests[name_of_table].hexdigest() != expected['sha256']:
+                        raise BackupError(f"Таблица {name_of_table}: контрольная сумма не совпадает")
+                yield 'manifest', manifest
+                return
+
+    raise BackupError("Файл оборван: нет манифеста в конце")
+
+
+def is_legacy_backup(file_path):
+    """Старая копия — один JSON-объект, новая начинается со строки-заголовка {"metadata": ...}"""
+    with open_backup(file_path) as file:
+        first_line = file.readline()
+
+    try:
+        record = json.loads(first_line)
+    except ValueError:
+        return True
+
+    return set(record) != {'metadata'}
+
+
+def read_metadata(file_path):
+    if is_legacy_backup(file_path):
+        with open_backup(file_path) as file:
+            return json.load(file).get('metadata', {})
+
+    with open_backup(file_path) as file:
+        return json.loads(file.readline())['metadata']
+
+
+def load_backup(file_path):
+    """Загружает полную копию любого формата в словарь {'metadata': ..., таблица: [строки]}"""
+    if is_legacy_backup(file_path):
+        with open_backup(file_path) as file:
+            return json.load(file)
+
+    data = {}
+    for kind, value in iter_backup(file_path):
+        if kind == 'row':
+            name_of_table, row = value
+            data.setdefault(name_of_table, []).append(row)
+        elif kind == 'metadata':
+            if value.get('type') == 'diff':
+                raise BackupError("Это разностная копия, ее нужно загружать вместе с цепочкой")
+            data['metadata'] = value
+            for group in value.get('tables', []):
+                for name_of_table in BACKUP_GROUPS.get(group, []):
+                    data[name_of_table] = []
+        elif kind == 'manifest':
+            data['metadata']['manifest'] = value
+
+    return data
+
+
+def backup_chain(file_path):
+    """Файлы цепочки: полная копия и все разностные после нее вплоть до file_path"""
+    chain = [file_path]
+    metadata = read_metadata(file_path)
+    while metadata.get('type') == 'diff':
+        parent = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(chain[-1])), metadata['parent']))
+        if not os.path.exists(parent):
+            raise BackupError(f"Не найдена предыдущая копия цепочки: {metadata['parent']}")
+        if parent in chain:
+            raise BackupError("Цепочка копий замкнута сама на себя")
+        expected = metadata.get('parent_sha256')
+        if expected is None:
+            raise BackupError(f"В разностной копии нет хэша предыдущей копии: {os.path.basename(chain[-1])}")
+        if manifest_digest(read_manifest(parent)) != expected:
+            raise BackupError(f"Предыдущая копия цепочки заменена другой: {metadata['parent']}")
+        chain.append(parent)
+        metadata = read_metadata(parent)
+
+    chain.reverse()
+
+    return chain
+
+
+def read_manifest(file_path):
+    """Манифест копии; для старых копий без манифеста хэши строк считаются по самим строкам"""
+    if is_legacy_backup(file_path):
+        data = load_backup(file_path)
+        return {
+            name_of_table: {'hashes': {row_key(name_of_table, row): row_hash(row) for row in rows}}
+            for name_of_table, rows in data.items() if name_of_table != 'metadata'
+        }
+
+    for kind, value in iter_backup(file_path):
+        if kind == 'manifest':
+            return value
+
+
+def manifest_digest(manifest):
+    """Хэш манифеста копии: разностная копия запоминает его у предыдущей"""
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def chain_hashes(chain):
+    """Хэши строк на момент последней копии цепочки: хэши полной копии, обновленные разностными"""
+    hashes = {}
+    for file_path in chain:
+        for name_of_table, table in read_manifest(file_path).items():
+            table_hashes = hashes.setdefault(name_of_table, {})
+            for key, value in table.get('hashes', {}).items():
+                if value is None:
+                    table_hashes.pop(key, None)
+                else:
+                    table_hashes[key] = value
+
+    return hashes
+
+
+def load_backup_chain(file_path):
+    """Загружает состояние на момент file_path: полная копия и поверх нее по очереди все разностные"""
+    chain = backup_chain(file_path)
+    data = load_backup(chain[0])
+    if len(chain) == 1:
+        return data
+
+    tables = {
+        name_of_table: {row_key(name_of_table, row): row for row in rows}
+        for name_of_table, rows in data.items() if name_of_table != 'metadata'
+    }
+    metadata = data['metadata']
+
+    for diff_path in chain[1:]:
+        for kind, value in iter_backup(diff_path):
+            if kind == 'upsert':
+                name_of_table, row = value
+                tables.setdefault(name_of_table, {})[row_key(name_of_table, row)] = row
+            elif kind == 'delete':
+                name_of_table, key = value
+                tables.get(name_of_table, {}).pop(key, None)
+            elif kind == 'metadata':
+                metadata = value
+
+    result = {'metadata': {
+        'backup_date': metadata['backup_date'],
+        'version': metadata.get('version'),
+        'tables': data['metadata'].get('tables', []),
+        'chain': [os.path.basename(path) for path in chain]
+    }}
+    for name_of_table, rows in tables.items():
+        result[name_of_table] = sorted(rows.values(), key=table_sort_key(name_of_table))
+
+    return result
+
+
+def restore_plan(data, groups, chunk_size=RESTORE_CHUNK_SIZE):
+    """Шаги восстановления по группам: сначала очистка от зависимых таблиц к главным, затем вставка частями"""
+    plan = {}
+    for group in groups:
+        tables = BACKUP_GROUPS[group]
+        steps = [RestoreStep(group, name_of_table, 'clear', None) for name_of_table in reversed(tables)]
+        for name_of_table in tables:
+            rows = data[name_of_table]
+            for start in range(0, len(rows), chunk_size):
+                steps.append(RestoreStep(group, name_of_table, 'insert', rows[start:start + chunk_size]))
+        plan[group] = steps
+
+    return plan
+
+
+def diff_restore_plan(supabase, data, groups, chunk_size=RESTORE_CHUNK_SIZE, is_cancelled=None):
+    """Шаги, которые приводят таблицы к копии, трогая только отличающиеся строки
+
+    Текущие таблицы читаются постранично и сравниваются с копией по ключу и хэшу строки. Сначала идут
+    вставки и обновления от главных таблиц к зависимым, затем удаления в обратном порядке.
+    Связи разделов с категориями сравниваются по паре раздел:категория: их только добавляют и удаляют.
+    """
+    plan = {}
+    for group in groups:
+        upserts = []
+        deletes = []
+        for name_of_table in BACKUP_GROUPS[group]:
+            expected = {row_key(name_of_table, row): row for row in data[name_of_table]}
+            is_relations = name_of_table == 'section_work_category_relations'
+            changed = []
+            removed = []
+
+            for page in getters.iter_table_pages(supabase, name_of_table, table_sort_column(name_of_table)):
+                if is_cancelled is not None and is_cancelled():
+                    raise BackupCancelled()
+
+                for row in page:
+                    key = row_key(name_of_table, row)
+                    backup_row = expected.pop(key, None)
+                    if backup_row is None:
+                        removed.append(row if is_relations else row['id'])
+                    elif not is_relations and row_hash(backup_row) != row_hash(row):
+                        changed.append(backup_row)
+
+            # Чего нет в таблице, того, что осталось от копии, — добавить
+            changed.extend(expected.values())
+
+            for start in range(0, len(changed), chunk_size):
+                upserts.append(RestoreStep(group, name_of_table, 'upsert', changed[start:start + chunk_size]))
+            for start in range(0, len(removed), chunk_size):
+                deletes.append(RestoreStep(group, name_of_table, 'delete', removed[start:start + chunk_size]))
+
+        # Удаления идут от зависимых таблиц к главным
+        deletes.sort(key=lambda step: -BACKUP_GROUPS[group].index(step.name_of_table))
+        plan[group] = upserts + deletes
+
+    return plan
+
+
+def plan_rows(plan):
+    return sum(len(step.rows) for steps in plan.values() for step in steps if step.action != 'clear')
+
+
+def run_step(supabase, step):
+    is_relations = step.name_of_table == 'section_work_category_relations'
+
+    if step.action == 'clear':
+        if is_relations:
+            setters.clear_relations_table(supabase, step.name_of_table)
+        else:
+            setters.clear_table(supabase, step.name_of_table)
+
+    elif step.action == 'insert':
+        # Части пишутся с id из копии, поэтому повтор после обрыва связи не создает дублей
+        setters.restore_rows(supabase, step.name_of_table, step.rows)
+
+    elif step.action == 'upsert':
+        # Та же функция, что и при вставке: строки с явными id сдвигают последовательность id таблицы,
+        # и следующие записи из приложения не упираются в занятые id
+        setters.restore_rows(supabase, step.name_of_table, step.rows)
+
+    elif step.action == 'delete':
+        if is_relations:
+            # Связи удаляются по разделу: один запрос на раздел со списком его категорий
+            category_ids = {}
+            for relation in step.rows:
+                category_ids.setdefault(relation['section_id'], []).append(relation['category_id'])
+            for section_id, ids in category_ids.items():
+                setters.delete_relations(supabase, section_id, ids)
+        else:
+            setters.delete_rows_by_ids(supabase, step.name_of_table, step.rows)
+
+
+def call_with_retries(fn, description, retries=RESTORE_RETRIES):
+    """Вызывает fn, при ошибке повторяет с нарастающей паузой; после последней попытки пробрасывает ошибку"""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            print(f"Не удалось выполнить шаг восстановления {description} (попытка {attempt + 1}): {e}")
+            if attempt == retries:
+                raise
+            time.sleep(RESTORE_RETRY_DELAY * 2 ** attempt)
+
+
+def check_restore_rows(supabase, retries=RESTORE_RETRIES):
+    """Проверяет, что на сервере есть функция restore_rows: без нее очистка прошла бы, а вставка — нет"""
+    try:
+        call_with_retries(lambda: setters.check_restore_rows(supabase), 'restore_rows', retries)
+    except Exception as e:
+        raise BackupError(
+            "Функция restore_rows недоступна на сервере. Выполните sql/restore_catalog.sql в SQL Editor "
+            f"проекта Supabase. Данные не изменены.\n{e}"
+        )
+
+
+def run_restore(supabase, plan, progress=None, is_cancelled=None, retries=RESTORE_RETRIES):
+    """Выполняет план: группы параллельно, шаги группы по порядку, каждый шаг с повторами
+
+    progress(rows_done, rows_total, rows_per_second) вызывается после каждой записанной части.
+    Если шаг не прошел и после повторов (или восстановление отменили), группа останавливается,
+    а ее оставшиеся шаги возвращаются в RestoreResult.pending — их можно передать в run_restore снова.
+    До первого шага проверяется функция restore_rows (BackupError, если ее нет), так что без нее
+    ни одна таблица не очищается.
+    """
+    if any(step.action in ('insert', 'upsert') for steps in plan.values() for step in steps):
+        check_restore_rows(supabase, retries)
+
+    total = plan_rows(plan)
+    started = time.monotonic()
+    done = [0]
+    done_lock = threading.Lock()
+    pending = {}
+    errors = []
+
+    def run_group(group, steps):
+        for number, step in enumerate(steps):
+            if is_cancelled is not None and is_cancelled():
+                pending[group] = steps[number:]
+                return
+
+            try:
+                call_with_retries(lambda: run_step(supabase, step), step.name_of_table, retries)
+            except Exception as e:
+                errors.append(f"{step.name_of_table}: {e}")
+                pending[group] = steps[number:]
+                return
+
+            if step.action != 'clear':
+                with done_lock:
+                    done[0] += len(step.rows)
+                    rows_done = done[0]
+                if progress is not None:
+                    progress(rows_done, total, rows_done / max(time.monotonic() - started, 1e-6))
+
+    # Подписчики кэша (локальная копия, справочники сметы) перечитают таблицы плана один раз, а не после каждой части
+    tables = {step.name_of_table for steps in plan.values() for step in steps}
+    with catalog_cache.hold_notifications(tables):
+        with ThreadPoolExecutor(max_workers=max(len(plan), 1)) as executor:
+            futures = [executor.submit(run_group, group, steps) for group, steps in plan.items() if steps]
+            for future in futures:
+                future.result()
+
+    return RestoreResult(done[0], time.monotonic() - started, pending, errors)
+
+
+def restore_atomic(supabase, data, groups, chunk_size=ATOMIC_CHUNK_SIZE, progress=None, is_cancelled=None,
+                   retries=RESTORE_RETRIES):
+    """Восстанавливает группы целиком или никак: строки складываются на сервер, затем одна транзакция
+
+    Нужны таблица restore_staging и функция commit_restore из sql/restore_catalog.sql.
+    Если что-то пошло не так до commit_restore, данные в базе не меняются.
+    """
+    restore_id = str(uuid.uuid4())
+    tables = [name_of_table for group in groups for name_of_table in BACKUP_GROUPS[group]]
+    total = sum(len(data[name_of_table]) for name_of_table in tables)
+    started = time.monotonic()
+    done = 0
+
+    try:
+        for name_of_table in tables:
+            rows = data[name_of_table]
+            for chunk, start in enumerate(range(0, len(rows), chunk_size)):
+                if is_cancelled is not None and is_cancelled():
+                    raise BackupCancelled()
+
+                part = rows[start:start + chunk_size]
+                call_with_retries(
+                    lambda: setters.stage_restore_rows(supabase, restore_id, name_of_table, chunk, part),
+                    name_of_table, retries
+                )
+
+                done += len(part)
+                if progress is not None:
+                    progress(done, total, done / max(time.monotonic() - started, 1e-6))
+
+        setters.commit_restore(supabase, restore_id, groups)
+
+    except BaseException:
+        try:
+            setters.discard_restore(supabase, restore_id)
+        except Exception as e:
+            print(f"Не удалось удалить загруженные части восстановления: {e}")
+        raise
+
+    return RestoreResult(done, time.monotonic() - started, {}, [])
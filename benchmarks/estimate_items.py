@@ -0,0 +1,117 @@
+"""Сравнение памяти и скорости прохода по смете: старые элементы со словарем атрибутов и элементы со __slots__
+
+Запуск из корня проекта: python benchmarks/estimate_items.py [число работ] [материалов на работу]
+"""
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from design.classes import MaterialItem, SectionItem, WorkItem
+
+
+class DictMaterialItem:
+    def __init__(self):
+        self.name = ""
+        self.unit = ""
+        self.quantity = 0.0
+        self.price = 0.0
+        self.total = 0.0
+        self.row = 0
+
+
+class DictWorkItem:
+    def __init__(self):
+        self.name = ""
+        self.unit = ""
+        self.quantity = 0.0
+        self.labor_cost = 0.0
+        self.total_work = 0.0
+        self.materials = [DictMaterialItem()]
+        self.row = 0
+        self.number = 0
+        self.height = 1
+        self.total_materials = 0.0
+
+
+class DictSectionItem:
+    def __init__(self):
+        self.name = ""
+        self.works = []
+        self.total = 0.0
+        self.row = 0
+        self.height = 0
+
+
+def build_estimate(section_cls, work_cls, material_cls, works_count, materials_per_work):
+    estimate = [section_cls() for _ in range(10)]
+    for i in range(works_count):
+        section = estimate[i % len(estimate)]
+        work = work_cls()
+        work.name = f"Работа {i}"
+        work.quantity = float(i % 7 + 1)
+        work.labor_cost = float(i % 500) + 0.5
+        work.total_work = round(work.quantity * work.labor_cost, 2)
+        for _ in range(materials_per_work - 1):
+            work.materials.append(material_cls())
+        for j, material in enumerate(work.materials):
+            material.name = f"Материал {i}-{j}"
+            material.quantity = float(j + 1)
+            material.price = float(i % 300) + 0.25
+            material.total = round(material.quantity * material.price, 2)
+        work.height = len(work.materials)
+        section.works.append(work)
+        section.height += work.height
+
+    return estimate
+
+
+def full_pass(estimate):
+    works_sum = 0.0
+    materials_sum = 0.0
+    for section in estimate:
+        for work in section.works:
+            works_sum += work.total_work
+            for material in work.materials:
+                materials_sum += material.total
+
+    return works_sum, materials_sum
+
+
+def measure(title, classes, works_count, materials_per_work):
+    tracemalloc.start()
+    estimate = build_estimate(*classes, works_count, materials_per_work)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    lines = sum(section.height for section in estimate)
+
+    # Минимум из повторов: остальные замеры отличаются от него только помехами системы
+    result = full_pass(estimate)
+    elapsed = min(timeit.repeat(lambda: full_pass(estimate), number=5, repeat=7)) / 5
+
+    print(f"{title}: {memory / lines:.0f} байт на строку, полный проход {elapsed * 1000:.1f} мс")
+
+    return memory, elapsed, result
+
+
+def main():
+    works_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    materials_per_work = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    print(f"Работ: {works_count}, материалов на работу: {materials_per_work}")
+    old_memory, old_time, old_result = measure(
+        "Со словарем атрибутов", (DictSectionItem, DictWorkItem, DictMaterialItem), works_count, materials_per_work
+    )
+    new_memory, new_time, new_result = measure(
+        "Со __slots__", (SectionItem, WorkItem, MaterialItem), works_count, materials_per_work
+    )
+
+    assert old_result == new_result
+    print(f"Память: {(new_memory / old_memory - 1) * 100:+.0f}%, проход: {(new_time / old_time - 1) * 100:+.0f}%")
+
+
+if __name__ == '__main__':
+    main()
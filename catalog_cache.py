@@ -0,0 +1,221 @@
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+DEFAULT_TTL = 300
+
+
+def copy_rows(data):
+    """Копия списков и словарей ответа: вызывающий может менять строки, не портя кэш для остальных"""
+    if isinstance(data, list):
+        # Строки одного ответа устроены одинаково: если в первой нет вложенных списков, копируем быстро
+        first = data[0] if data else None
+        if isinstance(first, dict) and not any(isinstance(value, (list, dict)) for value in first.values()):
+            return [dict(row) for row in data]
+        return [copy_rows(item) for item in data]
+    if isinstance(data, dict):
+        return {key: copy_rows(value) for key, value in data.items()}
+
+    return data
+
+
+class CatalogCache:
+    """Кэш справочников в памяти процесса: ключ — таблицы и параметры запроса
+
+    Кэш хранит собственную копию данных и каждому вызывающему отдает новую копию.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = {}
+        self._in_flight = {}
+        self._generation = 0
+        self._listeners = []
+        # Пока идет пакетная запись, подписчики узнают об изменении ее таблиц не сразу, а один раз в конце
+        self._held = {}
+        self._held_tables = set()
+        self._lock = threading.Lock()
+
+    def get_or_load(self, tables, key, loader):
+        """Возвращает данные из кэша или загружает их через loader"""
+        tables = tuple(tables)
+        cache_key = (tables, key)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.hits += 1
+                data = entry[1]
+            else:
+                data = None
+                self.misses += 1
+            generation = self._generation
+
+        if data is not None:
+            return copy_rows(data)
+
+        flight, is_leader = self.start_flight(tables, key)
+        if not is_leader:
+            # Такой же запрос уже выполняется: ждем его ответа вместо второго похода в сеть
+            data = flight.result()
+            if data is not None:
+                return copy_rows(data)
+            # Выполнявший запрос поток бросил его на полпути — загружаем сами
+            return loader()
+
+        try:
+            data = loader()
+        except Exception as e:
+            self.finish_flight(tables, key, flight, error=e)
+            raise
+
+        stored = copy_rows(data)
+        with self._lock:
+            # Если за время загрузки таблицу изменили, ответ уже устарел
+            if generation == self._generation:
+                self._entries[cache_key] = (now, stored)
+
+        # Ждущим достается общая копия, каждый из них копирует ее себе
+        self.finish_flight(tables, key, flight, stored)
+
+        return data
+
+    def start_flight(self, tables, key):
+        """Регистрирует выполняющийся запрос; возвращает (Future, True), если запрос нужно выполнить самому,
+        или (Future уже идущего такого же запроса, False)"""
+        cache_key = (tuple(tables), key)
+
+        with self._lock:
+            flight = self._in_flight.get(cache_key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+
+            flight = Future()
+            self._in_flight[cache_key] = flight
+
+        return flight, True
+
+    def finish_flight(self, tables, key, flight, data=None, error=None):
+        """Отдает результат (или ошибку) всем, кто ждал этот запрос"""
+        cache_key = (tuple(tables), key)
+
+        with self._lock:
+            # После сброса кэша на этом ключе мог начаться новый запрос, его не трогаем
+            if self._in_flight.get(cache_key) is flight:
+                del self._in_flight[cache_key]
+
+        if error is not None:
+            flight.set_exception(error)
+        else:
+            flight.set_result(data)
+
+    @property
+    def generation(self):
+        """Номер поколения: меняется при каждом сбросе"""
+        return self._generation
+
+    def get(self, tables, key):
+        """Возвращает данные из кэша или None, если их нет или они устарели"""
+        cache_key = (tuple(tables), key)
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self.hits += 1
+                data = entry[1]
+            else:
+                self.misses += 1
+                return None
+
+        return copy_rows(data)
+
+    def put(self, tables, key, data, generation=None):
+        """Кладет в кэш данные, загруженные в обход get_or_load"""
+        data = copy_rows(data)
+        with self._lock:
+            if generation is None or generation == self._generation:
+                self._entries[(tuple(tables), key)] = (time.monotonic(), data)
+
+    def add_listener(self, callback):
+        """Подписывает callback(name_of_table) на сброс кэша после записи"""
+        self._listeners.append(callback)
+
+    def invalidate(self, name_of_table=None):
+        """Сбрасывает записи, зависящие от таблицы (или весь кэш)"""
+        with self._lock:
+            self._generation += 1
+            if name_of_table is None:
+                self._entries.clear()
+                self._in_flight.clear()
+            else:
+                for cache_key in [k for k in self._entries if name_of_table in k[0]]:
+                    del self._entries[cache_key]
+                # Запросы, начатые до записи, дорабатывают для своих ждущих, но новые к ним не присоединяются
+                for cache_key in [k for k in self._in_flight if name_of_table in k[0]]:
+                    del self._in_flight[cache_key]
+
+            # Сброс всего кэша во время пакетной записи откладывается целиком
+            is_held = bool(self._held) if name_of_table is None else name_of_table in self._held
+            if is_held:
+                self._held_tables.add(name_of_table)
+                return
+
+        self._notify(name_of_table)
+
+    @contextmanager
+    def hold_notifications(self, tables):
+        """Внутри блока записи в tables сбрасывают кэш сразу, а подписчиков оповещают по разу на таблицу при выходе
+
+        Оповещения об остальных таблицах приходят как обычно.
+        """
+        held = set(tables)
+        with self._lock:
+            for name_of_table in held:
+                self._held[name_of_table] = self._held.get(name_of_table, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                for name_of_table in held:
+                    self._held[name_of_table] -= 1
+                    if not self._held[name_of_table]:
+                        del self._held[name_of_table]
+
+                if self._held:
+                    tables = {name_of_table for name_of_table in self._held_tables
+                              if name_of_table is not None and name_of_table not in self._held}
+                else:
+                    tables = set(self._held_tables)
+                self._held_tables -= tables
+
+            # None — сброс всего кэша, он покрывает оповещения по отдельным таблицам
+            for name_of_table in ([None] if None in tables else sorted(tables)):
+                self._notify(name_of_table)
+
+    def _notify(self, name_of_table):
+        for callback in self._listeners:
+            try:
+                callback(name_of_table)
+            except Exception as e:
+                print(f"Ошибка обработчика сброса кэша: {e}")
+
+    def stats(self):
+        """Счетчики попаданий и промахов"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries': len(self._entries)
+            }
+
+
+catalog_cache = CatalogCache()
@@ -27,15 +27,39 @@ class MainWindow(QMainWindow):
         self.tabs = QTabWidget()
         main_layout.addWidget(self.tabs)
 
-        # Создаем страницы
+        # Создаем видимую страницу сразу, остальные — при первом открытии вкладки
         self.page_db = PageDB(supabase).create_page_db()
-        self.page_estimate = PageEstimate(supabase).create_page_estimate()
+        self.page_estimate = None
+
+        self.page_builders = {}
 
         # Добавляем страницы во вкладки
         self.tabs.addTab(self.page_db, "База данных")
-        self.tabs.addTab(self.page_estimate, "Смета")
+        self.add_lazy_tab("Смета", self.create_page_estimate)
+        self.tabs.currentChanged.connect(self.build_tab)
 
         self.setStyleSheet(TAB_STYLE)
 
         # Показываем окно в полноэкранном режиме
         self.showMaximized()
+
+    def add_lazy_tab(self, title, builder):
+        """Добавляет вкладку-заглушку, страница в ней строится при первом открытии"""
+        container = QWidget()
+        layout = QVBoxLayout(container)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        index = self.tabs.addTab(container, title)
+        self.page_builders[index] = builder
+
+    def build_tab(self, index):
+        builder = self.page_builders.pop(index, None)
+        if builder is None:
+            return
+
+        self.tabs.widget(index).layout().addWidget(builder())
+
+    def create_page_estimate(self):
+        self.page_estimate = PageEstimate(self.supabase).create_page_estimate()
+
+        return self.page_estimate
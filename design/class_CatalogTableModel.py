@@ -0,0 +1,124 @@
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+class CatalogTableModel(QAbstractTableModel):
+    """Модель таблицы справочника: значения хранятся по колонкам, ячейки считаются при отрисовке"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.column_order = []
+        self.header_names = {}
+        self.category_names = {}
+        self.columns = {}
+        self.row_count = 0
+        # Номера исходных строк, прошедших фильтр поиска (None — показываются все)
+        self.visible_rows = None
+
+    def set_rows(self, rows, column_order, header_names, category_names=None):
+        """Полностью заменяет содержимое модели"""
+        self.beginResetModel()
+        self.column_order = list(column_order)
+        self.header_names = header_names
+        self.category_names = category_names or {}
+        self.columns = {column: [row.get(column) for row in rows] for column in self.column_order}
+        self.row_count = len(rows)
+        self.visible_rows = None
+        self.endResetModel()
+
+    def append_rows(self, rows):
+        """Дописывает строки в конец модели"""
+        if not rows:
+            return
+
+        if self.visible_rows is not None:
+            # При активном фильтре видимые строки пересчитает следующий set_filter
+            for column in self.column_order:
+                self.columns[column].extend(row.get(column) for row in rows)
+            self.row_count += len(rows)
+            return
+
+        self.beginInsertRows(QModelIndex(), self.row_count, self.row_count + len(rows) - 1)
+        for column in self.column_order:
+            self.columns[column].extend(row.get(column) for row in rows)
+        self.row_count += len(rows)
+        self.endInsertRows()
+
+    def set_filter(self, visible_rows):
+        """Оставляет видимыми только указанные исходные строки (None — снять фильтр)"""
+        if visible_rows is None and self.visible_rows is None:
+            return
+
+        self.beginResetModel()
+        self.visible_rows = visible_rows
+        self.endResetModel()
+
+    def source_row(self, row):
+        """Номер исходной строки по номеру строки в таблице"""
+        return row if self.visible_rows is None else self.visible_rows[row]
+
+    def search_texts(self, start, columns):
+        """Тексты колонок для поискового индекса, начиная с исходной строки start"""
+        return [
+            " ".join(self.display_text(row, column) for column in columns)
+            for row in range(start, self.row_count)
+        ]
+
+    def clear(self):
+        self.set_rows([], [], {})
+
+    def row_data(self, row):
+        """Исходные значения строки таблицы в виде словаря"""
+        row = self.source_row(row)
+        return {column: values[row] for column, values in self.columns.items()}
+
+    def value(self, row, column):
+        return self.columns[column][self.source_row(row)]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return self.row_count if self.visible_rows is None else len(self.visible_rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.column_order)
+
+    def display_text(self, row, column):
+        """Текст ячейки исходной строки так, как его показывает таблица"""
+        value = self.columns[column][row]
+
+        if column == 'id':
+            return str(row + 1)
+        if column == 'category_id' and self.category_names:
+            return self.category_names.get(str(value), str(value))
+
+        return str(value)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+
+        column = self.column_order[index.column()]
+        row = self.source_row(index.row())
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.display_text(row, column)
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignCenter
+        if role == Qt.ItemDataRole.UserRole and column == 'category_id':
+            return self.columns[column][row]
+        if role == Qt.ItemDataRole.UserRole + 1 and column == 'id':
+            return self.columns[column][row]
+
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+
+        if orientation == Qt.Orientation.Horizontal:
+            if section < len(self.column_order):
+                return self.header_names.get(self.column_order[section], self.column_order[section])
+            return None
+
+        return str(section + 1)
@@ -1,4 +1,4 @@
-from PyQt6.QtCore import Qt, QPoint, QStringListModel, QLocale, QThread, pyqtSignal
+from PyQt6.QtCore import Qt, QPoint, QStringListModel, QLocale
 from PyQt6.QtWidgets import QSpinBox, QComboBox, QHBoxLayout, QWidget, QStyledItemDelegate, QVBoxLayout, QLineEdit, \
     QListWidget, QListWidgetItem, QDoubleSpinBox, QLabel
 from PyQt6.QtGui import QDoubleValidator, QValidator, QCursor, QMovie
@@ -6,6 +6,9 @@ from PyQt6.QtGui import QDoubleValidator, QValidator, QCursor, QMovie
 import getters
 import os
 from design.styles import DROPDOWN_DELEGATE_STYLE, SPIN_BOX_STYLE
+from design.tasks import task_runner, CancellationToken, PRIORITY_INTERACTIVE
+
+EDITOR_TASK_GROUP = "estimate_editor"
 
 
 class DoubleSpinBox(QDoubleSpinBox):
@@ -33,28 +36,12 @@ class DoubleSpinBox(QDoubleSpinBox):
         # return self.locale().toString(value, 'f', self.decimals())
         return f"{value:.{self.decimals()}f}".replace(',', '.')
 
-class DataLoaderThread(QThread):
-    data_loaded = pyqtSignal(object)
-
-
-    def __init__(self, load_func, *args):
-        super().__init__()
-        self.load_func = load_func
-        self.args = args
-
-    def run(self):
-        try:
-            result = self.load_func(*self.args)
-            self.data_loaded.emit(result)
-        except Exception as e:
-            print(f"Error in loader thread: {e}")
-            self.data_loaded.emit(None)
-
 
 class ComboBoxDelegate(QStyledItemDelegate):
-    def __init__(self, table_widget, supabase, main_window, model):
+    def __init__(self, table_widget, supabase, main_window, model, catalog=None):
         super().__init__(table_widget)
         self.supabase = supabase
+        self.catalog = catalog
         self.table = table_widget
         self.current_editor = None
         self.current_row = -1
@@ -68,6 +55,13 @@ class ComboBoxDelegate(QStyledItemDelegate):
         self.sub_list = None
         self.section_id = None
         self.model = model
+        self.loader_task = None
+        self.data = []
+        self.entities_by_id = {}
+        # Для каждой строки sub_list: категория, строка поиска и видна ли строка сейчас
+        self.sub_categories = []
+        self.sub_search_texts = []
+        self.sub_visible = []
 
     def commitAndClose(self, editor):
         """Сохраняет данные и закрывает редактор"""
@@ -84,9 +78,13 @@ class ComboBoxDelegate(QStyledItemDelegate):
         # self.loading_label.setMovie(self.loading_movie)
         # self.loading_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
 
-        section_index = self.model.find_section_by_row(self.current_row)
-        section_name = self.model.estimate[section_index].name
-        self.section_id = getters.get_section_by_name(self.supabase, section_name)
+        # id раздела берется из модели или из справочников в памяти; если их еще нет,
+        # название переводится в id уже в фоновой загрузке, а не здесь, в потоке интерфейса
+        section = self.model.estimate[self.model.find_section_by_row(self.current_row)]
+        section_name = section.name
+        if section.section_id is None and section_name and self.catalog is not None and self.catalog.is_loaded():
+            section.section_id = self.catalog.section_id_by_name(section_name)
+        self.section_id = section.section_id
 
         if self.table.columnSpan(index.row(), index.column()) > 10:
             editor = QWidget(parent, Qt.WindowType.Popup)
@@ -122,9 +120,14 @@ class ComboBoxDelegate(QStyledItemDelegate):
 
             self.sections_list = editor.sections_list
 
-            self.loader_worker = DataLoaderThread(self.load_initial_data)
-            self.loader_worker.data_loaded.connect(lambda: self.on_data_loaded(editor, index))
-            self.loader_worker.start()
+            # Открытый редактор ждет пользователь, поэтому его загрузка идет раньше остальных
+            token = CancellationToken()
+            self.loader_task = task_runner.submit(
+                self.fetch_initial_data, True, 0, None, None,
+                priority=PRIORITY_INTERACTIVE, group=EDITOR_TASK_GROUP, token=token,
+                on_result=lambda data: self.on_data_loaded(editor, index, data, token),
+                on_error=lambda message: self.on_data_loaded(editor, index, None, token)
+            )
 
             # self.load_initial_data()
 
@@ -203,9 +206,13 @@ class ComboBoxDelegate(QStyledItemDelegate):
                 self.sub_list = editor.sub_list
                 self.search_line_edit = editor.search_line_edit
 
-                self.loader_worker = DataLoaderThread(self.load_initial_data, index.column())
-                self.loader_worker.data_loaded.connect(lambda: self.on_column_data_loaded(editor, current_value))
-                self.loader_worker.start()
+                token = CancellationToken()
+                self.loader_task = task_runner.submit(
+                    self.fetch_initial_data, False, index.column(), self.section_id, section_name,
+                    priority=PRIORITY_INTERACTIVE, group=EDITOR_TASK_GROUP, token=token,
+                    on_result=lambda data: self.on_column_data_loaded(editor, current_value, data, token),
+                    on_error=lambda message: self.on_column_data_loaded(editor, current_value, None, token)
+                )
 
                 return editor
 
@@ -226,12 +233,16 @@ class ComboBoxDelegate(QStyledItemDelegate):
 
             return editor
 
-    def on_data_loaded(self, editor, index):
+    def on_data_loaded(self, editor, index, data, token):
         """Handle data loaded for the sections list"""
         try:
-            if not editor or not hasattr(editor, 'sections_list'):
+            # Редактор уже закрыт — его загрузка отменена, виджетов больше нет
+            if token.is_cancelled or not editor or not hasattr(editor, 'sections_list'):
                 return
 
+            if data is not None:
+                self.fill_sections_list(data)
+
             if hasattr(editor, 'loading_movie'):
                 editor.loading_movie.stop()
             if hasattr(editor, 'loading_label'):
@@ -250,12 +261,15 @@ class ComboBoxDelegate(QStyledItemDelegate):
         except Exception as e:
             print(f"Error in on_data_loaded: {e}")
 
-    def on_column_data_loaded(self, editor, current_value):
+    def on_column_data_loaded(self, editor, current_value, data, token):
         """Handle data loaded for column-specific lists"""
         try:
-            if not editor:
+            if token.is_cancelled or not editor:
                 return
 
+            if data is not None:
+                self.fill_lists(data)
+
             if hasattr(editor, 'main_loading_movie'):
                 editor.main_loading_movie.stop()
             if hasattr(editor, 'main_loading_label'):
@@ -283,16 +297,6 @@ class ComboBoxDelegate(QStyledItemDelegate):
         except Exception as e:
             print(f"Error in on_column_data_loaded: {e}")
 
-    def destroyEditor(self, editor, index):
-        try:
-            if hasattr(self, 'loader_worker') and self.loader_worker.isRunning():
-                self.loader_worker.quit()
-                self.loader_worker.wait()
-        except Exception as e:
-            print(f"Error in destroyEditor: {e}")
-        finally:
-            super().destroyEditor(editor, index)
-
     def set_current_value_section(self, current_value):
         """Устанавливает текущее значение в комбобоксы"""
         if not current_value:
@@ -339,10 +343,9 @@ class ComboBoxDelegate(QStyledItemDelegate):
             search_text = text
         elif isinstance(text, QListWidgetItem):
             search_text = text.text()
-        # Вызываем обновление только если есть текст для поиска
 
-        if search_text:
-            self.update_sub_list(search_text)
+        # Пустая строка возвращает все элементы выбранной категории
+        self.update_sub_list(search_text)
 
     def updateEditorGeometry(self, editor, option, index):
         """Позиционирование редактора с учетом границ экрана"""
@@ -421,50 +424,88 @@ class ComboBoxDelegate(QStyledItemDelegate):
             # Для других колонок - стандартное поведение
             super().updateEditorGeometry(editor, option, index)
 
-    def load_initial_data(self, column=0):
-        """Загрузка начальных данных в комбобоксы"""
+    def fetch_initial_data(self, token, report, is_sections, column, section_id, section_name):
+        """Загружает данные для списков редактора (выполняется в пуле задач, виджетов не трогает)"""
+        if self.catalog is not None and self.catalog.is_loaded():
+            if section_id is None and section_name:
+                section_id = self.catalog.section_id_by_name(section_name)
+            return self.catalog_data(is_sections, column, section_id)
+
+        if section_id is None and section_name and column == 1:
+            section_id = getters.get_section_by_name(self.supabase, section_name)
+
+        if is_sections:
+            return {'sections': getters.get_all_table(self.supabase, "sections")}
+
+        category_type = "works" if column == 1 else "materials"
+
+        if category_type == "materials":
+            categories = getters.get_all_table(self.supabase, f"{category_type}_categories")
+
+        else:
+            section_categories = getters.get_categories_by_section_id(self.supabase, section_id)
+            categories = section_categories or getters.get_all_table(self.supabase, f"{category_type}_categories")
+
+        token.raise_if_cancelled()
+
+        # Получаем все работы
+        all_works = getters.get_all_table(self.supabase, category_type)
+
+        # Если есть section_id и это не материалы, фильтруем работы по категориям раздела
+        if category_type == "works" and section_id:
+            section_category_ids = {cat['id'] for cat in section_categories}
+
+            # Фильтруем работы - оставляем только те, которые принадлежат категориям раздела
+            entities = [work for work in all_works
+                        if work.get('category_id') in section_category_ids]
+        else:
+            entities = all_works
+
+        return {'categories': categories, 'entities': entities}
+
+    def catalog_data(self, is_sections, column, section_id):
+        """То же, что fetch_initial_data, но из справочников в памяти — без обращений к сети"""
+        if is_sections:
+            return {'sections': self.catalog.sections()}
+
         category_type = "works" if column == 1 else "materials"
+        all_entities = self.catalog.entities(category_type)
+
+        if category_type == "materials":
+            return {'categories': self.catalog.categories(category_type), 'entities': all_entities}
+
+        categories = self.catalog.section_categories(section_id) if section_id else []
+        if not categories:
+            categories = self.catalog.categories(category_type)
+
+        entities = self.catalog.section_works(section_id) if section_id else all_entities
+
+        return {'categories': categories, 'entities': entities}
+
+    def fill_sections_list(self, data):
+        """Заполняет список разделов загруженными данными"""
         try:
-            if self.table.columnSpan(self.current_row, self.current_col) > 10:
-                sections = self.supabase.table("sections").select("*").execute().data
-                self.sections_list.clear()
+            self.sections_list.clear()
 
-                for section in sections:
-                    item = QListWidgetItem(section['name'])
-                    item.setData(Qt.ItemDataRole.UserRole, section['id'])
-                    self.sections_list.addItem(item)
+            for section in data['sections']:
+                item = QListWidgetItem(section['name'])
+                item.setData(Qt.ItemDataRole.UserRole, section['id'])
+                self.sections_list.addItem(item)
 
-                self.sections_list.setCurrentRow(0)
+            self.sections_list.setCurrentRow(0)
 
-                return
+        except Exception as e:
+            print(f"Data loading error: {e}")
 
+    def fill_lists(self, data):
+        """Заполняет списки категорий и работ (материалов) загруженными данными"""
+        try:
             self.main_list.clear()
             self.sub_list.clear()
 
-            if category_type == "materials":
-                categories = self.supabase.table(f"{category_type}_categories").select('*').execute().data
+            categories = data['categories']
+            self.data = data['entities']
 
-            else:
-                categories = getters.get_categories_by_section_id(self.supabase, self.section_id)
-                if not categories:
-                    categories = self.supabase.table(f"{category_type}_categories").select('*').execute().data
-
-            # Получаем все работы
-            all_works = self.supabase.table(f"{category_type}").select('*').execute().data
-
-            # Если есть section_id и это не материалы, фильтруем работы по категориям раздела
-            if category_type == "works" and self.section_id:
-                # Получаем ID категорий, связанных с разделом
-                section_categories = getters.get_categories_by_section_id(self.supabase, self.section_id)
-                section_category_ids = [cat['id'] for cat in section_categories]
-
-                # Фильтруем работы - оставляем только те, которые принадлежат категориям раздела
-                self.data = [work for work in all_works
-                             if work.get('category_id') in section_category_ids]
-            else:
-                self.data = all_works
-
-            # self.data = self.supabase.table(f"{category_type}").select('*').execute().data
             all_categories_item = QListWidgetItem("Все категории")
             all_categories_item.setData(Qt.ItemDataRole.UserRole, 0)
             self.main_list.addItem(all_categories_item)
@@ -478,11 +519,22 @@ class ComboBoxDelegate(QStyledItemDelegate):
                 item.setData(Qt.ItemDataRole.UserRole, cat['id'])  # Сохраняем id в UserRole
                 self.main_list.addItem(item)
 
+            self.entities_by_id = {item['id']: item for item in self.data}
+            # Первая строка "-" не относится к категории и видна всегда
+            self.sub_categories = [None]
+            self.sub_search_texts = [None]
+
             for item in self.data:
                 entity = QListWidgetItem(item['name'])
                 entity.setData(Qt.ItemDataRole.UserRole, item['id'])
                 self.sub_list.addItem(entity)
 
+                self.sub_categories.append(item.get('category_id'))
+                # Перенос строки не набрать в поле поиска, поэтому совпадение не склеит название и ключевые слова
+                self.sub_search_texts.append(f"{item['name']}\n{item.get('keywords') or ''}".lower())
+
+            self.sub_visible = [True] * self.sub_list.count()
+
             self.main_list.setCurrentRow(0)
 
             # Загружаем подчиненные элементы
@@ -498,35 +550,22 @@ class ComboBoxDelegate(QStyledItemDelegate):
             # Получаем сохранённый id (аналог .currentData() в QComboBox)
             cat_id = cat_item.data(Qt.ItemDataRole.UserRole)
 
-            text = text if isinstance(text, str) else ""
+            text = text.lower() if isinstance(text, str) else ""
 
             try:
-                for i in range(self.sub_list.count()):
-                    self.sub_list.item(i).setHidden(False)
-
-                for i in range(self.sub_list.count()):
-                    item = self.sub_list.item(i)
-                    item_data = item.data(Qt.ItemDataRole.UserRole)
+                visible = [
+                    search_text is None or (
+                        (not cat_id or category_id == cat_id) and (not text or text in search_text)
+                    )
+                    for category_id, search_text in zip(self.sub_categories, self.sub_search_texts)
+                ]
 
-                    if not item_data:
-                        continue
+                # Трогаем только строки, у которых видимость поменялась
+                for i, (was_visible, is_visible) in enumerate(zip(self.sub_visible, visible)):
+                    if was_visible != is_visible:
+                        self.sub_list.item(i).setHidden(not is_visible)
 
-                    entity_data = next((x for x in getattr(self, 'data', []) if x['id'] == item_data), None)
-
-                    if not entity_data:
-                        print ({entity_data})
-                        continue
-
-                    if cat_id and entity_data.get('category_id') != cat_id:
-                        item.setHidden(True)
-                        continue
-
-                    # Фильтр по тексту
-                    if text:
-                        name_match = text in entity_data['name'].lower()
-                        keywords_match = text in entity_data.get('keywords', '').lower()
-                        if not name_match and not keywords_match:
-                            item.setHidden(True)
+                self.sub_visible = visible
 
             except Exception as e:
                 print(f"Sub-combo update error: {e}")
@@ -540,11 +579,16 @@ class ComboBoxDelegate(QStyledItemDelegate):
 
             selected_item = self.sections_list.currentItem()
             selected_text = selected_item.text()
-            # selected_id = selected_item.data(Qt.ItemDataRole.UserRole)
+            selected_id = selected_item.data(Qt.ItemDataRole.UserRole)
 
             model.setData(index, selected_text)
             model.setData(index, Qt.AlignmentFlag.AlignCenter, Qt.ItemDataRole.TextAlignmentRole)
 
+            # Запоминаем id выбранного раздела, чтобы следующим редакторам не искать его по названию
+            section_index = self.model.find_section_by_row(self.current_row)
+            if section_index is not None and self.model.estimate[section_index].name == selected_text:
+                self.model.estimate[section_index].section_id = selected_id
+
             return
 
         if index.column() in [1, 6]:  # Обрабатываем только колонки с названиями
@@ -563,9 +607,9 @@ class ComboBoxDelegate(QStyledItemDelegate):
             try:
                 # Определяем тип сущности (работа или материал)
                 entity_type = "works" if index.column() == 1 else "materials"
-                entities = getters.get_entity_by_id(self.supabase, entity_type, selected_id)
-
-                entity = entities[0]
+                entity = self.entities_by_id.get(selected_id)
+                if entity is None:
+                    entity = getters.get_entity_by_id(self.supabase, entity_type, selected_id)[0]
 
                 if index.column() == 1:  # Обработка работы
 
@@ -619,5 +663,8 @@ class ComboBoxDelegate(QStyledItemDelegate):
 
     def destroyEditor(self, editor, index):
         """Очищаем ссылки при уничтожении редактора"""
+        # Загрузка для закрытого редактора больше не нужна
+        task_runner.cancel_group(EDITOR_TASK_GROUP)
+        self.loader_task = None
         self.current_editor = None
         super().destroyEditor(editor, index)
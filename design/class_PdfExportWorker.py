@@ -0,0 +1,34 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from estimate_pdf import build_estimate_pdf, ExportCancelled
+
+
+class PdfExportWorker(QThread):
+    """Строит PDF сметы из снимка в отдельном потоке"""
+    progress = pyqtSignal(int)
+    export_finished = pyqtSignal(str)
+    export_failed = pyqtSignal(str)
+    export_cancelled = pyqtSignal()
+
+    def __init__(self, snapshot, file_path, logo_path=None):
+        super().__init__()
+        self.snapshot = snapshot
+        self.file_path = file_path
+        self.logo_path = logo_path
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        try:
+            build_estimate_pdf(
+                self.snapshot, self.file_path, self.logo_path,
+                progress=self.progress.emit, is_cancelled=lambda: self._cancelled
+            )
+            self.export_finished.emit(self.file_path)
+        except ExportCancelled:
+            self.export_cancelled.emit()
+        except Exception as e:
+            print(f"Ошибка при сохранении PDF: {e}")
+            self.export_failed.emit(str(e))
@@ -1,4 +1,4 @@
-from PyQt6.QtCore import Qt, QPoint, QRectF, QMarginsF
+from PyQt6.QtCore import Qt, QPoint, QRectF, QMarginsF, QTimer
 from PyQt6.QtGui import QFont, QPainter, QPageLayout, QTextOption
 from PyQt6.QtPrintSupport import QPrinter
 from PyQt6.QtWidgets import QMessageBox, QFileDialog, QTableWidgetItem, QTableWidget, QHeaderView
@@ -6,13 +6,15 @@ from PyQt6.QtWidgets import QMessageBox, QFileDialog, QTableWidgetItem, QTableWi
 from design.class_ComboBoxDelegate import ComboBoxDelegate
 from design.classes import MaterialItem, WorkItem, SectionItem
 from design.styles import DATA_TABLE_STYLE, RESULT_TABLE_STYLE, ESTIMATE_TABLE_STYLE
+from row_index import RowIndex
 
 
 class EstimateTableManager:
-    def __init__(self, table_widget, table_results, supabase, page_estimate):
+    def __init__(self, table_widget, table_results, supabase, page_estimate, catalog=None):
         self.table = table_widget
         self.table_results = table_results
         self.supabase = supabase
+        self.catalog = catalog
         self.page_estimate = page_estimate
 
         self.model = EstimateDataModel(table_widget)
@@ -32,7 +34,7 @@ class EstimateTableManager:
 
     def setup_delegates(self):
         """Устанавливает делегаты, кем бы они ни были"""
-        delegate = ComboBoxDelegate(self.table, self.supabase, self.page_estimate, self.model)
+        delegate = ComboBoxDelegate(self.table, self.supabase, self.page_estimate, self.model, self.catalog)
         self.table.setItemDelegate(delegate)
 
     def add_row_section(self):
@@ -66,7 +68,7 @@ class EstimateTableManager:
             self.model.add_work(selected_row + 1)
             self.view.add_work_row(selected_row)
 
-            self.view.renumber_rows()
+            self.view.renumber_rows(self.model.find_section_by_row(selected_row))
 
         except Exception as e:
             print(f"Ошибка при добавлении работы: {e}")
@@ -96,8 +98,6 @@ class EstimateTableManager:
 
             self.view.update_spans_for_work(selected_row)
 
-            self.view.renumber_rows()
-
         except Exception as e:
             print(f"Ошибка при добавлении материала: {e}")
             raise
@@ -135,10 +135,10 @@ class EstimateTableManager:
 
             self.view.table.setUpdatesEnabled(False)
 
+            # Номера работ в остальных разделах не меняются, а строки таблицы сдвигаются вместе с ячейками
             self.view.delete_selected_section(selected_row)
             self.model.delete_section(selected_row)
-
-            self.view.renumber_rows()
+            self.view_results.update_result_table()
 
         except Exception as e:
             print(f"Ошибка при удалении работы: {e}")
@@ -179,8 +179,9 @@ class EstimateTableManager:
 
             self.view.delete_selected_work(selected_row)
             self.model.delete_work(selected_row)
+            self.view_results.update_result_table()
 
-            self.view.renumber_rows()
+            self.view.renumber_rows(section_index)
 
         except Exception as e:
             print(f"Ошибка при удалении работы: {e}")
@@ -202,15 +203,14 @@ class EstimateTableManager:
 
             work_idx = self.model.find_work_by_row(selected_row, section_index)
 
-            work = self.model.estimate[section_index].works[work_idx]
-
             if work_idx is None:
                 QMessageBox.warning(self.page_estimate, "Предупреждение", "Не выбран ни один материал для удаления")
                 return
 
+            work_row = self.model.work_row(section_index, work_idx)
+
             # Определяем, выделена ли строка работы (первый материал)
-            is_first_material = selected_row == work.row
-            section_index = self.model.find_section_by_row(work.row)
+            is_first_material = selected_row == work_row
             materials_count = self.model.estimate[section_index].works[work_idx].height
 
             # Если это первый и единственный материал
@@ -220,7 +220,7 @@ class EstimateTableManager:
                 return
 
             # Определяем индекс материала
-            material_idx = selected_row - work.row - (0 if is_first_material else 1)
+            material_idx = selected_row - work_row
 
             # Проверяем, что индекс материала корректен
             if material_idx < 0 or material_idx >= materials_count:
@@ -240,15 +240,13 @@ class EstimateTableManager:
 
             self.view.table.setUpdatesEnabled(False)
 
-            self.view.delete_selected_material(work.row, selected_row, is_first_material)
+            self.view.delete_selected_material(work_row, selected_row, is_first_material)
             self.model.delete_material(selected_row)
 
-            self.view.update_table_from_model(work.row, 11)
-            self.view.update_table_from_model(work.row, 12)
+            self.view.update_table_from_model(work_row, 11)
+            self.view.update_table_from_model(work_row, 12)
             self.view_results.update_result_table()
 
-            self.view.renumber_rows()
-
         except Exception as e:
             print(f"Ошибка при удалении материала: {e}")
             raise
@@ -277,6 +275,31 @@ class EstimateTableManager:
             print(f"Ошибка при очистке таблицы: {e}")
             QMessageBox.critical(self.page_estimate, "Ошибка", "Не удалось очистить таблицу")
 
+    def recalculate_prices(self, update_prices):
+        """Пакетно меняет цены всей сметы: update_prices(arrays) правит массивы, суммы считаются за один проход"""
+        try:
+            # NumPy нужен только для пакетного пересчета, не загружаем его при запуске
+            from estimate_batch import EstimateArrays
+        except ImportError as e:
+            print(f"Ошибка при пересчете цен: {e}")
+            QMessageBox.critical(
+                self.page_estimate, "Ошибка", "Для пересчета цен нужен пакет numpy: pip install numpy"
+            )
+            return
+
+        try:
+            arrays = EstimateArrays(self.model.estimate)
+            update_prices(arrays)
+            arrays.compute()
+            self.model.set_section_totals(arrays.apply())
+
+            self.view.update_prices_from_model()
+            self.view_results.update_result_table()
+
+        except Exception as e:
+            print(f"Ошибка при пересчете цен: {e}")
+            QMessageBox.critical(self.page_estimate, "Ошибка", "Не удалось пересчитать цены")
+
     def connect_data_changes(self):
         """Подключает обработчик изменений данных в таблице"""
         self.view.table.model().dataChanged.connect(self.handle_data_change)
@@ -289,7 +312,7 @@ class EstimateTableManager:
                     section_index = self.model.find_section_by_row(row)
                     for col in range(top_left.column(), bottom_right.column() + 1):
                         self.model.update_model_from_table(row, col)
-                        if self.model.estimate[section_index].row != row:
+                        if self.model.section_row(section_index) != row:
                             self.view.update_table_from_model(row, col)
                             self.view_results.update_result_table()
 
@@ -355,13 +378,20 @@ class TableViewManager:
         header = self.table.horizontalHeader()
         header.setDefaultAlignment(Qt.AlignmentFlag.AlignCenter | Qt.TextFlag.TextWordWrap)
 
-    def renumber_rows(self):
-        """Обновляет нумерацию работ"""
-        for section in self.model.estimate:
-            for work in section.works:
-                item = QTableWidgetItem(str(work.number))
+    def renumber_rows(self, section_index=None):
+        """Обновляет нумерацию работ раздела (или всех разделов)"""
+        if section_index is None:
+            section_indexes = range(len(self.model.estimate))
+        else:
+            section_indexes = [section_index]
+
+        for section_index in section_indexes:
+            row = self.model.section_row(section_index) + 1
+            for number, work in enumerate(self.model.estimate[section_index].works, 1):
+                item = QTableWidgetItem(str(number))
                 item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                self.table.setItem(work.row, 0, item)
+                self.table.setItem(row, 0, item)
+                row += work.height
 
     def add_section_row(self):
         row_pos = self.table.rowCount()
@@ -374,11 +404,11 @@ class TableViewManager:
 
     def add_work_row(self, row):
         section_index = self.model.find_section_by_row(row)
-        if self.model.estimate[section_index].row != row:
+        if self.model.section_row(section_index) != row:
             work_index = self.model.find_work_by_row(row, section_index)
             prev_work = self.model.estimate[section_index].works[work_index]
 
-            insert_row = prev_work.row + prev_work.height
+            insert_row = self.model.work_row(section_index, work_index) + prev_work.height
             self.table.insertRow(insert_row)
             self.table.selectRow(insert_row)
         else:
@@ -392,7 +422,7 @@ class TableViewManager:
 
         work = self.model.estimate[section_index].works[work_index]
 
-        insert_row = work.row + work.height - 1
+        insert_row = self.model.work_row(section_index, work_index) + work.height - 1
         self.table.insertRow(insert_row)
 
         self.table.selectRow(insert_row)
@@ -410,10 +440,11 @@ class TableViewManager:
         work_index = self.model.find_work_by_row(row, section_index)
 
         work = self.model.estimate[section_index].works[work_index]
+        work_row = self.model.work_row(section_index, work_index)
         span_height = work.height
 
         # Сбрасываем объединения для этой работы
-        for row in range(work.row, work.row + span_height):
+        for row in range(work_row, work_row + span_height):
             for col in range(6):
                 self.table.setSpan(row, col, 1, 1)
 
@@ -423,17 +454,18 @@ class TableViewManager:
         # Устанавливаем новые объединения, если есть материалы
         if span_height > 1:
             for col in range(6):
-                self.table.setSpan(work.row, col, span_height, 1)
-            self.table.setSpan(work.row, 11, span_height, 1)
-            self.table.setSpan(work.row, 12, span_height, 1)
+                self.table.setSpan(work_row, col, span_height, 1)
+            self.table.setSpan(work_row, 11, span_height, 1)
+            self.table.setSpan(work_row, 12, span_height, 1)
 
     def delete_selected_section(self, row):
         """Удаляет выбранный раздел и все его работы и материалы"""
         section_index = self.model.find_section_by_row(row)
         section = self.model.estimate[section_index]
+        section_row = self.model.section_row(section_index)
 
         for _ in range(section.height + 1):
-            self.table.removeRow(section.row)
+            self.table.removeRow(section_row)
 
     def delete_selected_work(self, row):
         """Удаляет выбранную работу и все её материалы"""
@@ -441,10 +473,10 @@ class TableViewManager:
         work_idx = self.model.find_work_by_row(row, section_index)
 
         work = self.model.estimate[section_index].works[work_idx]
-        work_height = work.height
+        work_row = self.model.work_row(section_index, work_idx)
 
-        for _ in range(work_height):
-            self.table.removeRow(work.row)
+        for _ in range(work.height):
+            self.table.removeRow(work_row)
 
     def delete_selected_material(self, work_start_row, selected_row, is_first_material):
         if is_first_material:
@@ -467,6 +499,41 @@ class TableViewManager:
             # Для обычных материалов просто удаляем строку
             self.table.removeRow(selected_row)
 
+    def update_prices_from_model(self):
+        """Переписывает цены и суммы всех строк из модели без пересчета каждой ячейки"""
+        def set_value(row, col, value):
+            item = QTableWidgetItem(str(value))
+            item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+            self.table.setItem(row, col, item)
+
+        if not self.model.estimate:
+            return
+
+        # Ячейки пишутся без поячеечных сигналов, затем представления получают одно изменение на весь диапазон
+        table_model = self.table.model()
+        table_model.blockSignals(True)
+        try:
+            for section_index, section in enumerate(self.model.estimate):
+                row = self.model.section_row(section_index) + 1
+                for work_index, work in enumerate(section.works):
+                    set_value(row, 4, work.labor_cost)
+                    set_value(row, 5, work.total_work)
+                    set_value(row, 11, work.total_materials)
+                    set_value(row, 12, self.model.total_sum_work_and_materials(section_index, work_index))
+
+                    for material_row, material in enumerate(work.materials, row):
+                        set_value(material_row, 9, material.price)
+                        set_value(material_row, 10, material.total)
+
+                    row += work.height
+        finally:
+            table_model.blockSignals(False)
+
+        # Только DisplayRole: handle_data_change реагирует на правки пользователя (EditRole) и не перечитывает цены
+        table_model.dataChanged.emit(
+            table_model.index(0, 4), table_model.index(self.table.rowCount() - 1, 12), [Qt.ItemDataRole.DisplayRole]
+        )
+
     def update_table_from_model(self, row, col):
         try:
 
@@ -475,6 +542,7 @@ class TableViewManager:
             work_index = self.model.find_work_by_row(row, section_index)
 
             work = self.model.estimate[section_index].works[work_index]
+            work_row = self.model.work_row(section_index, work_index)
 
             total_sum = self.model.total_sum_work_and_materials(section_index, work_index)
             item_col_12 = QTableWidgetItem(str(total_sum))
@@ -492,7 +560,7 @@ class TableViewManager:
                     self.table.setItem(row, 5, item_col_5)
 
             elif col == 8 or col == 9:
-                material_total = work.materials[row - work.row].total
+                material_total = work.materials[row - work_row].total
                 item_col_10 = QTableWidgetItem(str(material_total))
                 current_col_10 = self.table.item(row, 10).text() if self.table.item(row, 10) else ""
 
@@ -505,7 +573,7 @@ class TableViewManager:
 
                 if item_col_11.text() != current_col_11:
                     item_col_11.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                    self.table.setItem(work.row, 11, item_col_11)
+                    self.table.setItem(work_row, 11, item_col_11)
 
             elif col == 11:
                 item_col_11 = QTableWidgetItem(str(work.total_materials))
@@ -513,7 +581,7 @@ class TableViewManager:
 
                 if item_col_11.text() != current_col_11:
                     item_col_11.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                    self.table.setItem(work.row, 11, item_col_11)
+                    self.table.setItem(work_row, 11, item_col_11)
 
         except Exception as e:
             print(f"Ошибка при обновлении таблицы из модели: {e}")
@@ -552,6 +620,12 @@ class TableResultsViewManager:
         self.table = table
         self.model = None
 
+        # Нулевой интервал: итоги пересчитываются после того, как обработаны все изменения текущего прохода
+        self.update_timer = QTimer()
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(0)
+        self.update_timer.timeout.connect(self.refresh_result_table)
+
         self.setup_table()
 
     def set_model(self, model):
@@ -612,25 +686,24 @@ class TableResultsViewManager:
             self.table.setColumnWidth(col, width)
 
     def update_result_table(self):
-        works_sum = 0
-        materials_sum = 0
-
-        for section in self.model.estimate:
-            for work in section.works:
-                works_sum += work.total_work
-                materials_sum += work.total_materials
+        """Обновляет итоги один раз за проход цикла событий, сколько бы ячеек ни изменилось"""
+        if not self.update_timer.isActive():
+            self.update_timer.start()
 
-        total_sum = works_sum + materials_sum
+    def refresh_result_table(self):
+        totals = self.model.totals()
 
-        self.table.setItem(0, 1, QTableWidgetItem(str(round(materials_sum * 0.15, 2))))
+        self.table.setItem(0, 1, QTableWidgetItem(str(totals['delivery'])))
 
-        self.table.setItem(1, 1, QTableWidgetItem(str(round(works_sum, 2))))
+        self.table.setItem(1, 1, QTableWidgetItem(str(totals['works'])))
 
-        self.table.setItem(2, 1, QTableWidgetItem(str(round(materials_sum, 2))))
+        self.table.setItem(2, 1, QTableWidgetItem(str(totals['materials'])))
 
-        self.table.setItem(3, 1, QTableWidgetItem(str(round(total_sum + materials_sum * 0.15, 2))))
+        self.table.setItem(3, 1, QTableWidgetItem(str(totals['total'])))
 
     def clear_all_data(self):
+        self.update_timer.stop()
+
         self.table.setItem(0, 1, QTableWidgetItem(""))
         self.table.setItem(1, 1, QTableWidgetItem(""))
         self.table.setItem(2, 1, QTableWidgetItem(""))
@@ -641,31 +714,41 @@ class EstimateDataModel:
     def __init__(self, table):
         self.estimate = [SectionItem()]
         self.table = table
+        # Строки не хранятся в элементах, а считаются по высотам:
+        # section_rows — высоты разделов вместе со строкой заголовка, work_rows[i] — высоты работ раздела i
+        self.section_rows = RowIndex([1])
+        self.work_rows = [RowIndex()]
+        # Итоги в копейках обновляются разницей при каждом изменении, без пересчета всей сметы:
+        # section_cents[i] — [ФОТ, материалы] раздела i
+        self.section_cents = [[0, 0]]
+        self.works_cents = 0
+        self.materials_cents = 0
 
     def add_section(self):
         self.estimate.append(SectionItem())
-        self.estimate[-1].row = self.table.rowCount()
+        self.section_rows.append(1)
+        self.work_rows.append(RowIndex())
+        self.section_cents.append([0, 0])
+
+    def section_row(self, section_index):
+        """Номер строки заголовка раздела"""
+        return self.section_rows.prefix(section_index)
+
+    def work_row(self, section_index, work_index):
+        """Номер первой строки работы"""
+        return self.section_row(section_index) + 1 + self.work_rows[section_index].prefix(work_index)
 
     def find_section_by_row(self, row):
         """Находит раздел по номеру строки в таблице"""
         try:
-            for i in range(len(self.estimate)):
-                if self.estimate[i].row <= row <= self.estimate[i].row + self.estimate[i].height:
-                    return i
-
-            return None
+            return self.section_rows.find(row)
         except Exception as e:
             print(f"find_section_by_row Не удалось найти индекс раздела : {e}")
 
     def find_work_by_row(self, row, section_index):
         """Возвращает индекс работы в массиве по заданной строке"""
         try:
-            for i in range(len(self.estimate[section_index].works)):
-                work = self.estimate[section_index].works[i]
-                if work.row <= row < work.row + work.height:
-                    return i
-
-            return None
+            return self.work_rows[section_index].find(row - self.section_row(section_index) - 1)
         except Exception as e:
             print(f"find_work_by_row Не удалось найти индекс работы: {e}")
 
@@ -673,43 +756,19 @@ class EstimateDataModel:
         try:
             section_index = self.find_section_by_row(row - 1)
 
-            insert_row = row
-            num = 1
-
-            if self.estimate[section_index].row != row - 1:
-
-                work_index = self.find_work_by_row(row - 1, section_index)
-                prev_work = self.estimate[section_index].works[work_index]
+            work_index = 0
 
-                insert_row = prev_work.row + prev_work.height
-                num = prev_work.number + 1
+            if self.section_row(section_index) != row - 1:
+                work_index = self.find_work_by_row(row - 1, section_index) + 1
 
             work = WorkItem()
-            work.row = insert_row
-            work.number = num
 
             # Вставляем работу в указанную позицию
-            self.estimate[section_index].works.insert(work.number - 1, work)
+            self.estimate[section_index].works.insert(work_index, work)
+            self.work_rows[section_index].insert(work_index, work.height)
 
             self.estimate[section_index].height += 1
-
-            # Обновляем позиции последующих работ
-            for i in range(work.number, len(self.estimate[section_index].works)):
-
-                self.estimate[section_index].works[i].number += 1
-                self.estimate[section_index].works[i].row += 1
-
-                for k in range(len(self.estimate[section_index].works[i].materials)):
-                    self.estimate[section_index].works[i].materials[k].row += 1
-
-            for i in range(section_index + 1, len(self.estimate)):
-                self.estimate[i].row += 1
-
-                for j in range(len(self.estimate[i].works)):
-                    self.estimate[i].works[j].row += 1
-
-                    for k in range(len(self.estimate[i].works[j].materials)):
-                        self.estimate[i].works[j].materials[k].row += 1
+            self.section_rows.add(section_index, 1)
 
         except Exception as e:
             print(f"add_work Не удалось добавить работу (в модель): {e}")
@@ -722,20 +781,11 @@ class EstimateDataModel:
 
             self.estimate[section_index].works[work_index].materials.append(MaterialItem())
 
-            self.estimate[section_index].works[work_index].materials[-1].row = row + 1
-
             self.estimate[section_index].works[work_index].height += 1
             self.estimate[section_index].height += 1
 
-            for i in range(work_index + 1, len(self.estimate[section_index].works)):
-                self.estimate[section_index].works[i].row += 1
-
-            for i in range(section_index + 1, len(self.estimate)):
-                self.estimate[i].row += 1
-                for j in range(len(self.estimate[i].works)):
-                    self.estimate[i].works[j].row += 1
-                    for k in range(len(self.estimate[i].works[j].materials)):
-                        self.estimate[i].works[j].materials[k].row += 1
+            self.work_rows[section_index].add(work_index, 1)
+            self.section_rows.add(section_index, 1)
 
         except Exception as e:
             print(f"add_material Не удалось добавить материал (в модель): {e}")
@@ -743,15 +793,12 @@ class EstimateDataModel:
     def delete_section(self, row):
         section_index = self.find_section_by_row(row)
 
-        section_height = self.estimate[section_index].height + 1
-
-        for i in range(section_index + 1, len(self.estimate)):
-            self.estimate[i].row -= section_height
-            for j in range(len(self.estimate[i].works)):
-                self.estimate[i].works[j].row -= section_height
-                for k in range(len(self.estimate[i].works[j].materials)):
-                    self.estimate[i].works[j].materials[k].row -= section_height
+        works_cents, materials_cents = self.section_cents.pop(section_index)
+        self.works_cents -= works_cents
+        self.materials_cents -= materials_cents
 
+        self.section_rows.pop(section_index)
+        del self.work_rows[section_index]
         del self.estimate[section_index]
 
     def delete_work(self, row):
@@ -759,22 +806,14 @@ class EstimateDataModel:
 
         work_index = self.find_work_by_row(row, section_index)
 
-        work_height = self.estimate[section_index].works[work_index].height
-
-        self.estimate[section_index].height -= work_height
+        work = self.estimate[section_index].works[work_index]
+        work_height = work.height
 
-        for i in range(work_index + 1, len(self.estimate[section_index].works)):
-            self.estimate[section_index].works[i].number -= 1
-            self.estimate[section_index].works[i].row -= work_height
-            for k in range(len(self.estimate[section_index].works[i].materials)):
-                self.estimate[section_index].works[i].materials[k].row -= work_height
+        self.add_to_totals(section_index, -to_cents(work.total_work), -to_cents(work.total_materials))
 
-        for i in range(section_index + 1, len(self.estimate)):
-            self.estimate[i].row -= work_height
-            for j in range(len(self.estimate[i].works)):
-                self.estimate[i].works[j].row -= work_height
-                for k in range(len(self.estimate[i].works[j].materials)):
-                    self.estimate[i].works[j].materials[k].row -= work_height
+        self.estimate[section_index].height -= work_height
+        self.section_rows.add(section_index, -work_height)
+        self.work_rows[section_index].pop(work_index)
 
         del self.estimate[section_index].works[work_index]
 
@@ -783,36 +822,28 @@ class EstimateDataModel:
 
         work_index = self.find_work_by_row(row, section_index)
 
-        material_index = 0
-
-        for i in range(len(self.estimate[section_index].works[work_index].materials)):
-            if self.estimate[section_index].works[work_index].materials[i].row == row:
-                material_index = i
-
-        for i in range(material_index + 1, len(self.estimate[section_index].works[work_index].materials)):
-            self.estimate[section_index].works[work_index].materials[i].row -= 1
-
-        for i in range(work_index + 1, len(self.estimate[section_index].works)):
-            self.estimate[section_index].works[i].row -= 1
-
-        for i in range(section_index + 1, len(self.estimate)):
-            self.estimate[i].row -= 1
-            for j in range(len(self.estimate[i].works)):
-                self.estimate[i].works[j].row -= 1
-                for k in range(len(self.estimate[i].works[j].materials)):
-                    self.estimate[i].works[j].materials[k].row -= 1
+        material_index = row - self.work_row(section_index, work_index)
+        material_cents = to_cents(self.estimate[section_index].works[work_index].materials[material_index].total)
 
         del self.estimate[section_index].works[work_index].materials[material_index]
 
         self.estimate[section_index].works[work_index].height -= 1
         self.estimate[section_index].height -= 1
 
-        self.update_total_materials(section_index, work_index)
+        self.work_rows[section_index].add(work_index, -1)
+        self.section_rows.add(section_index, -1)
+
+        self.update_total_materials(section_index, work_index, -material_cents)
 
     def clear_all_data(self):
         self.estimate.clear()
 
         self.estimate.append(SectionItem())
+        self.section_rows = RowIndex([1])
+        self.work_rows = [RowIndex()]
+        self.section_cents = [[0, 0]]
+        self.works_cents = 0
+        self.materials_cents = 0
 
     def update_model_from_table(self, row, col):
         """Обновляет модель на основе изменений в таблице"""
@@ -829,18 +860,22 @@ class EstimateDataModel:
 
             value = item.text()
 
-            if self.estimate[section_index].row == row:
-                self.estimate[section_index].name = value if value else ""
+            if self.section_row(section_index) == row:
+                section = self.estimate[section_index]
+                if section.name != value:
+                    # id выставляет редактор после выбора раздела, а для другого названия он уже не верен
+                    section.name = value if value else ""
+                    section.section_id = None
                 return
 
             work_idx = self.find_work_by_row(row, section_index)
 
-            work_start_row = self.estimate[section_index].works[work_idx].row
-
             if work_idx is None:
                 print("work_idx is None")
                 return
 
+            work_start_row = self.work_row(section_index, work_idx)
+
             if col <= 5 and row == work_start_row:
                 if col == 1:  # Наименование работы
                     self.estimate[section_index].works[work_idx].name = value if value else ""
@@ -864,30 +899,69 @@ class EstimateDataModel:
                     self.estimate[section_index].works[work_idx].materials[material_idx].quantity = round(float(value), 2) if value else 0.00
 
                     self.update_material_total(section_index, work_idx, material_idx)
-                    self.update_total_materials(section_index, work_idx)
                 elif col == 9:  # Цена материала
                     self.estimate[section_index].works[work_idx].materials[material_idx].price = round(float(value), 2) if value else 0.00
 
                     self.update_material_total(section_index, work_idx, material_idx)
-                    self.update_total_materials(section_index, work_idx)
         except Exception as e:
             print(f"Ошибка при обновлении модели из таблицы: {e}")
 
     def update_work_total(self, section_index, work_idx):
-        self.estimate[section_index].works[work_idx].total_work = round(self.estimate[section_index].works[work_idx].quantity * self.estimate[section_index].works[work_idx].labor_cost, 2)
+        work = self.estimate[section_index].works[work_idx]
+        old_total = work.total_work
+        work.total_work = round(work.quantity * work.labor_cost, 2)
+
+        self.add_to_totals(section_index, to_cents(work.total_work) - to_cents(old_total), 0)
 
     def update_material_total(self, section_index, work_idx, material_idx):
         material = self.estimate[section_index].works[work_idx].materials[material_idx]
-        self.estimate[section_index].works[work_idx].materials[material_idx].total = round(material.quantity
-                                                                                           * material.price, 2)
-
-    def update_total_materials(self,section_index, work_idx):
-        s = 0.0
-        for i in range(len(self.estimate[section_index].works[work_idx].materials)):
-            s += self.estimate[section_index].works[work_idx].materials[i].total
-
-        self.estimate[section_index].works[work_idx].total_materials = round(s, 2)
+        old_total = material.total
+        material.total = round(material.quantity * material.price, 2)
+
+        self.update_total_materials(section_index, work_idx, to_cents(material.total) - to_cents(old_total))
+
+    def update_total_materials(self, section_index, work_idx, delta):
+        """Применяет изменение суммы одного материала (в копейках) к сумме материалов работы и итогам"""
+        work = self.estimate[section_index].works[work_idx]
+        work.total_materials = (to_cents(work.total_materials) + delta) / 100
+
+        self.add_to_totals(section_index, 0, delta)
+
+    def add_to_totals(self, section_index, works_delta, materials_delta):
+        """Применяет изменение ФОТ и материалов (в копейках) к итогам раздела и сметы"""
+        section_cents = self.section_cents[section_index]
+        section_cents[0] += works_delta
+        section_cents[1] += materials_delta
+        self.estimate[section_index].total = (section_cents[0] + section_cents[1]) / 100
+
+        self.works_cents += works_delta
+        self.materials_cents += materials_delta
+
+    def set_section_totals(self, section_cents):
+        """Заменяет итоги разделов (в копейках), посчитанные пакетно"""
+        self.section_cents = [list(cents) for cents in section_cents]
+        self.works_cents = sum(cents[0] for cents in self.section_cents)
+        self.materials_cents = sum(cents[1] for cents in self.section_cents)
+
+        for section, cents in zip(self.estimate, self.section_cents):
+            section.total = (cents[0] + cents[1]) / 100
+
+    def totals(self):
+        """Итоги сметы: ФОТ, материалы, доставка 15% от материалов и общая сумма"""
+        works_sum = self.works_cents / 100
+        materials_sum = self.materials_cents / 100
+
+        return {
+            'works': round(works_sum, 2),
+            'materials': round(materials_sum, 2),
+            'delivery': round(materials_sum * 0.15, 2),
+            'total': round(works_sum + materials_sum + materials_sum * 0.15, 2)
+        }
 
     def total_sum_work_and_materials(self, section_index, work_idx):
         return round(self.estimate[section_index].works[work_idx].total_materials
                      + self.estimate[section_index].works[work_idx].total_work, 2)
+
+
+def to_cents(value):
+    return round(value * 100)
@@ -1,13 +1,15 @@
 class WorkItem:
+    __slots__ = ('name', 'unit', 'quantity', 'labor_cost', 'total_work', 'materials', 'height', 'total_materials')
+
     def __init__(self):
         self.name = ""
         self.unit = ""
         self.quantity = 0.0
         self.labor_cost = 0.0
         self.total_work = 0.0
-        self.materials = [MaterialItem()]  # Список MaterialItem
-        self.row = 0
-        self.number = 0
+        # Строка работы в таблице — это и строка ее первого материала, поэтому у работы всегда есть материал:
+        # height == len(materials), а правки колонок материала в строке работы пишутся в materials[0]
+        self.materials = [MaterialItem()]
         self.height = 1
         self.total_materials = 0.0
 
@@ -20,24 +22,27 @@ class WorkItem:
 
 
 class MaterialItem:
+    __slots__ = ('name', 'unit', 'quantity', 'price', 'total')
+
     def __init__(self):
         self.name = ""
         self.unit = ""
         self.quantity = 0.0
         self.price = 0.0
         self.total = 0.0
-        self.row = 0
 
     def calc_total(self):
         return self.quantity * self.price
 
 
 class SectionItem:
+    __slots__ = ('name', 'section_id', 'works', 'total', 'height')
+
     def __init__(self):
         self.name = ""
+        self.section_id = None  # id раздела в справочнике, запоминается при выборе раздела
         self.works = []
         self.total = 0.0
-        self.row = 0
         self.height = 0
 
     def calc_total(self):
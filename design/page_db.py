@@ -1,68 +1,85 @@
 import os
-import json
 from datetime import datetime
 
-from PyQt6.QtCore import Qt, QTimer, QThread, pyqtSignal
+from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui import QMovie
 from PyQt6.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QLabel, QHeaderView, QSizePolicy, QHBoxLayout, QComboBox, \
-    QTableWidget, QPushButton, QToolButton, QMessageBox, QDialog, QDialogButtonBox, QLineEdit, QDoubleSpinBox, \
-    QFormLayout, QTableWidgetItem, QApplication, QFileDialog, QCheckBox, QProgressDialog, QButtonGroup
+    QTableView, QPushButton, QToolButton, QMessageBox, QDialog, QDialogButtonBox, QLineEdit, QDoubleSpinBox, \
+    QFormLayout, QApplication, QFileDialog, QCheckBox, QProgressDialog, QButtonGroup, QSpinBox
 
+import backup
 import getters
 import setters
+from catalog_cache import catalog_cache
+from design.class_CatalogTableModel import CatalogTableModel
+from design.tasks import task_runner, CancellationToken, TaskCancelled, PRIORITY_VISIBLE
+from search_index import SearchIndex
 from design.styles import LABEL_STYLE, TOOL_PANEL_STYLE, DROPDOWN_STYLE, DATA_TABLE_STYLE, PRIMARY_BUTTON_STYLE, \
     ACTION_BUTTONS_STYLE, SEARCH_STYLE
 
-BACKUP_VERSION = "1.0"
+LOAD_TASK_GROUP = "page_db_table"
 
-class DataLoader(QThread):
-    data_loaded = pyqtSignal(dict)
-    
-    def __init__(self, supabase, current_table):
-        super().__init__()
+class DataLoader:
+    """Загрузка таблицы справочника для задачи пула: страницы отдаются через report по мере прихода"""
+
+    def __init__(self, supabase, current_table, request_id=0):
         self.supabase = supabase
         self.current_table = current_table
+        self.request_id = request_id
+
+    def emit_pages(self, pages, result, token, report):
+        """Отдает первую страницу сразу, остальные — по мере загрузки"""
+        first_page = True
+        try:
+            for page in pages:
+                # Таблицу уже не ждут — прекращаем выгрузку, не дочитывая оставшиеся страницы
+                token.raise_if_cancelled()
+                if first_page:
+                    result['data'] = page
+                    report(result)
+                    first_page = False
+                else:
+                    report({'request_id': self.request_id, 'table': self.current_table, 'rows': page})
+        finally:
+            pages.close()
+
+        if first_page:
+            result['data'] = []
+            report(result)
     
-    def run(self):
+    def run(self, token, report):
         try:
             result = {}
             
             if self.current_table in ['works_categories', 'materials_categories']:
-                data = getters.sort_by_id(self.supabase, self.current_table, 'id')
                 result = {
-                    'data': data,
+                    'request_id': self.request_id,
+                    'table': self.current_table,
                     'column_order': ['id', 'name'],
                     'header_names': {
                         'id': '№',
                         'name': 'Название категории'
                     }
                 }
+                self.emit_pages(getters.iter_sorted_pages(self.supabase, self.current_table, 'id'), result, token, report)
                 
             elif self.current_table in ['sections']:
-                data_sections = getters.sort_by_id(self.supabase, self.current_table, 'id')
-                data_relations = getters.sort_by_id(self.supabase, 'section_work_category_relations', 'section_id')
-                work_categories = getters.get_all_table(self.supabase, 'works_categories')
-                
+                sections = getters.get_sections_with_categories(self.supabase)
+
                 display_data = []
-                for section in data_sections:
-                    related_category_ids = [
-                        related['category_id'] for related in data_relations 
-                        if related['section_id'] == section['id']
-                    ]
-                    
-                    category_names = [
-                        category['name'] for category in work_categories 
-                        if category['id'] in related_category_ids
-                    ]
+                for section in sections:
+                    category_names = [category['name'] for category in section['categories']]
 
                     display_data.append({
                         'id': section['id'],
                         'name': section['name'],
                         'related_categories': ', '.join(category_names) if category_names else '-',
-                        'related_ids': ','.join(related_category_ids)
+                        'related_ids': ','.join(str(category['id']) for category in section['categories'])
                     })
                 
                 result = {
+                    'request_id': self.request_id,
+                    'table': self.current_table,
                     'data': display_data,
                     'column_order': ['id', 'name', 'related_categories', 'related_ids'],
                     'header_names': {
@@ -72,11 +89,12 @@ class DataLoader(QThread):
                         'related_ids': 'related_ids'
                     }
                 }
+                report(result)
                 
             else:
-                data = getters.sort_by_id(self.supabase, self.current_table, 'category_id')
                 result = {
-                    'data': data,
+                    'request_id': self.request_id,
+                    'table': self.current_table,
                     'column_order': ['id', 'category_id', 'name', 'price', 'unit', 'keywords'],
                     'header_names': {
                         'id': '№',
@@ -87,9 +105,10 @@ class DataLoader(QThread):
                         'keywords': "keywords"
                     }
                 }
+                self.emit_pages(getters.iter_sorted_pages(self.supabase, self.current_table, 'category_id'), result, token, report)
             
-            self.data_loaded.emit(result)
-            
+        except TaskCancelled:
+            raise
         except Exception as e:
             print('Error in thread:', e)
 
@@ -98,8 +117,12 @@ class PageDB(QMainWindow):
         super().__init__()
 
         self.supabase = supabase
-        self.action_buttons = {}
         self.current_table = 'works'
+        self.table_model = CatalogTableModel()
+        self.search_index = SearchIndex()
+        self.selected_row = None
+        # Номер последней загрузки: ответы более ранних загрузок устарели и не отображаются
+        self.load_request_id = 0
 
     def create_page_db(self):
         """Создает первую страницу (база данных)"""
@@ -140,23 +163,45 @@ class PageDB(QMainWindow):
             self.label.setVisible(True)
             self.table_db.setVisible(False)
 
-            # Создаем и запускаем поток
-            self.loader_thread = DataLoader(self.supabase, self.current_table)
-            self.loader_thread.data_loaded.connect(self.setup_table_data)
-            self.loader_thread.start()
+            # Загрузка в общем пуле: новая загрузка страницы отменяет предыдущую, потоки не копятся
+            self.load_request_id += 1
+            loader = DataLoader(self.supabase, self.current_table, self.load_request_id)
+            task_runner.submit(
+                loader.run, priority=PRIORITY_VISIBLE, group=LOAD_TASK_GROUP, on_partial=self.on_table_part_loaded
+            )
 
         except Exception as e:
             self.label.setText(f"Ошибка: {str(e)}")
 
 
+    def refresh_data(self):
+        """Принудительно перечитывает текущую таблицу, минуя кэш"""
+        catalog_cache.invalidate(self.current_table)
+        if self.current_table in ['works', 'materials', 'sections']:
+            catalog_cache.invalidate('works_categories' if self.current_table != 'materials' else 'materials_categories')
+        if self.current_table == 'sections':
+            catalog_cache.invalidate('section_work_category_relations')
+        self.load_data_from_supabase()
+
+    def on_table_part_loaded(self, part):
+        """Первая часть загрузки заполняет таблицу, следующие дописывают строки"""
+        if 'rows' in part:
+            self.append_table_rows(part['request_id'], part['rows'])
+        else:
+            self.setup_table_data(part)
+
     def setup_table_data(self, result):
         """Обработка загруженных данных"""
+        if result.get('request_id') != self.load_request_id or result.get('table') != self.current_table:
+            return
+
         try:
             data = result['data']
             column_order = result['column_order']
             header_names = result['header_names']
 
             if not data:
+                self.table_model.clear()
                 self.label.setText("Нет данных для отображения")
                 return
 
@@ -167,45 +212,19 @@ class PageDB(QMainWindow):
                 category_names = {str(category['id']): category['name'] for category in categories}
 
             # Очищаем предыдущие данные и кнопки
-            self.table_db.clear()
             self.hide_all_tool_buttons()
-            self.action_buttons.clear()
+            self.selected_row = None
 
-            # Устанавливаем размеры таблицы
-            self.table_db.setRowCount(len(data))
-            self.table_db.setColumnCount(len(column_order))
-
-            # Устанавливаем заголовки
-            headers = [header_names[key] for key in column_order]
-            self.table_db.setHorizontalHeaderLabels(headers)
-
-            # Заполняем таблицу данными
-            for row_idx, row_data in enumerate(data):
-                for col_idx, column_name in enumerate(column_order):
-                    value = row_data[column_name]
-                    
-                    if column_name == 'category_id' and self.current_table in ['works', 'materials']:
-                        original_id = value
-                        value = category_names.get(str(value), str(value))
-                        item = QTableWidgetItem(str(value))
-                        item.setData(Qt.ItemDataRole.UserRole, original_id)
-                        
-                    elif column_name == 'id':
-                        item = QTableWidgetItem(str(row_idx + 1))
-                        item.setData(Qt.ItemDataRole.UserRole + 1, value)
-                    else:
-                        item = QTableWidgetItem(str(value))
-
-                    item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                    self.table_db.setItem(row_idx, col_idx, item)
-
-                edit_btn = self.create_edit_btn(row_idx)
-                delete_btn = self.create_delete_btn(row_idx)
-                self.action_buttons[row_idx] = (edit_btn, delete_btn)
+            # Заполняем модель: ячейки таблица запросит сама при отрисовке
+            self.table_model.set_rows(data, column_order, header_names, category_names)
+            self.search_index.rebuild(self.table_model.search_texts(0, self.search_columns()))
+            self.perform_search()
+            for col in range(len(column_order)):
+                self.table_db.setColumnHidden(col, False)
 
             self.table_db.verticalHeader().setVisible(False)
             self.table_db.setShowGrid(False)
-            self.table_db.setFrameShape(QTableWidget.Shape.NoFrame)
+            self.table_db.setFrameShape(QTableView.Shape.NoFrame)
             self.table_db.setStyleSheet(DATA_TABLE_STYLE)
             self.table_db.viewport().update()
             self.table_db.updateGeometry()
@@ -234,11 +253,24 @@ class PageDB(QMainWindow):
                 self.loading_movie.stop()
             print('Error:', e)
         
+    def append_table_rows(self, request_id, rows):
+        """Дописывает в таблицу очередную загруженную страницу"""
+        if request_id != self.load_request_id:
+            return
+
+        try:
+            start = self.table_model.row_count
+            self.table_model.append_rows(rows)
+            self.search_index.add_rows(self.table_model.search_texts(start, self.search_columns()))
+            if self.search_input.text().strip():
+                self.perform_search()
+        except Exception as e:
+            print('Error:', e)
+
     def hide_all_tool_buttons(self):
-        """Скрывает все кнопки"""
-        for buttons in self.action_buttons.values():
-            for btn in buttons:
-                btn.hide()
+        """Скрывает кнопки действий над строкой"""
+        self.edit_btn.hide()
+        self.delete_btn.hide()
 
     def add_row(self,row):
         """Обработка редактирования строки с формой из нескольких полей"""
@@ -402,17 +434,17 @@ class PageDB(QMainWindow):
             print(f"Ошибка при создании раздела: {str(e)}")
             raise e
 
-    def update_section_with_relations(self, section_id, new_name, current_relations, new_category_ids):
+    def update_section_with_relations(self, section_id, current_name, new_name, current_relations, new_category_ids):
         try:
-            setters.update_name_section(self.supabase, section_id, new_name)
+            setters.update_entity(self.supabase, 'sections', section_id,
+                                  setters.changed_fields({'name': current_name}, {'name': new_name}))
             current_set = set(current_relations)
             new_set = set(new_category_ids)
             
             to_add = new_set - current_set
             to_remove = current_set - new_set
             
-            for category_id in to_remove:
-                setters.delete_relation(self.supabase, section_id, category_id)
+            setters.delete_relations(self.supabase, section_id, to_remove)
                 
             relation_data = [{
                 'section_id': section_id,
@@ -427,29 +459,35 @@ class PageDB(QMainWindow):
 
     def edit_row(self, row):
         """Обработка редактирования строки с формой из нескольких полей"""
-        id_item = self.table_db.item(row, 0)
-        record_id = id_item.data(Qt.ItemDataRole.UserRole + 1)        
+        row_data = self.table_model.row_data(row)
+        record_id = row_data['id']
         
         # Определяем заголовок и текущие значения
         if self.current_table in ['works', 'materials']:
             title = "Редактирование записи"
-            current_name = self.table_db.item(row, 2).text()  # Название
-            current_price = float(self.table_db.item(row, 3).text())  # Цена
-            current_unit = self.table_db.item(row, 4).text()
-            # Получаем оригинальный ID категории из UserRole
-            current_category = self.table_db.item(row, 1).data(Qt.ItemDataRole.UserRole)
+            current_name = str(row_data['name'])  # Название
+            current_price = float(row_data['price'])  # Цена
+            current_unit = str(row_data['unit'])
+            current_category = row_data['category_id']
             entity = getters.get_entity_by_id(self.supabase, self.current_table, record_id)[0]
+            original_values = {
+                'name': current_name,
+                'price': current_price,
+                'unit': current_unit,
+                'category_id': current_category,
+                'keywords': entity['keywords']
+            }
 
             current_keywords = entity["keywords"].split("!")
             keywords_inputs = []
 
         elif self.current_table in ['works_categories', 'materials_categories']:
             title = "Редактирование категории"
-            current_name = self.table_db.item(row, 1).text()  # Название категории
+            current_name = str(row_data['name'])  # Название категории
             
         elif self.current_table in ['sections']:
             title = "Редактирование раздела"
-            current_name = self.table_db.item(row, 1).text()  # Название раздела
+            current_name = str(row_data['name'])  # Название раздела
             entity = getters.get_section_realtions(self.supabase, record_id)
             
             current_relations = [item['category_id'] for item in entity]
@@ -553,32 +591,32 @@ class PageDB(QMainWindow):
                     new_unit = unit_input.text()
                     new_keywords = "!".join(inp.text() for inp in keywords_inputs)
 
-                # Обновляем данные в Supabase
-                if self.current_table == 'works':
-                    new_category_work = category_combo_work.currentData()
-                    setters.update_name_of_work(self.supabase, record_id, new_name)
-                    setters.update_price_of_work(self.supabase, record_id, new_price)
-                    setters.update_unit_of_works(self.supabase, record_id, new_unit)
-                    setters.update_category_id_of_work(self.supabase, record_id, new_category_work)
-                    setters.update_keywords_of_work(self.supabase, record_id, new_keywords)
-                elif self.current_table == 'materials':
-                    new_category_material = category_combo_material.currentData()
-                    setters.update_name_of_materials(self.supabase, record_id, new_name)
-                    setters.update_price_of_material(self.supabase, record_id, new_price)
-                    setters.update_unit_of_materials(self.supabase, record_id, new_unit)
-                    setters.update_category_id_of_material(self.supabase, record_id, new_category_material)
-                    setters.update_keywords_of_materials(self.supabase, record_id, new_keywords)
-                elif self.current_table == 'works_categories':
-                    setters.update_name_work_category(self.supabase, record_id, new_name)
-                elif self.current_table == 'materials_categories':
-                    setters.update_name_material_category(self.supabase, record_id, new_name)
+                # Обновляем данные в Supabase: одним запросом и только измененные поля
+                if self.current_table in ['works', 'materials']:
+                    if self.current_table == 'works':
+                        new_category = category_combo_work.currentData()
+                    else:
+                        new_category = category_combo_material.currentData()
+                    new_values = {
+                        'name': new_name,
+                        'price': new_price,
+                        'unit': new_unit,
+                        'category_id': new_category,
+                        'keywords': new_keywords
+                    }
+                    setters.update_entity(self.supabase, self.current_table, record_id,
+                                          setters.changed_fields(original_values, new_values))
+                elif self.current_table in ['works_categories', 'materials_categories']:
+                    setters.update_entity(self.supabase, self.current_table, record_id,
+                                          setters.changed_fields({'name': current_name}, {'name': new_name}))
                 elif self.current_table == 'sections':
                     new_category_ids = [
                         box.currentData()
                         for box in relations_inputs
                         if box.currentData() is not None
                     ]
-                    self.update_section_with_relations(record_id, new_name, current_relations, new_category_ids)
+                    self.update_section_with_relations(record_id, current_name, new_name, current_relations,
+                                                       new_category_ids)
 
                 # Обновляем таблицу
                 self.load_data_from_supabase()
@@ -681,8 +719,7 @@ class PageDB(QMainWindow):
 
     def delete_row(self, row):
         """Обработка удаления строки"""
-        id_item = self.table_db.item(row, 0)
-        record_id = id_item.data(Qt.ItemDataRole.UserRole + 1)
+        record_id = self.table_model.value(row, 'id')
 
         if self.current_table in ['works', 'materials']:
             reply = QMessageBox.question(
@@ -733,7 +770,7 @@ class PageDB(QMainWindow):
             # Создаем диалог выбора групп таблиц
             dialog = QDialog(self)
             dialog.setWindowTitle("Выбор данных для выгрузки")
-            dialog.setFixedSize(400, 200)
+            dialog.setFixedSize(400, 230)
             
             layout = QVBoxLayout()
             layout.addWidget(QLabel("Выберите данные для выгрузки:"))
@@ -748,6 +785,9 @@ class PageDB(QMainWindow):
             for checkbox in table_groups.values():
                 checkbox.setChecked(True)
                 layout.addWidget(checkbox)
+
+            diff_checkbox = QCheckBox("Только изменения после предыдущей копии")
+            layout.addWidget(diff_checkbox)
             
             # Кнопки
             btn_ok = QPushButton("Выгрузить")
@@ -767,79 +807,80 @@ class PageDB(QMainWindow):
             if not selected_groups:
                 QMessageBox.warning(self, "Ошибка", "Не выбрано ни одной группы данных!")
                 return
-            
-            # Подготовка данных
-            data = {
-                'metadata': {
-                    'backup_date': datetime.now().isoformat(),
-                    'version': BACKUP_VERSION,
-                    'tables': selected_groups
-                }
-            }
-            
+
+            # Разностная копия сравнивается с последней копией цепочки (полной или разностной)
+            previous_path = None
+            if diff_checkbox.isChecked():
+                previous_path, _ = QFileDialog.getOpenFileName(
+                    self,
+                    "Выберите предыдущую резервную копию",
+                    "",
+                    "Резервные копии (*.ndjson.gz *.ndjson.zst *.ndjson *.json)"
+                )
+                if not previous_path:
+                    return
+
+            # Файл выбирается заранее: строки пишутся в него по мере загрузки, а не после нее
+            file_filter = "NDJSON, gzip (*.ndjson.gz);;NDJSON (*.ndjson)"
+            if backup.zstd_available():
+                file_filter += ";;NDJSON, zstd (*.ndjson.zst)"
+            suffix = "_diff" if previous_path else ""
+            file_path, _ = QFileDialog.getSaveFileName(
+                self,
+                "Сохранить резервную копию БД",
+                os.path.join(
+                    os.path.dirname(previous_path) if previous_path else "",
+                    f"backup_{datetime.now().strftime('%Y%m%d_%H%M')}{suffix}.ndjson.gz"
+                ),
+                file_filter
+            )
+
+            if not file_path:
+                return
+
+            tables = [name_of_table for group in selected_groups for name_of_table in backup.BACKUP_GROUPS[group]]
+
             # Прогресс-бар
-            progress = QProgressDialog("Подготовка к выгрузке...", "Отмена", 0, len(selected_groups)*2, self)
+            progress = QProgressDialog("Подготовка к выгрузке...", "Отмена", 0, len(tables), self)
             progress.setWindowModality(Qt.WindowModality.WindowModal)
             progress.setWindowTitle("Прогресс выгрузки")
             progress.setMinimumDuration(0)
             progress.setValue(0)
-            QApplication.processEvents()
-            
-            try:
-                for group in selected_groups:
-                    if group == 'works':
-                        # Выгружаем категории работ
-                        progress.setLabelText("Выгрузка категорий работ...")
-                        data['works_categories'] = getters.get_all_table(self.supabase, 'works_categories')
-                        progress.setValue(progress.value() + 1)
-                        
-                        # Выгружаем работы
-                        progress.setLabelText("Выгрузка работ...")
-                        data['works'] = getters.get_all_table(self.supabase, 'works')
-                        progress.setValue(progress.value() + 1)
-                        
-                        progress.setLabelText("Выгрузка разделов с зависимостями...")
-                        data['sections'] = getters.get_all_table(self.supabase, 'sections')
-                        data['section_work_category_relations'] = getters.get_all_table(self.supabase, 'section_work_category_relations')
-                        progress.setValue(progress.value() + 1)
-                        
-                    elif group == 'materials':
-                        # Выгружаем категории материалов
-                        progress.setLabelText("Выгрузка категорий материалов...")
-                        data['materials_categories'] = getters.get_all_table(self.supabase, 'materials_categories')
-                        progress.setValue(progress.value() + 1)
-                        
-                        # Выгружаем материалы
-                        progress.setLabelText("Выгрузка материалов...")
-                        data['materials'] = getters.get_all_table(self.supabase, 'materials')
-                        progress.setValue(progress.value() + 1)
-                    
-                    if progress.wasCanceled():
-                        return
-                
-                # Сохранение в файл
-                progress.setLabelText("Сохранение в файл...")
-                file_path, _ = QFileDialog.getSaveFileName(
-                    self, 
-                    "Сохранить резервную копию БД",
-                    f"backup_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
-                    "JSON Files (*.json)"
-                )
-                
-                if file_path:
-                    with open(file_path, 'w', encoding='utf-8') as file:
-                        json.dump(data, file, ensure_ascii=False, indent=2)
-                    
-                    progress.setValue(len(selected_groups)*2)
-                    QMessageBox.information(self, "Успешно", f"Резервная копия сохранена в:\n{file_path}")
-                    
-            except Exception as e:
-                progress.cancel()
-                QMessageBox.critical(self, "Ошибка", f"Ошибка при выгрузке данных:\n{str(e)}")
-                
+
+            task = task_runner.submit(
+                self.run_backup, file_path, selected_groups, previous_path, priority=PRIORITY_VISIBLE,
+                on_partial=lambda part: self.on_backup_progress(progress, tables, part),
+                on_result=lambda manifest: self.on_backup_finished(progress, file_path, manifest),
+                on_error=lambda message: self.on_backup_failed(progress, message)
+            )
+            progress.canceled.connect(task.token.cancel)
+
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить резервную копию:\n{str(e)}")
 
+    def run_backup(self, token, report, file_path, groups, previous_path):
+        """Пишет резервную копию в файл (выполняется в пуле задач)"""
+        return backup.write_backup(
+            self.supabase, file_path, groups,
+            progress=lambda name_of_table, rows: report((name_of_table, rows)),
+            is_cancelled=lambda: token.is_cancelled,
+            previous_path=previous_path
+        )
+
+    def on_backup_progress(self, progress, tables, part):
+        name_of_table, rows = part
+        progress.setLabelText(f"Выгрузка таблицы {name_of_table}: {rows} строк...")
+        progress.setValue(tables.index(name_of_table))
+
+    def on_backup_finished(self, progress, file_path, manifest):
+        progress.setValue(progress.maximum())
+        rows = sum(table['rows'] for table in manifest.values())
+        QMessageBox.information(self, "Успешно", f"Резервная копия ({rows} строк) сохранена в:\n{file_path}")
+
+    def on_backup_failed(self, progress, message):
+        progress.cancel()
+        QMessageBox.critical(self, "Ошибка", f"Ошибка при выгрузке данных:\n{message}")
+
     def restore_database_from_file(self):
         """Восстановление данных с учетом связей между таблицами"""
         try:
@@ -848,15 +889,15 @@ class PageDB(QMainWindow):
                 self, 
                 "Выберите файл резервной копии",
                 "",
-                "JSON Files (*.json)"
+                "Резервные копии (*.ndjson.gz *.ndjson.zst *.ndjson *.json)"
             )
             
             if not file_path:
                 return
                 
-            # Чтение и проверка файла
-            with open(file_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
+            # Чтение и проверка файла (и нового потокового формата, и старого JSON);
+            # для разностной копии поднимается вся цепочка от полной копии
+            data = backup.load_backup_chain(file_path)
                 
             if 'metadata' not in data or 'tables' not in data['metadata']:
                 QMessageBox.critical(self, "Ошибка", "Неверный формат файла резервной копии!")
@@ -876,7 +917,7 @@ class PageDB(QMainWindow):
             # Диалог выбора групп
             dialog = QDialog(self)
             dialog.setWindowTitle("Выбор данных для восстановления")
-            dialog.setFixedSize(400, 200)
+            dialog.setFixedSize(400, 340)
             
             layout = QVBoxLayout()
             layout.addWidget(QLabel("Выберите группы данных для восстановления:"))
@@ -887,6 +928,34 @@ class PageDB(QMainWindow):
                 checkbox.setChecked(True)
                 checkboxes[group_id] = checkbox
                 layout.addWidget(checkbox)
+
+            chunk_size_layout = QHBoxLayout()
+            chunk_size_layout.addWidget(QLabel("Строк в одном запросе:"))
+            chunk_size_input = QSpinBox()
+            chunk_size_input.setRange(1, 10000)
+            chunk_size_input.setValue(backup.RESTORE_CHUNK_SIZE)
+            chunk_size_layout.addWidget(chunk_size_input)
+            layout.addLayout(chunk_size_layout)
+
+            # Все или ничего: при сбое справочники остаются прежними. Все режимы восстановления
+            # используют функции из sql/restore_catalog.sql, без них восстановление не начнется
+            atomic_checkbox = QCheckBox("Атомарно, одной транзакцией на сервере")
+            atomic_checkbox.toggled.connect(lambda checked: chunk_size_input.setValue(
+                backup.ATOMIC_CHUNK_SIZE if checked else backup.RESTORE_CHUNK_SIZE
+            ))
+            layout.addWidget(atomic_checkbox)
+
+            # Сравнить копию с текущими данными и записать только отличия (режимы взаимоисключающие).
+            # По умолчанию таблицы, как и раньше, заменяются копией целиком
+            diff_checkbox = QCheckBox("Только изменения: обновить отличающиеся строки")
+            layout.addWidget(diff_checkbox)
+
+            sql_note = QLabel("Восстановление использует функции из sql/restore_catalog.sql — "
+                              "их нужно один раз выполнить в SQL Editor проекта Supabase.")
+            sql_note.setWordWrap(True)
+            layout.addWidget(sql_note)
+            atomic_checkbox.toggled.connect(lambda checked: checked and diff_checkbox.setChecked(False))
+            diff_checkbox.toggled.connect(lambda checked: checked and atomic_checkbox.setChecked(False))
             
             btn_ok = QPushButton("Восстановить")
             btn_cancel = QPushButton("Отмена")
@@ -917,105 +986,175 @@ class PageDB(QMainWindow):
             if reply != QMessageBox.StandardButton.Yes:
                 return
                 
-            # Прогресс-бар
-            progress = QProgressDialog("Восстановление данных...", "Отмена", 0, len(selected_groups)*2, self)
-            progress.setWindowModality(Qt.WindowModality.WindowModal)
-            progress.setWindowTitle("Прогресс восстановления")
-            progress.setMinimumDuration(0)
-            
-            try:
-                for group in selected_groups:
-                    if group == 'works':
-                        # Восстанавливаем категории работ с оригинальными ID
-                        progress.setLabelText("Очистка связей разделов...")
-                        setters.clear_relations_table(self.supabase, 'section_work_category_relations')
-                        progress.setValue(progress.value() + 1)
-
-                        # Затем очищаем работы
-                        progress.setLabelText("Очистка работ...")
-                        setters.clear_table(self.supabase, 'works')
-                        progress.setValue(progress.value() + 1)
-
-                        # Теперь можно очистить категории работ
-                        progress.setLabelText("Очистка категорий работ...")
-                        setters.clear_table(self.supabase, 'works_categories')
-                        progress.setValue(progress.value() + 1)
-
-                        # Восстанавливаем категории работ с оригинальными ID
-                        progress.setLabelText("Восстановление категорий работ...")
-                        categories_data = [{'id': c['id'], 'name': c['name']} for c in data['works_categories']]
-                        setters.batch_insert_work_categories_with_ids(self.supabase, categories_data)
-                        progress.setValue(progress.value() + 1)
-
-                        # Восстанавливаем работы
-                        progress.setLabelText("Восстановление работ...")
-                        setters.batch_insert_works_fast(self.supabase, data['works'])
-                        progress.setValue(progress.value() + 1)
-
-                        # Восстанавливаем разделы и связи
-                        progress.setLabelText("Восстановление разделов...")
-                        setters.clear_table(self.supabase, 'sections')
-                        setters.batch_insert_sections_fast(self.supabase, data['sections'])
-                        progress.setValue(progress.value() + 1)
-
-                        progress.setLabelText("Восстановление связей...")
-                        setters.batch_insert_relations_sections_fast(self.supabase, data['section_work_category_relations'])
-                        progress.setValue(progress.value() + 1)
-                        
-                    elif group == 'materials':
-                        # Восстанавливаем категории материалов с оригинальными ID
-                        progress.setLabelText("Восстановление категорий материалов...")
-                        setters.clear_table(self.supabase, 'materials_categories')
-                        
-                        categories_data = [{'id': c['id'], 'name': c['name']} for c in data['materials_categories']]
-                        
-                        setters.batch_insert_material_categories_with_ids(self.supabase, categories_data)
-                            
-                        progress.setValue(progress.value() + 1)
-                        
-                        # Восстанавливаем материалы
-                        progress.setLabelText("Восстановление материалов...")
-                        setters.clear_table(self.supabase, 'materials')
-                        setters.batch_insert_materials_fast(self.supabase, data['materials'])
-                        progress.setValue(progress.value() + 1)
-                    
-                    if progress.wasCanceled():
-                        return
-                
-                progress.setValue(len(selected_groups)*2)
-                QMessageBox.information(self, "Успешно", "Данные успешно восстановлены!")
-                self.load_data_from_supabase()
-                
-            except Exception as e:
-                QMessageBox.critical(self, "Ошибка", f"Ошибка восстановления:\n{str(e)}")
-                
+            if atomic_checkbox.isChecked():
+                self.start_atomic_restore(data, selected_groups, chunk_size_input.value())
+            elif diff_checkbox.isChecked():
+                self.start_diff_restore(data, selected_groups, chunk_size_input.value())
+            else:
+                self.start_restore(backup.restore_plan(data, selected_groups, chunk_size_input.value()))
+
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось восстановить данные:\n{str(e)}")
-        
-    def create_edit_btn(self, row_idx=None):
+
+    def create_restore_progress(self, rows_total):
+        progress = QProgressDialog("Восстановление данных...", "Отмена", 0, max(rows_total, 1), self)
+        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        progress.setWindowTitle("Прогресс восстановления")
+        progress.setMinimumDuration(0)
+        progress.setValue(0)
+
+        return progress
+
+    def start_restore(self, plan):
+        """Запускает восстановление по плану в пуле задач с окном прогресса"""
+        progress = self.create_restore_progress(backup.plan_rows(plan))
+
+        # Отмена останавливает восстановление между шагами, а не снимает задачу: токен задачи не отменяется,
+        # report не бросает TaskCancelled, и результат с невыполненными шагами доходит до окна — иначе после
+        # очистки таблиц пользователь не узнал бы, что они пусты
+        stop = CancellationToken()
+        task_runner.submit(
+            self.run_restore, plan, stop, priority=PRIORITY_VISIBLE,
+            on_partial=lambda part: self.on_restore_progress(progress, part),
+            on_result=lambda result: self.on_restore_finished(progress, result, stop.is_cancelled),
+            on_error=lambda message: self.on_restore_failed(progress, message)
+        )
+        progress.canceled.connect(stop.cancel)
+
+    def start_atomic_restore(self, data, groups, chunk_size):
+        """Запускает атомарное восстановление: при ошибке данные в базе не меняются"""
+        rows_total = sum(len(data[name_of_table]) for group in groups for name_of_table in backup.BACKUP_GROUPS[group])
+        progress = self.create_restore_progress(rows_total)
+
+        stop = CancellationToken()
+        task_runner.submit(
+            self.run_atomic_restore, data, groups, chunk_size, stop, priority=PRIORITY_VISIBLE,
+            on_partial=lambda part: self.on_restore_progress(progress, part),
+            on_result=lambda result: self.on_restore_finished(progress, result),
+            on_error=lambda message: self.on_restore_failed(
+                progress, "Восстановление отменено" if stop.is_cancelled else message, "Данные в базе не изменены."
+            )
+        )
+        progress.canceled.connect(stop.cancel)
+
+    def start_diff_restore(self, data, groups, chunk_size):
+        """Запускает восстановление только отличающихся строк; сколько их, становится известно после сравнения"""
+        progress = self.create_restore_progress(0)
+        progress.setLabelText("Сравнение копии с текущими данными...")
+
+        stop = CancellationToken()
+        task_runner.submit(
+            self.run_diff_restore, data, groups, chunk_size, stop, priority=PRIORITY_VISIBLE,
+            on_partial=lambda part: self.on_restore_progress(progress, part),
+            on_result=lambda result: self.on_restore_finished(progress, result, stop.is_cancelled),
+            on_error=lambda message: self.on_restore_failed(progress, message)
+        )
+        progress.canceled.connect(stop.cancel)
+
+    def run_diff_restore(self, token, report, data, groups, chunk_size, stop):
+        """Сравнивает копию с таблицами и записывает отличия (выполняется в пуле задач)"""
+        try:
+            plan = backup.diff_restore_plan(
+                self.supabase, data, groups, chunk_size, is_cancelled=lambda: stop.is_cancelled
+            )
+        except backup.BackupCancelled:
+            # Отменили во время сравнения — ничего еще не записано
+            return backup.RestoreResult(0, 0.0, {}, [])
+
+        return self.run_restore(token, report, plan, stop)
+
+    def run_atomic_restore(self, token, report, data, groups, chunk_size, stop):
+        """Складывает строки на сервер и заменяет таблицы одной транзакцией (выполняется в пуле задач)"""
+        return backup.restore_atomic(
+            self.supabase, data, groups, chunk_size,
+            progress=lambda rows_done, rows_total, rows_per_second: report((rows_done, rows_total, rows_per_second)),
+            is_cancelled=lambda: stop.is_cancelled
+        )
+
+    def run_restore(self, token, report, plan, stop):
+        """Восстанавливает данные (выполняется в пуле задач); после отмены возвращает невыполненные шаги"""
+        return backup.run_restore(
+            self.supabase, plan,
+            progress=lambda rows_done, rows_total, rows_per_second: report((rows_done, rows_total, rows_per_second)),
+            is_cancelled=lambda: stop.is_cancelled
+        )
+
+    def on_restore_progress(self, progress, part):
+        if progress.wasCanceled():
+            return
+
+        rows_done, rows_total, rows_per_second = part
+        progress.setMaximum(max(rows_total, 1))
+        progress.setLabelText(f"Восстановлено {rows_done} из {rows_total} строк ({rows_per_second:.0f} строк/с)...")
+        progress.setValue(rows_done)
+
+    def on_restore_finished(self, progress, result, cancelled=False):
+        if not progress.wasCanceled():
+            progress.setValue(progress.maximum())
+        self.load_data_from_supabase()
+
+        speed = result.rows / result.seconds if result.seconds else 0
+        if not result.pending and not result.rows:
+            if cancelled:
+                QMessageBox.information(self, "Восстановление отменено", "Восстановление отменено, данные не изменены")
+            else:
+                QMessageBox.information(self, "Успешно", "Данные уже совпадают с резервной копией")
+            return
+
+        if not result.pending:
+            QMessageBox.information(
+                self, "Успешно",
+                f"Данные успешно восстановлены!\nСтрок: {result.rows} за {result.seconds:.1f} с ({speed:.0f} строк/с)"
+            )
+            return
+
+        steps = sum(len(group_steps) for group_steps in result.pending.values())
+        if cancelled and not result.errors:
+            title = "Восстановление прервано"
+            details = f"Восстановление отменено, записано строк: {result.rows}. Таблицы восстановлены не полностью."
+        else:
+            title = "Ошибка восстановления"
+            details = "\n".join(result.errors)
+        reply = QMessageBox.question(
+            self,
+            title,
+            f"Не выполнено шагов: {steps}\n{details}\n\nПовторить невыполненные шаги?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+
+        if reply == QMessageBox.StandardButton.Yes:
+            self.start_restore(result.pending)
+
+    def on_restore_failed(self, progress, message, note=None):
+        progress.cancel()
+        QMessageBox.critical(
+            self, "Ошибка", f"Ошибка восстановления:\n{message}" + (f"\n\n{note}" if note else "")
+        )
+
+    def create_edit_btn(self, table_db):
         edit_btn = QToolButton()
         edit_btn.setObjectName("editToolButton")
         edit_btn.setStyleSheet(ACTION_BUTTONS_STYLE)
         edit_btn.setText("✏️")
         edit_btn.setToolTip("Редактировать")
-        edit_btn.clicked.connect(lambda _, r=row_idx: self.edit_row(r))
+        edit_btn.clicked.connect(lambda: self.selected_row is not None and self.edit_row(self.selected_row))
 
-        # Размещаем кнопки поверх таблицы
-        edit_btn.setParent(self.table_db.viewport())
+        # Одна кнопка на всю таблицу, перемещается к выбранной строке
+        edit_btn.setParent(table_db.viewport())
         edit_btn.hide()
 
         return edit_btn
 
-    def create_delete_btn(self, row_idx=None):
+    def create_delete_btn(self, table_db):
         delete_btn = QToolButton()
         delete_btn.setObjectName("deleteToolButton")
         delete_btn.setStyleSheet(ACTION_BUTTONS_STYLE)
         delete_btn.setText("🗑️")
         delete_btn.setToolTip("Удалить")
-        delete_btn.clicked.connect(lambda _, r=row_idx: self.delete_row(r))
+        delete_btn.clicked.connect(lambda: self.selected_row is not None and self.delete_row(self.selected_row))
 
-        # Размещаем кнопки поверх таблицы
-        delete_btn.setParent(self.table_db.viewport())
+        # Одна кнопка на всю таблицу, перемещается к выбранной строке
+        delete_btn.setParent(table_db.viewport())
         delete_btn.hide()
 
         return delete_btn
@@ -1024,7 +1163,7 @@ class PageDB(QMainWindow):
         # Кнопка загрузки данных
         refresh_button = QPushButton("Обновить")
         refresh_button.setStyleSheet(PRIMARY_BUTTON_STYLE)
-        refresh_button.clicked.connect(self.load_data_from_supabase)
+        refresh_button.clicked.connect(self.refresh_data)
 
         return refresh_button
 
@@ -1054,78 +1193,81 @@ class PageDB(QMainWindow):
         self.search_input.setPlaceholderText("Поиск по названию и категории...")
         self.search_input.setClearButtonEnabled(True)
         self.search_input.setStyleSheet(SEARCH_STYLE)
-        self.search_input.textChanged.connect(self.perform_search)
+
+        # Поиск запускается после паузы в наборе, а не на каждую клавишу
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.perform_search)
+
+        self.search_input.textChanged.connect(self.search_timer.start)
         self.search_input.textChanged.connect(self.hide_all_tool_buttons)
         
         return self.search_input
 
-    def perform_search(self):
+    def search_columns(self):
+        """Колонки, по которым ищет поиск: категория, название и ключевые слова"""
         CATEGORY_COLUMN = 1
         NAME_COLUMN = 2
         KEYWORDS_COLUMN = 5
-        
-        search_text = self.search_input.text().strip().lower()
-        search_words = search_text.split()
+
+        column_order = self.table_model.column_order
+        return [
+            column_order[col] for col in (CATEGORY_COLUMN, NAME_COLUMN, KEYWORDS_COLUMN) if col < len(column_order)
+        ]
+
+    def perform_search(self):
+        search_text = self.search_input.text().strip()
+
+        self.selected_row = None
+        self.hide_all_tool_buttons()
 
         if not search_text:
-            for row in range(self.table_db.rowCount()):
-                self.table_db.setRowHidden(row, False)
+            self.table_model.set_filter(None)
             return
-        
-        for row in range(self.table_db.rowCount()):
-            category_text = ""
-            name_text = ""
-            keywords_text = ""
-            
-            category_item = self.table_db.item(row, CATEGORY_COLUMN)
-            if category_item:
-                category_text = category_item.text().lower()
-            
-            name_item = self.table_db.item(row, NAME_COLUMN)
-            if name_item:
-                name_text = name_item.text().lower()
-                
-            keywords_item = self.table_db.item(row, KEYWORDS_COLUMN)
-            if keywords_item:
-                keywords_text = keywords_item.text().lower()
-            
-            # Объединяем текст из обеих колонок для поиска
-            combined_text = f"{category_text} {name_text} {keywords_text}"
-            
-            # Проверяем, что все слова поиска присутствуют в объединенном тексте
-            match_found = all(word in combined_text for word in search_words)
-            
-            # Скрываем/показываем строку
-            self.table_db.setRowHidden(row, not match_found)
+
+        # Все слова поиска должны встречаться в категории, названии или ключевых словах
+        self.table_model.set_filter(self.search_index.search(search_text))
 
     def create_table_db(self):
-        table_db = QTableWidget()
+        table_db = QTableView()
+        table_db.setModel(self.table_model)
         table_db.setStyleSheet(DATA_TABLE_STYLE)
-        table_db.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
-        table_db.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)  # Выделение всей строки
-        table_db.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
+        table_db.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
+        table_db.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)  # Выделение всей строки
+        table_db.setSelectionMode(QTableView.SelectionMode.SingleSelection)
         table_db.setMouseTracking(True)  # Включаем отслеживание мыши
         table_db.viewport().installEventFilter(self)  # Устанавливаем фильтр событий
 
-        table_db.itemSelectionChanged.connect(self.on_row_selected)
+        self.edit_btn = self.create_edit_btn(table_db)
+        self.delete_btn = self.create_delete_btn(table_db)
+
+        table_db.selectionModel().selectionChanged.connect(self.on_row_selected)
+        table_db.verticalScrollBar().valueChanged.connect(self.on_table_scrolled)
         return table_db
 
     def on_row_selected(self):
         """Обработчик выбора строки - показывает кнопки для выбранной строки"""
-        selected = self.table_db.selectedItems()
+        selected = self.table_db.selectionModel().selectedRows()
         if selected:
-            row = selected[0].row()
-            self.show_tool_buttons(row)
+            self.selected_row = selected[0].row()
+            self.show_tool_buttons(self.selected_row)
         else:
+            self.selected_row = None
             self.hide_all_tool_buttons()
 
+    def on_table_scrolled(self):
+        """Кнопки едут вместе с выбранной строкой при прокрутке"""
+        if self.selected_row is not None:
+            self.show_tool_buttons(self.selected_row)
+
     def show_tool_buttons(self, row):
         """Показывает кнопки для выбранной строки"""
         self.hide_all_tool_buttons()
         
-        if row in self.action_buttons:
-            edit_btn, delete_btn = self.action_buttons[row]
-            rect = self.table_db.visualRect(self.table_db.model().index(row, 0))
+        if 0 <= row < self.table_model.rowCount() and not self.table_db.isRowHidden(row):
+            edit_btn, delete_btn = self.edit_btn, self.delete_btn
+            rect = self.table_db.visualRect(self.table_model.index(row, 0))
             table_width = self.table_db.viewport().width()
             btn_width = edit_btn.sizeHint().width()
             spacing = 5
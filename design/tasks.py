@@ -0,0 +1,128 @@
+import threading
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+# Приоритеты задач: чего пользователь ждет прямо сейчас, то и выполняется первым
+PRIORITY_INTERACTIVE = 20
+PRIORITY_VISIBLE = 10
+PRIORITY_BACKGROUND = 0
+
+MAX_THREADS = 4
+
+
+class TaskCancelled(Exception):
+    """Задача отменена, ее результат никому не нужен"""
+
+
+class CancellationToken:
+    """Флаг отмены, который задача проверяет между шагами"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def is_cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise TaskCancelled()
+
+
+class TaskSignals(QObject):
+    result = pyqtSignal(object)
+    partial = pyqtSignal(object)
+    error = pyqtSignal(str)
+    finished = pyqtSignal()
+
+
+class Task(QRunnable):
+    """Задача пула: вызывает fn(token, report, *args); report(value) отправляет промежуточный результат"""
+
+    def __init__(self, fn, args, token):
+        super().__init__()
+        # Объект живет, пока на него ссылается TaskRunner, а не удаляется пулом сразу после run
+        self.setAutoDelete(False)
+        self.fn = fn
+        self.args = args
+        self.token = token
+        self.signals = TaskSignals()
+
+    def report(self, value):
+        self.token.raise_if_cancelled()
+        self.signals.partial.emit(value)
+
+    def run(self):
+        try:
+            self.token.raise_if_cancelled()
+            result = self.fn(self.token, self.report, *self.args)
+            if not self.token.is_cancelled:
+                self.signals.result.emit(result)
+        except TaskCancelled:
+            pass
+        except Exception as e:
+            print(f"Ошибка в фоновой задаче: {e}")
+            if not self.token.is_cancelled:
+                self.signals.error.emit(str(e))
+        finally:
+            self.signals.finished.emit()
+
+
+class TaskRunner:
+    """Общий пул фоновых загрузок с ограничением числа потоков, приоритетами и отменой"""
+
+    def __init__(self, max_threads=MAX_THREADS):
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max_threads)
+        self._tasks = set()
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, priority=PRIORITY_VISIBLE, group=None, token=None,
+               on_result=None, on_partial=None, on_error=None):
+        """Ставит fn в очередь; новая задача группы отменяет предыдущую задачу этой же группы
+
+        Обработчики on_* подключаются до запуска: подключенные после start могут пропустить сигналы
+        задачи, которая успела выполниться.
+        """
+        token = token or CancellationToken()
+        task = Task(fn, args, token)
+        for signal, handler in (
+            (task.signals.result, on_result), (task.signals.partial, on_partial), (task.signals.error, on_error)
+        ):
+            if handler is not None:
+                signal.connect(handler)
+
+        with self._lock:
+            if group is not None:
+                previous = self._groups.get(group)
+                if previous is not None:
+                    previous.cancel()
+                self._groups[group] = token
+            self._tasks.add(task)
+
+        task.signals.finished.connect(lambda: self._forget(task, group))
+        self.pool.start(task, priority)
+
+        return task
+
+    def cancel_group(self, group):
+        with self._lock:
+            token = self._groups.pop(group, None)
+        if token is not None:
+            token.cancel()
+
+    def _forget(self, task, group):
+        with self._lock:
+            self._tasks.discard(task)
+            if group is not None and self._groups.get(group) is task.token:
+                del self._groups[group]
+
+    def active_count(self):
+        return self.pool.activeThreadCount()
+
+
+task_runner = TaskRunner()
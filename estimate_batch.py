@@ -0,0 +1,102 @@
+import numpy as np
+
+
+def round_cents(values):
+    """Округляет массив до копеек так же, как round(value, 2), и возвращает целые копейки"""
+    values = np.asarray(values, dtype=np.float64)
+    scaled = values * 100
+    cents = np.rint(scaled)
+
+    # Вблизи половины копейки умножение на 100 может перейти границу округления,
+    # такие значения округляем самим round, как это делает модель
+    fraction = np.abs(scaled - np.floor(scaled) - 0.5)
+    ambiguous = np.flatnonzero(fraction <= 1e-9 * np.maximum(np.abs(scaled), 1.0))
+    for i in ambiguous:
+        cents[i] = round(round(float(values[i]), 2) * 100)
+
+    return cents.astype(np.int64)
+
+
+class EstimateArrays:
+    """Смета в виде массивов: количества и цены строк с номерами работы и раздела для пакетного пересчета"""
+
+    def __init__(self, estimate):
+        self.estimate = estimate
+
+        works = [work for section in estimate for work in section.works]
+        materials = [material for work in works for material in work.materials]
+        self.works = works
+        self.materials = materials
+
+        self.work_section = np.fromiter(
+            (i for i, section in enumerate(estimate) for _ in section.works), dtype=np.int64, count=len(works)
+        )
+        self.work_quantity = np.fromiter((work.quantity for work in works), dtype=np.float64, count=len(works))
+        self.work_price = np.fromiter((work.labor_cost for work in works), dtype=np.float64, count=len(works))
+
+        self.material_work = np.fromiter(
+            (i for i, work in enumerate(works) for _ in work.materials), dtype=np.int64, count=len(materials)
+        )
+        self.material_quantity = np.fromiter(
+            (material.quantity for material in materials), dtype=np.float64, count=len(materials)
+        )
+        self.material_price = np.fromiter(
+            (material.price for material in materials), dtype=np.float64, count=len(materials)
+        )
+
+        self.work_total_cents = None
+        self.material_total_cents = None
+        self.work_materials_cents = None
+        self.section_cents = None
+
+    def scale_prices(self, percent, works=False, materials=True):
+        """Меняет цены на percent процентов с округлением до копеек"""
+        factor = 1 + percent / 100
+        if works:
+            self.work_price = round_cents(self.work_price * factor) / 100
+        if materials:
+            self.material_price = round_cents(self.material_price * factor) / 100
+
+    def set_prices_by_name(self, work_prices, material_prices):
+        """Подставляет цены из справочника по названию, строки без совпадения не меняются"""
+        for prices, items, target in (
+            (work_prices, self.works, self.work_price),
+            (material_prices, self.materials, self.material_price)
+        ):
+            for i, item in enumerate(items):
+                price = prices.get(item.name)
+                if price is not None:
+                    target[i] = round(float(price), 2)
+
+    def compute(self):
+        """Считает суммы строк, работ и разделов за один проход по массивам"""
+        self.work_total_cents = round_cents(self.work_quantity * self.work_price)
+        self.material_total_cents = round_cents(self.material_quantity * self.material_price)
+
+        # Сумма копеек точна, поэтому совпадает с round(сумма сумм материалов, 2) в модели
+        self.work_materials_cents = np.bincount(
+            self.material_work, weights=self.material_total_cents, minlength=len(self.works)
+        ).astype(np.int64)
+
+        sections_count = len(self.estimate)
+        self.section_cents = np.stack([
+            np.bincount(self.work_section, weights=self.work_total_cents, minlength=sections_count),
+            np.bincount(self.work_section, weights=self.work_materials_cents, minlength=sections_count)
+        ], axis=1).astype(np.int64)
+
+    def apply(self):
+        """Записывает цены и суммы обратно в элементы сметы"""
+        for work, price, total, materials_total in zip(
+            self.works, self.work_price.tolist(), self.work_total_cents.tolist(), self.work_materials_cents.tolist()
+        ):
+            work.labor_cost = price
+            work.total_work = total / 100
+            work.total_materials = materials_total / 100
+
+        for material, price, total in zip(
+            self.materials, self.material_price.tolist(), self.material_total_cents.tolist()
+        ):
+            material.price = price
+            material.total = total / 100
+
+        return self.section_cents.tolist()
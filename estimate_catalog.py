@@ -0,0 +1,168 @@
+import heapq
+import threading
+from operator import itemgetter
+
+import getters
+
+CATALOG_TABLES = (
+    'sections', 'works_categories', 'materials_categories', 'works', 'materials', 'section_work_category_relations'
+)
+
+
+class CatalogState:
+    """Загруженные таблицы и производные индексы одной версии справочников
+
+    Индексы, исходные таблицы которых не перезагружались, берутся из предыдущей версии без пересчета.
+    """
+
+    def __init__(self, version, tables, previous=None):
+        self.version = version
+        self.tables = tables
+
+        def unchanged(*names):
+            return previous is not None and all(previous.tables.get(name) is tables.get(name) for name in names)
+
+        if unchanged('section_work_category_relations'):
+            self.section_categories = previous.section_categories
+        else:
+            self.section_categories = {}
+            for relation in tables.get('section_work_category_relations', []):
+                self.section_categories.setdefault(relation['section_id'], []).append(relation['category_id'])
+
+        if unchanged('sections'):
+            self.section_ids = previous.section_ids
+        else:
+            self.section_ids = {section['name']: section['id'] for section in tables.get('sections', [])}
+
+        # category_id -> работы категории в порядке таблицы, вместе с позицией работы в таблице
+        if unchanged('works'):
+            self.works_by_category = previous.works_by_category
+        else:
+            self.works_by_category = {}
+            for position, work in enumerate(tables.get('works', [])):
+                self.works_by_category.setdefault(work.get('category_id'), []).append((position, work))
+
+        # Списки для раздела собираются при первом открытии и живут до следующей версии затронутых таблиц
+        if unchanged('section_work_category_relations', 'works'):
+            self.section_works = previous.section_works
+        else:
+            self.section_works = {}
+
+        if unchanged('section_work_category_relations', 'works_categories'):
+            self.section_category_lists = previous.section_category_lists
+        else:
+            self.section_category_lists = {}
+
+    def works_for_section(self, section_id):
+        """Работы категорий раздела в порядке таблицы работ"""
+        works = self.section_works.get(section_id)
+        if works is None:
+            groups = [self.works_by_category.get(category_id, []) for category_id in
+                      dict.fromkeys(self.section_categories.get(section_id, []))]
+            works = [work for _, work in heapq.merge(*groups, key=itemgetter(0))]
+            self.section_works[section_id] = works
+
+        return works
+
+    def categories_for_section(self, section_id):
+        categories = self.section_category_lists.get(section_id)
+        if categories is None:
+            category_ids = set(self.section_categories.get(section_id, []))
+            categories = [
+                category for category in self.tables.get('works_categories', []) if category['id'] in category_ids
+            ]
+            self.section_category_lists[section_id] = categories
+
+        return categories
+
+
+class EstimateCatalog:
+    """Справочники для редактора сметы в памяти: загружаются один раз и обновляются в фоне после изменений"""
+
+    def __init__(self, supabase):
+        self.supabase = supabase
+        # Состояние подменяется целиком, поэтому читатель всегда видит одну согласованную версию
+        self.state = CatalogState(0, {})
+        self._loaded = threading.Event()
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._refreshing = False
+
+    @property
+    def version(self):
+        """Номер версии растет с каждой перезагрузкой — по нему производные индексы понимают, что устарели"""
+        return self.state.version
+
+    def is_loaded(self):
+        return self._loaded.is_set()
+
+    def wait_loaded(self, timeout=None):
+        return self._loaded.wait(timeout)
+
+    def load_in_background(self, tables=None):
+        """Ставит таблицы в очередь на перезагрузку; одновременно идет не больше одной перезагрузки"""
+        with self._lock:
+            self._pending.update(tables or CATALOG_TABLES)
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        thread = threading.Thread(target=self._refresh_pending, daemon=True)
+        thread.start()
+
+    def on_cache_invalidated(self, name_of_table=None):
+        """Обработчик сброса кэша справочников: перечитывает измененную таблицу в фоне"""
+        if name_of_table is None:
+            self.load_in_background()
+        elif name_of_table in CATALOG_TABLES:
+            self.load_in_background([name_of_table])
+
+    def _refresh_pending(self):
+        while True:
+            with self._lock:
+                tables = self._pending
+                self._pending = set()
+                if not tables:
+                    self._refreshing = False
+                    return
+
+            try:
+                self.load(tables)
+            except Exception as e:
+                print(f"Не удалось обновить справочники сметы: {e}")
+
+    def load(self, tables=None):
+        """Загружает таблицы (через кэш и локальную копию) и подменяет состояние"""
+        state = self.state
+        new_tables = dict(state.tables)
+
+        # Пока справочники не загружены целиком, частичная перезагрузка загружает все таблицы
+        if tables is None or not self.is_loaded():
+            tables = CATALOG_TABLES
+
+        for name_of_table in tables:
+            new_tables[name_of_table] = getters.get_all_table(self.supabase, name_of_table)
+
+        self.state = CatalogState(state.version + 1, new_tables, state)
+        self._loaded.set()
+
+    def sections(self):
+        return self.state.tables.get('sections', [])
+
+    def categories(self, category_type):
+        """Категории работ или материалов (category_type — "works" или "materials")"""
+        return self.state.tables.get(f"{category_type}_categories", [])
+
+    def entities(self, category_type):
+        """Все работы или материалы"""
+        return self.state.tables.get(category_type, [])
+
+    def section_categories(self, section_id):
+        return self.state.categories_for_section(section_id)
+
+    def section_works(self, section_id):
+        """Работы, доступные в разделе, — поиск по готовому индексу без фильтрации всей таблицы"""
+        return self.state.works_for_section(section_id)
+
+    def section_id_by_name(self, name_of_section):
+        return self.state.section_ids.get(name_of_section)
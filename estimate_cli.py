@@ -0,0 +1,95 @@
+"""Пакетный экспорт сохраненных смет в PDF и JSON с итогами без запуска интерфейса
+
+Пример: python estimate_cli.py сметы/*.json --output-dir pdf --jobs 8
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from estimate_pdf import build_estimate_pdf, load_snapshot
+
+DEFAULT_LOGO_PATH = str(Path(__file__).parent / "design" / "logo.png")
+
+
+def output_names(paths):
+    """Имена результатов без расширения: путь сметы относительно общего каталога всех смет
+
+    Так одноименные сметы из разных каталогов не перезаписывают результаты друг друга.
+    """
+    absolute = [os.path.abspath(path) for path in paths]
+    if not absolute:
+        return []
+    common = os.path.commonpath([os.path.dirname(path) for path in absolute])
+
+    return [os.path.splitext(os.path.relpath(path, common))[0] for path in absolute]
+
+
+def export_estimate(estimate_path, output_dir, logo_path, with_totals, name=None):
+    """Строит PDF (и JSON с итогами) для одного файла сметы, возвращает пути результатов
+
+    name — путь результата относительно output_dir без расширения, по умолчанию имя файла сметы.
+    """
+    snapshot = load_snapshot(estimate_path)
+    name = name or Path(estimate_path).stem
+    os.makedirs(os.path.dirname(os.path.join(output_dir, name)) or '.', exist_ok=True)
+
+    pdf_path = os.path.join(output_dir, f"{name}.pdf")
+    build_estimate_pdf(snapshot, pdf_path, logo_path)
+
+    result = [pdf_path]
+    if with_totals:
+        totals_path = os.path.join(output_dir, f"{name}.totals.json")
+        with open(totals_path, 'w', encoding='utf-8') as file:
+            json.dump(snapshot.totals._asdict(), file, ensure_ascii=False, indent=2)
+        result.append(totals_path)
+
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Экспорт сохраненных смет в PDF")
+    parser.add_argument('estimates', nargs='+', help="файлы смет (.json), можно шаблоны вида dir/*.json")
+    parser.add_argument('-o', '--output-dir', default='.', help="каталог для PDF и итогов")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help="число процессов")
+    parser.add_argument('--logo', default=DEFAULT_LOGO_PATH, help="логотип в шапке документа")
+    parser.add_argument('--no-totals', action='store_true', help="не сохранять JSON с итогами")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    paths = []
+    for pattern in args.estimates:
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    # Одна и та же смета, попавшая под несколько шаблонов, экспортируется один раз
+    paths = list({os.path.abspath(path): path for path in paths}.values())
+    names = output_names(paths)
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(args.jobs or 1, 1)) as executor:
+        futures = {
+            executor.submit(export_estimate, path, args.output_dir, args.logo, not args.no_totals, name): path
+            for path, name in zip(paths, names)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                outputs = future.result()
+                print(f"[{done}/{len(paths)}] {path} -> {', '.join(outputs)}")
+            except Exception as e:
+                failed += 1
+                print(f"[{done}/{len(paths)}] Не удалось экспортировать {path}: {e}", file=sys.stderr)
+
+    print(f"Готово: {len(paths) - failed} из {len(paths)}")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
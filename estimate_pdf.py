@@ -0,0 +1,457 @@
+import json
+import os
+from collections import namedtuple
+
+ESTIMATE_FILE_VERSION = 1
+
+# Доля хода экспорта, отведенная подготовке строк таблицы; остальное — верстка страниц
+PREPARE_SHARE = 30
+REPORT_EVERY_LINES = 200
+# Примерное число строк сметы на странице, нужно только для оценки хода верстки
+LINES_PER_PAGE = 20
+
+# Неизменяемый снимок сметы: экспорт в фоне не видит правок, сделанных после его запуска
+MaterialSnapshot = namedtuple('MaterialSnapshot', ['name', 'unit', 'quantity', 'price', 'total'])
+WorkSnapshot = namedtuple('WorkSnapshot', [
+    'name', 'unit', 'quantity', 'labor_cost', 'total_work', 'total_materials', 'total', 'materials'
+])
+SectionSnapshot = namedtuple('SectionSnapshot', ['name', 'works'])
+TotalsSnapshot = namedtuple('TotalsSnapshot', ['works', 'materials', 'delivery', 'total'])
+EstimateSnapshot = namedtuple('EstimateSnapshot', ['sections', 'totals'])
+
+
+class ExportCancelled(Exception):
+    """Экспорт остановлен пользователем"""
+
+
+def snapshot_estimate(model):
+    """Снимает копию сметы из EstimateDataModel"""
+    sections = tuple(
+        SectionSnapshot(section.name, tuple(
+            WorkSnapshot(
+                work.name, work.unit, work.quantity, work.labor_cost, work.total_work, work.total_materials,
+                model.total_sum_work_and_materials(section_index, work_index),
+                tuple(
+                    MaterialSnapshot(material.name, material.unit, material.quantity, material.price, material.total)
+                    for material in work.materials
+                )
+            )
+            for work_index, work in enumerate(section.works)
+        ))
+        for section_index, section in enumerate(model.estimate)
+    )
+
+    return EstimateSnapshot(sections, TotalsSnapshot(**model.totals()))
+
+
+def snapshot_to_dict(snapshot):
+    """Снимок в виде словаря для сохранения сметы в JSON"""
+    return {
+        'version': ESTIMATE_FILE_VERSION,
+        'sections': [
+            {
+                'name': section.name,
+                'works': [
+                    dict(work._asdict(), materials=[material._asdict() for material in work.materials])
+                    for work in section.works
+                ]
+            }
+            for section in snapshot.sections
+        ],
+        'totals': snapshot.totals._asdict()
+    }
+
+
+def snapshot_from_dict(data):
+    """Снимок из словаря, сохраненного snapshot_to_dict"""
+    sections = tuple(
+        SectionSnapshot(section['name'], tuple(
+            WorkSnapshot(**dict(work, materials=tuple(MaterialSnapshot(**material) for material in work['materials'])))
+            for work in section['works']
+        ))
+        for section in data['sections']
+    )
+
+    return EstimateSnapshot(sections, TotalsSnapshot(**data['totals']))
+
+
+def save_snapshot(snapshot, file_path):
+    with open(file_path, 'w', encoding='utf-8') as file:
+        json.dump(snapshot_to_dict(snapshot), file, ensure_ascii=False, indent=2)
+
+
+def load_snapshot(file_path):
+    with open(file_path, encoding='utf-8') as file:
+        return snapshot_from_dict(json.load(file))
+
+
+def snapshot_lines_count(snapshot):
+    return sum(len(work.materials) or 1 for section in snapshot.sections for work in section.works)
+
+
+def safe_format_float(value, default="0.0"):
+    try:
+        return f"{float(str(value).replace(',', '.')):.1f}" if value else default
+    except (ValueError, TypeError):
+        return default
+
+
+def safe_str(value, default=""):
+    return str(value).strip() if value else default
+
+
+def build_estimate_pdf(snapshot, file_path, logo_path=None, progress=None, is_cancelled=None):
+    """Строит PDF сметы из снимка; progress(percent) сообщает ход, is_cancelled() прерывает экспорт"""
+    def report(percent):
+        if is_cancelled is not None and is_cancelled():
+            raise ExportCancelled()
+        if progress is not None:
+            progress(percent)
+
+    # PDF пишется во временный файл и заменяет file_path только целиком: при отмене или ошибке ReportLab
+    # недописанный файл удаляется, а прежний файл с тем же именем остается нетронутым
+    part_path = f"{file_path}.part"
+    try:
+        _build(snapshot, part_path, logo_path, report)
+        os.replace(part_path, file_path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+    # Файл уже записан: отмена после этого не должна его удалять
+    if progress is not None:
+        progress(100)
+
+
+def _build(snapshot, file_path, logo_path, report):
+    # ReportLab импортируется долго, поэтому только при первом экспорте, а не при запуске приложения
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import mm
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, LongTable
+
+    # Создаем документ PDF
+    doc = SimpleDocTemplate(
+        file_path,
+        pagesize=landscape(A4),
+        leftMargin=5 * mm,
+        rightMargin=5 * mm,
+        topMargin=5 * mm,
+        bottomMargin=5 * mm
+    )
+
+    # Регистрируем шрифты
+    try:
+        pdfmetrics.registerFont(TTFont('Arial', 'arial.ttf'))
+        pdfmetrics.registerFont(TTFont('Arial-Bold', 'arialbd.ttf'))
+        pdfmetrics.registerFont(TTFont('Arial-BoldItalic', 'arialbi.ttf'))
+    except:
+        pass
+
+    # Стили текста
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'Title',
+        parent=styles['Heading1'],
+        fontName='Arial-Bold',
+        fontSize=16,
+        alignment=0,
+        spaceAfter=5
+    )
+    subtitle_style = ParagraphStyle(
+        'Subtitle',
+        parent=styles['Heading2'],
+        fontName='Arial',
+        fontSize=12,
+        alignment=0,
+        spaceAfter=10
+    )
+    table_header_style = ParagraphStyle(
+        'TableHeader',
+        parent=styles['Normal'],
+        fontName='Arial-Bold',
+        fontSize=8,
+        alignment=TA_CENTER,
+        leading=10
+    )
+    table_text_style = ParagraphStyle(
+        'TableText',
+        parent=styles['Normal'],
+        fontName='Arial',
+        fontSize=8,
+        leading=10,
+        wordWrap='LTR'
+    )
+    summary_text_style = ParagraphStyle(
+        'SummaryText',
+        parent=styles['Normal'],
+        fontName='Arial-BoldItalic',
+        alignment=2,
+        fontSize=8,
+        leading=10
+    )
+    summary_value_style = ParagraphStyle(
+        'SummaryValue',
+        parent=styles['Normal'],
+        fontName='Arial-BoldItalic',
+        alignment=1,
+        fontSize=8,
+        leading=10
+    )
+    summary_title_style = ParagraphStyle(
+        'SummaryTitle',
+        parent=styles['Normal'],
+        fontName='Arial-Bold',
+        alignment=1,
+        fontSize=8,
+        leading=10
+    )
+
+    # Содержимое документа
+    elements = []
+    try:
+        if logo_path and os.path.exists(logo_path):
+            # Создаем таблицу с двумя колонками для логотипа и заголовка
+            logo_table_data = [
+                [Image(logo_path, width=100, height=100), Paragraph("Стоимость работ", title_style)]
+            ]
+            logo_table = Table(logo_table_data, colWidths=[100, doc.width - 100])
+            logo_table.setStyle(TableStyle([
+                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+                ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+                ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+            ]))
+            elements.append(logo_table)
+        else:
+            elements.append(Paragraph("Стоимость работ", title_style))
+            if logo_path:
+                print("Логотип не найден по пути:", logo_path)
+    except Exception as logo_error:
+        elements.append(Paragraph("Стоимость работ", title_style))
+        print(f"Не удалось загрузить логотип: {logo_error}")
+
+    # Подготовка данных таблицы
+    headers = [
+        "№ п/п", "Наименование работ и затрат", "Ед.изм.", "К-во",
+        "Фактический ФОТ", "Фактический ФОТ", "Наименование материалов", "Ед.изм.",
+        "", "", "", "Всего"
+    ]
+
+    fot_labels = [
+        "", "", "", "",
+        "на ед.", "всего", "", "",
+        "К-во", "Цена", "Сумма", ""
+    ]
+
+    data = [headers, fot_labels]
+    data_summary = []
+
+    # Ширины столбцов
+    col_widths = [
+        10 * mm, 53 * mm, 15 * mm, 15 * mm,
+        21 * mm, 21 * mm, 53 * mm, 15 * mm,
+        15 * mm, 21 * mm, 21 * mm, 22 * mm
+    ]
+
+    work_start_rows = {}
+    section_start_rows = {}
+
+    lines_count = max(snapshot_lines_count(snapshot), 1)
+    lines_done = 0
+    next_report = REPORT_EVERY_LINES
+
+    for section_idx, section in enumerate(snapshot.sections, 1):
+        # Добавляем строку с разделом
+        section_row = [Paragraph(section.name, table_header_style)] + [Paragraph("", table_text_style) for _ in range(len(headers) - 1)]
+        data.append(section_row)
+        section_start_rows[section_idx] = len(data) - 1
+
+        for work_idx, work in enumerate(section.works, 1):
+            work_row = [
+                Paragraph(str(work_idx), table_text_style),
+                Paragraph(safe_str(work.name, "-"), table_text_style),
+                Paragraph(safe_str(work.unit, "-"), table_text_style),
+                Paragraph(safe_str(work.quantity, ""), table_text_style),
+                Paragraph(safe_format_float(work.labor_cost, "0.0"), table_text_style),
+                Paragraph(safe_format_float(work.total_work, "0.0"), table_text_style),
+            ]
+
+            if work.materials:
+                first_material = work.materials[0]
+                total_sum = work.total
+
+                work_row.extend([
+                    Paragraph(safe_str(first_material.name, "-"), table_text_style),
+                    Paragraph(safe_str(first_material.unit, "-"), table_text_style),
+                    Paragraph(safe_str(first_material.quantity, ""), table_text_style),
+                    Paragraph(safe_format_float(first_material.price, "0.0"), table_text_style),
+                    Paragraph(safe_format_float(work.total_materials, "0.0"), table_text_style),
+                    Paragraph(safe_format_float(total_sum, "0.0"), table_text_style)
+                ])
+
+                data.append(work_row)
+                work_start_rows[(section_idx, work_idx)] = len(data) - 1
+
+                for material in work.materials[1:]:
+                    material_row = [
+                        Paragraph("", table_text_style),
+                        Paragraph("", table_text_style),
+                        Paragraph("", table_text_style),
+                        Paragraph("", table_text_style),
+                        Paragraph("", table_text_style),
+                        Paragraph("", table_text_style),
+                        Paragraph(safe_str(material.name, "-"), table_text_style),
+                        Paragraph(safe_str(material.unit, "-"), table_text_style),
+                        Paragraph(safe_str(material.quantity, ""), table_text_style),
+                        Paragraph(safe_format_float(material.price, "0.0"), table_text_style),
+                        Paragraph(safe_format_float(work.total_materials, "0.0"), table_text_style),
+                        Paragraph("", table_text_style)
+                    ]
+                    data.append(material_row)
+            else:
+                data.append(work_row)
+                work_start_rows[(section_idx, work_idx)] = len(data) - 1
+
+            lines_done += len(work.materials) or 1
+            if lines_done >= next_report:
+                report(PREPARE_SHARE * lines_done // lines_count)
+                next_report += REPORT_EVERY_LINES
+
+    totals = snapshot.totals
+
+    summary_data = [
+        [
+            Paragraph(
+                "Доставка материала, работа грузчиков, подъем материала, тарирование мусора, вынос/вывоз мусора (15% от стоимости материалов):",
+                summary_text_style),
+            *[Paragraph("", table_text_style) for _ in range(10)],
+            Paragraph(safe_format_float(totals.delivery, "0.0"), summary_value_style)
+        ],
+        [
+            Paragraph("Сметный расчёт", summary_title_style),
+            *[Paragraph("", table_text_style) for _ in range(11)]
+        ],
+        [
+            Paragraph("Итого без НДС:", summary_text_style),
+            *[Paragraph("", table_text_style) for _ in range(10)],
+            Paragraph(safe_format_float(totals.total, "0.0"),
+                      summary_value_style)
+        ],
+        [
+            Paragraph("В т.ч. ФОТ:", summary_text_style),
+            *[Paragraph("", table_text_style) for _ in range(10)],
+            Paragraph(safe_format_float(totals.works, "0.0"), summary_value_style)
+        ],
+        [
+            Paragraph("В т.ч. Материалы:", summary_text_style),
+            *[Paragraph("", table_text_style) for _ in range(10)],
+            Paragraph(safe_format_float(totals.materials, "0.0"), summary_value_style)
+        ]
+    ]
+
+    # Преобразуем данные в Paragraph
+    table_data = []
+    for i, row in enumerate(data):
+        if i == 0:  # Заголовки
+            table_data.append([Paragraph(cell, table_header_style) for cell in headers])
+        elif i == 1:
+            table_data.append([Paragraph(str(label), table_header_style) for label in fot_labels])
+        else:
+            table_data.append(row)
+            # table_data.append([Paragraph(cell, table_text_style) for cell in row])
+
+    # Создаем таблицу
+    table = LongTable(table_data, colWidths=col_widths, repeatRows=2)
+    table_summary = LongTable(summary_data, colWidths=col_widths)
+
+    # Настройка стиля таблицы
+    table_style = [
+        ('SPAN', (4, 0), (5, 0)),
+        ('ALIGN', (4, 0), (4, 0), 'CENTER'),
+
+        ('SPAN', (7, 0), (10, 0)),
+        ('ALIGN', (4, 0), (4, 0), 'CENTER'),
+
+        ('SPAN', (0, 0), (0, 1)),
+        ('SPAN', (1, 0), (1, 1)),
+        ('SPAN', (2, 0), (2, 1)),
+        ('SPAN', (3, 0), (3, 1)),
+        ('SPAN', (6, 0), (6, 1)),
+        ('SPAN', (7, 0), (7, 1)),
+        ('SPAN', (11, 0), (11, 1)),
+
+        ('BACKGROUND', (0, 0), (-1, 1), colors.lightgrey),
+        ('TEXTCOLOR', (0, 0), (-1, 1), colors.black),
+        ('FONTNAME', (0, 0), (-1, 1), 'Arial-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, 1), 4),
+
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+        ('ALIGN', (6, 0), (6, -1), 'LEFT'),
+        ('ALIGN', (4, 0), (-1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Arial-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 4),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('WORDWRAP', (1, 0), (1, -1), True),
+        ('WORDWRAP', (6, 0), (6, -1), True),
+    ]
+
+    for section_idx, start_section_row in section_start_rows.items():
+        table_style.extend([
+            ('SPAN', (0, start_section_row), (11, start_section_row)),
+            ('BACKGROUND', (0, start_section_row), (11, start_section_row), colors.whitesmoke),
+            ('FONTNAME', (0, start_section_row), (11, start_section_row), 'Arial-Bold'),
+            ('ALIGN', (0, start_section_row), (11, start_section_row), 'CENTER'),  # Выравнивание по горизонтали
+            ('VALIGN', (0, start_section_row), (11, start_section_row), 'MIDDLE')
+        ])
+
+    for (s_idx, w_idx), start_row in work_start_rows.items():
+        work = snapshot.sections[s_idx - 1].works[w_idx - 1]
+        end_row = start_row
+        if work.materials:
+            end_row = start_row + len(work.materials) - 1
+
+        if end_row > start_row:
+            for col in [0, 1, 2, 3, 4, 5, 10, 11]:
+                table_style.append(('SPAN', (col, start_row), (col, end_row)))
+
+    summary_style = [
+        ('SPAN', (0, 0), (10, 0)),
+        ('SPAN', (0, 1), (11, 1)),
+        ('ALIGN', (0, 1), (0, 1), 'CENTER'),
+        ('BACKGROUND', (0, 1), (11, 1), colors.lightgrey),
+        ('TEXTCOLOR', (0, 1), (11, 1), colors.black),
+        ('SPAN', (0, 2), (10, 2)),
+        ('SPAN', (0, 3), (10, 3)),
+        ('SPAN', (0, 4), (10, 4)),
+        ('FONTNAME', (0, 0), (11, -1), 'Arial-Bold'),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+        ('ALIGN', (4, 0), (-1, -1), 'RIGHT'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE')
+    ]
+
+    table.setStyle(TableStyle(table_style))
+    table_summary.setStyle(TableStyle(summary_style))
+    elements.append(table)
+    elements.append(Spacer(1, 10 * mm))
+    elements.append(table_summary)
+
+    # Генерация PDF: ход верстки считаем по страницам, их число оцениваем по количеству строк
+    expected_pages = lines_count // LINES_PER_PAGE + 1
+
+    def on_build_progress(kind, value):
+        if kind == 'PAGE':
+            report(PREPARE_SHARE + (99 - PREPARE_SHARE) * min(value, expected_pages) // expected_pages)
+
+    doc.setProgressCallBack(on_build_progress)
+    doc.build(elements)
@@ -1,5 +1,127 @@
 import sqlite3
 
+from catalog_cache import catalog_cache, copy_rows
+
+# Размер страницы при постраничной выгрузке (не больше max-rows PostgREST)
+PAGE_SIZE = 1000
+
+# Локальная копия справочников (replica.LocalReplica), подключается из main.py
+_replica = None
+
+
+def set_replica(replica):
+    """Подключает локальную копию: при ее наличии справочники читаются из SQLite"""
+    global _replica
+    _replica = replica
+    catalog_cache.add_listener(replica.mark_dirty)
+
+
+def _read(tables, key, remote, local):
+    """Читает через кэш: из локальной копии, если она актуальна, иначе из Supabase"""
+    def load():
+        if _replica is not None and _replica.is_fresh(*tables):
+            return local()
+        try:
+            return remote()
+        except Exception:
+            # Нет связи — отвечаем из локальной копии, даже если она не досинхронизирована
+            if _replica is not None and _replica.has_data(*tables):
+                return local()
+            raise
+
+    return catalog_cache.get_or_load(tables, key, load)
+
+
+def iter_query_pages(make_query, page_size=PAGE_SIZE):
+    """Постранично выполняет запрос (make_query строит его заново с сортировкой)"""
+    offset = 0
+    while True:
+        page = make_query().range(offset, offset + page_size - 1).execute().data
+        if not page:
+            break
+
+        yield page
+
+        # Сервер мог отдать меньше строк, чем просили, поэтому идем до пустой страницы
+        offset += len(page)
+
+
+def iter_table_pages(supabase, name_of_table: str, sort_column='id', page_size=PAGE_SIZE):
+    """Постранично выгружает всю таблицу, не упираясь в лимит строк PostgREST"""
+    if sort_column == 'id':
+        # Пагинация по ключу: следующая страница начинается после последнего id
+        last_id = None
+        while True:
+            query = supabase.table(name_of_table).select('*')
+            if last_id is not None:
+                query = query.gt('id', last_id)
+            page = query.order('id', desc=False).limit(page_size).execute().data
+            if not page:
+                break
+
+            yield page
+
+            last_id = page[-1]['id']
+        return
+
+    def make_query():
+        query = supabase.table(name_of_table).select('*').order(sort_column, desc=False)
+        if name_of_table == 'section_work_category_relations':
+            return query.order('category_id', desc=False)
+
+        return query.order('id', desc=False)
+
+    yield from iter_query_pages(make_query, page_size)
+
+
+def fetch_all_pages(supabase, name_of_table: str, sort_column='id'):
+    rows = []
+    for page in iter_table_pages(supabase, name_of_table, sort_column):
+        rows.extend(page)
+
+    return rows
+
+
+def iter_sorted_pages(supabase, name_of_table: str, sort_column):
+    """Отдает отсортированную таблицу страницами: из кэша и копии — сразу целиком"""
+    tables, key = (name_of_table,), ('sorted', sort_column)
+
+    data = catalog_cache.get(tables, key)
+    if data is None and _replica is not None and _replica.is_fresh(name_of_table):
+        data = sort_by_id(supabase, name_of_table, sort_column)
+    if data is not None:
+        yield data
+        return
+
+    flight, is_leader = catalog_cache.start_flight(tables, key)
+    if not is_leader:
+        # Эту таблицу уже выгружает другой поток: дожидаемся его и отдаем результат целиком
+        try:
+            data = flight.result()
+        except Exception:
+            data = None
+        if data is not None:
+            yield copy_rows(data)
+            return
+        # Тот поток не догрузил таблицу — выгружаем ее сами, не регистрируя запрос повторно
+        flight = None
+
+    generation = catalog_cache.generation
+    rows = []
+    completed = False
+    try:
+        for page in iter_table_pages(supabase, name_of_table, sort_column):
+            rows.extend(page)
+            # Вызывающий получает свою копию страницы, а в кэш и ждущим уходят нетронутые строки
+            yield copy_rows(page)
+        completed = True
+    finally:
+        if completed:
+            catalog_cache.put(tables, key, rows, generation)
+        if flight is not None:
+            # Если загрузку прервали, ждущие получат None и выгрузят таблицу сами
+            catalog_cache.finish_flight(tables, key, flight, rows if completed else None)
+
 
 def get_price_by_name(db_path, name: str):
     connection = sqlite3.connect(db_path)
@@ -13,57 +135,75 @@ def get_price_by_name(db_path, name: str):
 
 
 def get_materials_by_category(supabase, name_of_category: str):
-    cat_id = supabase.table('materials_categories').select('id').eq('name', name_of_category).execute().data[0]['id']
-    response = supabase.table('materials').select('*').eq('category_id', cat_id).execute()
+    def load():
+        cat_id = supabase.table('materials_categories').select('id').eq('name', name_of_category).execute().data[0]['id']
+        return supabase.table('materials').select('*').eq('category_id', cat_id).execute().data
 
-    return response.data
+    return _read(('materials', 'materials_categories'), ('by_category', name_of_category), load,
+                 lambda: _replica.select_by_category_name('materials', name_of_category))
 
 
 def get_works_by_category(supabase, name_of_category: str):
-    cat_id = supabase.table('works_categories').select('id').eq('name', name_of_category).execute().data[0]['id']
-    response = supabase.table('works').select('*').eq('category_id', cat_id).execute()
+    def load():
+        cat_id = supabase.table('works_categories').select('id').eq('name', name_of_category).execute().data[0]['id']
+        return supabase.table('works').select('*').eq('category_id', cat_id).execute().data
 
-    return response.data
+    return _read(('works', 'works_categories'), ('by_category', name_of_category), load,
+                 lambda: _replica.select_by_category_name('works', name_of_category))
 
 
 def get_materials_by_substr(supabase, substr):
-    response = supabase.table('materials').select('*').ilike('name', f'%{substr}%').execute()
-
-    return response.data
+    return _read(
+        ('materials',), ('by_substr', substr),
+        lambda: supabase.table('materials').select('*').ilike('name', f'%{substr}%').execute().data,
+        lambda: _replica.select_by_substr('materials', substr, with_keywords=False)
+    )
 
 
 def get_entity_by_substr(supabase, name_of_table: str, substr, cat_id: int = 0):
-    if cat_id:
-        response = supabase.table(name_of_table).select('*').eq('category_id', cat_id).or_(f"name.ilike.%{substr}%,keywords.ilike.%{substr}%").execute()
-    else:
-        response = supabase.table(name_of_table).select('*').or_(f"name.ilike.%{substr}%,keywords.ilike.%{substr}%").execute()
+    def load():
+        if cat_id:
+            response = supabase.table(name_of_table).select('*').eq('category_id', cat_id).or_(f"name.ilike.%{substr}%,keywords.ilike.%{substr}%").execute()
+        else:
+            response = supabase.table(name_of_table).select('*').or_(f"name.ilike.%{substr}%,keywords.ilike.%{substr}%").execute()
+
+        return response.data
 
-    return response.data
+    return _read((name_of_table,), ('by_substr', substr, cat_id), load,
+                 lambda: _replica.select_by_substr(name_of_table, substr, cat_id))
 
 
 def get_works_by_substr(supabase, substr):
-    response = supabase.table('works').select('*').ilike('name', f'%{substr}%').execute()
-
-    return response.data
+    return _read(
+        ('works',), ('by_substr', substr),
+        lambda: supabase.table('works').select('*').ilike('name', f'%{substr}%').execute().data,
+        lambda: _replica.select_by_substr('works', substr, with_keywords=False)
+    )
 
 
 def get_all_table(supabase, name_of_table: str):
-    response = supabase.table(name_of_table).select('*').execute()
-    
-    return response.data
+    return _read(
+        (name_of_table,), ('all',),
+        lambda: fetch_all_pages(supabase, name_of_table, 'section_id' if name_of_table == 'section_work_category_relations' else 'id'),
+        lambda: _replica.select_all(name_of_table)
+    )
 
 
 def get_section_realtions(supabase, section_id):
-    response = supabase.table('section_work_category_relations').select('category_id').eq('section_id', section_id).execute()
-    
-    return response.data
+    return _read(
+        ('section_work_category_relations',), ('by_section', section_id),
+        lambda: supabase.table('section_work_category_relations').select('category_id').eq('section_id', section_id).execute().data,
+        lambda: _replica.select_section_relations(section_id)
+    )
 
 
 def get_entity_by_id(supabase, name_of_table: str, entity_id: int):
     if entity_id:
-        response = supabase.table(name_of_table).select('*').eq('id', entity_id).execute()
-    
-        return response.data
+        return _read(
+            (name_of_table,), ('by_id', entity_id),
+            lambda: supabase.table(name_of_table).select('*').eq('id', entity_id).execute().data,
+            lambda: _replica.select_by_id(name_of_table, entity_id)
+        )
     else:
         data = [{'id': 0, 'category_id': 0, 'name': '-', 'price': 0, 'unit': '-'}]
 
@@ -71,25 +211,89 @@ def get_entity_by_id(supabase, name_of_table: str, entity_id: int):
 
 
 def sort_by_id(supabase, name_of_table: str, sort_column):
-    response = supabase.table(name_of_table).select('*').order(sort_column, desc=False).execute()
-    
-    return response.data
+    return _read(
+        (name_of_table,), ('sorted', sort_column),
+        lambda: fetch_all_pages(supabase, name_of_table, sort_column),
+        lambda: _replica.select_all(name_of_table, order_by=sort_column)
+    )
 
 
 def get_section_by_name(supabase, name_of_section: str):
     if name_of_section:
-        response = supabase.table('sections').select('*').eq('name', name_of_section).execute()
+        data = _read(
+            ('sections',), ('by_name', name_of_section),
+            lambda: supabase.table('sections').select('*').eq('name', name_of_section).execute().data,
+            lambda: _replica.select_sections_by_name(name_of_section)
+        )
 
-        return response.data[0]['id']
+        return data[0]['id']
 
     return 0
 
 
 def get_categories_by_section_id(supabase, section_id):
     if section_id:
-        response = supabase.table('section_work_category_relations').select('works_categories:category_id(id, name)').eq('section_id', section_id).execute()
+        def load():
+            response = supabase.table('section_work_category_relations').select('works_categories:category_id(id, name)').eq('section_id', section_id).execute()
 
-        return [item['works_categories'] for item in response.data]
+            return [item['works_categories'] for item in response.data]
+
+        return _read(('section_work_category_relations', 'works_categories'), ('by_section', section_id), load,
+                     lambda: _replica.select_categories_by_section_id(section_id))
     else:
         return []
 
+
+def join_sections_with_categories(sections, relations, categories):
+    """Соединяет разделы с категориями работ через словари за линейное время"""
+    categories_by_id = {category['id']: category for category in categories}
+    categories_by_section = {}
+    for relation in relations:
+        category = categories_by_id.get(relation['category_id'])
+        if category is not None:
+            categories_by_section.setdefault(relation['section_id'], []).append(
+                {'id': category['id'], 'name': category['name']}
+            )
+
+    return [{
+        'id': section['id'],
+        'name': section['name'],
+        'categories': categories_by_section.get(section['id'], [])
+    } for section in sections]
+
+
+def get_sections_with_categories(supabase):
+    """Разделы с уже привязанными категориями работ одним запросом"""
+    tables = ('sections', 'section_work_category_relations', 'works_categories')
+
+    def load():
+        try:
+            response = supabase.table('sections').select(
+                'id, name, section_work_category_relations(works_categories:category_id(id, name))'
+            ).order('id', desc=False).execute()
+        except Exception as e:
+            # Встроенный select недоступен (нет внешних ключей) — соединяем на клиенте
+            print(f"Не удалось получить разделы одним запросом: {e}")
+            return join_sections_with_categories(
+                sort_by_id(supabase, 'sections', 'id'),
+                get_all_table(supabase, 'section_work_category_relations'),
+                get_all_table(supabase, 'works_categories')
+            )
+
+        return [{
+            'id': section['id'],
+            'name': section['name'],
+            'categories': [relation['works_categories'] for relation in section['section_work_category_relations']
+                           if relation.get('works_categories')]
+        } for section in response.data]
+
+    return _read(tables, ('with_categories',), load, lambda: join_sections_with_categories(
+        _replica.select_all('sections', order_by='id'),
+        _replica.select_all('section_work_category_relations'),
+        _replica.select_all('works_categories')
+    ))
+
+
+def get_cache_stats():
+    """Счетчики попаданий и промахов кэша справочников"""
+    return catalog_cache.stats()
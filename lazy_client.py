@@ -0,0 +1,35 @@
+import threading
+
+
+class LazyClient:
+    """Клиент, который создается в фоновом потоке; обращения к нему ждут окончания создания"""
+
+    def __init__(self, factory):
+        self._client = None
+        self._error = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._create, args=(factory,), daemon=True)
+        self._thread.start()
+
+    def _create(self, factory):
+        try:
+            self._client = factory()
+        except Exception as e:
+            print(f"Не удалось создать клиент: {e}")
+            self._error = e
+        finally:
+            self._ready.set()
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def wait(self):
+        """Дожидается создания клиента и возвращает его"""
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.wait(), name)
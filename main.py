@@ -1,22 +1,78 @@
+import time
+
+# Отсчет времени запуска ведем с самого начала, до тяжелых импортов
+startup_started = time.perf_counter()
+
 import os
-from supabase import create_client, Client
 from dotenv import load_dotenv
 from pathlib import Path
 import sys
+from PyQt6.QtCore import QObject, QEvent
 from PyQt6.QtWidgets import *
 from design.app_window import MainWindow
+import getters
+from lazy_client import LazyClient
+from replica import LocalReplica
+
+imports_finished = time.perf_counter()
+
+# ESTIMATE_STARTUP_TIMING=1 печатает, на что ушло время запуска, а при выходе — статистику кэша
+STARTUP_TIMING = os.getenv("ESTIMATE_STARTUP_TIMING") == "1"
 
 env_path = Path(__file__).parent / ".env"
 load_dotenv(env_path)
 
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_KEY")
-)
+
+def create_supabase_client():
+    # Сам пакет supabase импортируется долго, поэтому и импорт, и создание клиента идут в фоне
+    from supabase import create_client
+
+    return create_client(
+        os.getenv("SUPABASE_URL"),
+        os.getenv("SUPABASE_KEY")
+    )
+
+
+class FirstPaintTimer(QObject):
+    """Печатает разбивку времени запуска при первой отрисовке окна"""
+
+    def __init__(self, window_started, window_created):
+        super().__init__()
+        self.window_started = window_started
+        self.window_created = window_created
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Paint:
+            first_paint = time.perf_counter()
+            obj.removeEventFilter(self)
+            print(
+                f"Запуск: импорты {imports_finished - startup_started:.3f} с, "
+                f"создание окна {self.window_created - self.window_started:.3f} с, "
+                f"первая отрисовка {first_paint - self.window_created:.3f} с, "
+                f"всего {first_paint - startup_started:.3f} с"
+            )
+
+        return False
+
+
+supabase = LazyClient(create_supabase_client)
+
+# Локальная копия справочников: чтения идут из SQLite, синхронизация — в фоне
+replica = LocalReplica(str(Path(__file__).parent / "catalog.db"), supabase)
+getters.set_replica(replica)
+replica.sync_in_background()
 
 app = QApplication(sys.argv)
+if STARTUP_TIMING:
+    app.aboutToQuit.connect(lambda: print(f"Кэш справочников: {getters.get_cache_stats()}"))
 
+window_started = time.perf_counter()
 window = MainWindow(supabase)
+
+if STARTUP_TIMING:
+    first_paint_timer = FirstPaintTimer(window_started, time.perf_counter())
+    window.installEventFilter(first_paint_timer)
+
 window.show()
 
-sys.exit(app.exec())
\ No newline at end of file
+sys.exit(app.exec())
@@ -0,0 +1,306 @@
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import getters
+
+logger = logging.getLogger(__name__)
+
+# Колонки локальной копии для каждой зеркалируемой таблицы
+REPLICATED_TABLES = {
+    'works_categories': ['id', 'name'],
+    'materials_categories': ['id', 'name'],
+    'works': ['id', 'category_id', 'name', 'price', 'unit', 'keywords'],
+    'materials': ['id', 'category_id', 'name', 'price', 'unit', 'keywords'],
+    'sections': ['id', 'name'],
+    'section_work_category_relations': ['section_id', 'category_id'],
+}
+
+# Таблицы без собственного id всегда выгружаются целиком
+FULL_SYNC_TABLES = ['section_work_category_relations']
+
+# Сколько копия считается актуальной после синхронизации. Для таблиц без updated_at
+# срок считается от последней полной выгрузки: инкрементальная не видит правок и удалений
+REPLICA_TTL = timedelta(minutes=5)
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS works_categories (id INTEGER PRIMARY KEY, name TEXT, updated_at TEXT);
+    CREATE TABLE IF NOT EXISTS materials_categories (id INTEGER PRIMARY KEY, name TEXT, updated_at TEXT);
+    CREATE TABLE IF NOT EXISTS works (
+        id INTEGER PRIMARY KEY, category_id INTEGER, name TEXT, price REAL, unit TEXT, keywords TEXT, updated_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS materials (
+        id INTEGER PRIMARY KEY, category_id INTEGER, name TEXT, price REAL, unit TEXT, keywords TEXT, updated_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS sections (id INTEGER PRIMARY KEY, name TEXT, updated_at TEXT);
+    CREATE TABLE IF NOT EXISTS section_work_category_relations (
+        section_id INTEGER, category_id INTEGER, PRIMARY KEY (section_id, category_id)
+    );
+    CREATE INDEX IF NOT EXISTS works_category_idx ON works (category_id);
+    CREATE INDEX IF NOT EXISTS works_name_idx ON works (name);
+    CREATE INDEX IF NOT EXISTS materials_category_idx ON materials (category_id);
+    CREATE INDEX IF NOT EXISTS sections_name_idx ON sections (name);
+    CREATE TABLE IF NOT EXISTS sync_state (
+        name_of_table TEXT PRIMARY KEY,
+        watermark_column TEXT,
+        watermark TEXT,
+        synced_at TEXT,
+        full_synced_at TEXT
+    );
+"""
+
+
+class LocalReplica:
+    """Локальная SQLite-копия справочников с инкрементальной синхронизацией"""
+
+    def __init__(self, db_path, supabase=None):
+        self.db_path = db_path
+        self.supabase = supabase
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.create_function('py_lower', 1, lambda value: value.lower() if value else '')
+        self.connection.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._dirty_lock = threading.Lock()
+        self._dirty = set()
+        # Счетчик пометок по таблицам: пометка, сделанная во время синхронизации, не снимается ее окончанием
+        self._dirty_generation = {}
+        # Таблицы, ждущие фоновой синхронизации; ее ведет один поток, сколько бы записей ни пришло
+        self._pending = set()
+        self._refreshing = False
+
+    def has_data(self, *tables):
+        """Проверяет, что таблицы хотя бы раз были выгружены полностью"""
+        with self._lock:
+            synced = {row['name_of_table'] for row in self.connection.execute("SELECT name_of_table FROM sync_state")}
+
+        return all(name_of_table in synced for name_of_table in tables)
+
+    def _sync_states(self):
+        with self._lock:
+            return {row['name_of_table']: row for row in self.connection.execute("SELECT * FROM sync_state")}
+
+    def is_fresh(self, *tables):
+        """Можно ли отвечать из копии: таблицы выгружены, не изменялись и синхронизированы не дольше REPLICA_TTL назад
+
+        Устаревшие по сроку таблицы досинхронизируются в фоне.
+        """
+        with self._dirty_lock:
+            if any(name_of_table in self._dirty for name_of_table in tables):
+                return False
+
+        states = self._sync_states()
+        if not all(name_of_table in states for name_of_table in tables):
+            return False
+
+        now = datetime.now()
+        expired = [name_of_table for name_of_table in tables if self._is_expired(states[name_of_table], now)]
+        if expired:
+            self.sync_in_background(expired)
+            return False
+
+        return True
+
+    @staticmethod
+    def _is_expired(state, now):
+        synced_at = state['full_synced_at'] if state['watermark_column'] == 'id' else state['synced_at']
+        if synced_at is None:
+            return True
+
+        return now - datetime.fromisoformat(synced_at) >= REPLICA_TTL
+
+    def mark_dirty(self, name_of_table=None):
+        """Помечает таблицу устаревшей после записи и досинхронизирует ее в фоне"""
+        tables = list(REPLICATED_TABLES) if name_of_table is None else [name_of_table]
+        tables = [name for name in tables if name in REPLICATED_TABLES]
+        if not tables:
+            return
+
+        with self._dirty_lock:
+            self._dirty.update(tables)
+            for name in tables:
+                self._dirty_generation[name] = self._dirty_generation.get(name, 0) + 1
+        self.sync_in_background(tables)
+
+    def sync_in_background(self, tables=None):
+        """Ставит таблицы в очередь на синхронизацию; одновременно идет не больше одной фоновой синхронизации"""
+        with self._dirty_lock:
+            self._pending.update(tables or REPLICATED_TABLES)
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        thread = threading.Thread(target=self._sync_pending, daemon=True)
+        thread.start()
+
+    def _sync_pending(self):
+        while True:
+            with self._dirty_lock:
+                tables = [name_of_table for name_of_table in REPLICATED_TABLES if name_of_table in self._pending]
+                self._pending = set()
+                if not tables:
+                    self._refreshing = False
+                    return
+
+            self.sync(tables)
+
+    def sync(self, tables=None):
+        """Полная выгрузка при первом запуске и по истечении REPLICA_TTL для таблиц без updated_at,
+        в остальных случаях только новые и измененные строки"""
+        supabase = self.supabase
+        tables = tables or list(REPLICATED_TABLES)
+
+        with self._sync_lock:
+            for name_of_table in tables:
+                with self._dirty_lock:
+                    generation = self._dirty_generation.get(name_of_table, 0)
+                try:
+                    state = self._sync_states().get(name_of_table)
+                    if (name_of_table in FULL_SYNC_TABLES or state is None
+                            or (state['watermark_column'] == 'id' and self._is_expired(state, datetime.now()))):
+                        self._full_sync(supabase, name_of_table)
+                    else:
+                        self._incremental_sync(supabase, name_of_table)
+                    with self._dirty_lock:
+                        if self._dirty_generation.get(name_of_table, 0) == generation:
+                            self._dirty.discard(name_of_table)
+                except Exception:
+                    logger.exception("Не удалось синхронизировать таблицу %s", name_of_table)
+
+    def _full_sync(self, supabase, name_of_table):
+        sort_column = 'section_id' if name_of_table in FULL_SYNC_TABLES else 'id'
+        rows = getters.fetch_all_pages(supabase, name_of_table, sort_column)
+
+        with self._lock, self.connection:
+            self.connection.execute(f"DELETE FROM {name_of_table}")
+            self._write_rows(name_of_table, rows)
+            self._save_state(name_of_table, rows, None, None, full=True)
+
+    def _incremental_sync(self, supabase, name_of_table):
+        with self._lock:
+            state = self.connection.execute(
+                "SELECT watermark_column, watermark FROM sync_state WHERE name_of_table = ?", (name_of_table,)
+            ).fetchone()
+        watermark_column, watermark = state['watermark_column'], state['watermark']
+
+        # Без updated_at изменения существующих строк не видны по водяному знаку,
+        # поэтому измененную у нас таблицу выгружаем заново
+        with self._dirty_lock:
+            is_dirty = name_of_table in self._dirty
+        if watermark_column == 'id' and is_dirty:
+            self._full_sync(supabase, name_of_table)
+            return
+
+        def make_query():
+            query = supabase.table(name_of_table).select('*')
+            if watermark is not None and watermark_column == 'updated_at':
+                query = query.gte('updated_at', watermark)
+            elif watermark is not None:
+                query = query.gt('id', watermark)
+
+            return query.order('id', desc=False)
+
+        rows = [row for page in getters.iter_query_pages(make_query) for row in page]
+        remote_count = supabase.table(name_of_table).select('id', count='exact').limit(1).execute().count
+
+        with self._lock, self.connection:
+            self._write_rows(name_of_table, rows)
+            local_count = self.connection.execute(f"SELECT COUNT(*) FROM {name_of_table}").fetchone()[0]
+            # Удаления по водяному знаку не видны: если строк стало меньше, таблица выгружается заново
+            if remote_count is None or local_count == remote_count:
+                self._save_state(name_of_table, rows, watermark_column, watermark)
+                return
+
+        self._full_sync(supabase, name_of_table)
+
+    def _write_rows(self, name_of_table, rows):
+        columns = list(REPLICATED_TABLES[name_of_table])
+        if name_of_table not in FULL_SYNC_TABLES:
+            columns.append('updated_at')
+        placeholders = ', '.join('?' for _ in columns)
+
+        self.connection.executemany(
+            f"INSERT OR REPLACE INTO {name_of_table} ({', '.join(columns)}) VALUES ({placeholders})",
+            [tuple(row.get(column) for column in columns) for row in rows]
+        )
+
+    def _save_state(self, name_of_table, rows, previous_column, previous_watermark, full=False):
+        if name_of_table in FULL_SYNC_TABLES:
+            watermark_column, watermark = None, None
+        elif previous_column == 'updated_at' or (rows and 'updated_at' in rows[0]):
+            watermark_column = 'updated_at'
+            watermark = max((row['updated_at'] for row in rows if row['updated_at']), default=previous_watermark)
+        else:
+            watermark_column = 'id'
+            local_max = self.connection.execute(f"SELECT MAX(id) FROM {name_of_table}").fetchone()[0]
+            watermark = local_max if local_max is not None else previous_watermark
+
+        synced_at = datetime.now().isoformat()
+        if full:
+            full_synced_at = synced_at
+        else:
+            full_synced_at = self.connection.execute(
+                "SELECT full_synced_at FROM sync_state WHERE name_of_table = ?", (name_of_table,)
+            ).fetchone()[0]
+
+        self.connection.execute(
+            "INSERT OR REPLACE INTO sync_state (name_of_table, watermark_column, watermark, synced_at, full_synced_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (name_of_table, watermark_column, watermark, synced_at, full_synced_at)
+        )
+
+    def _select(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self.connection.execute(sql, params)]
+
+    def select_all(self, name_of_table, order_by=None):
+        columns = ', '.join(REPLICATED_TABLES[name_of_table])
+        sql = f"SELECT {columns} FROM {name_of_table}"
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+
+        return self._select(sql)
+
+    def select_by_id(self, name_of_table, entity_id):
+        columns = ', '.join(REPLICATED_TABLES[name_of_table])
+
+        return self._select(f"SELECT {columns} FROM {name_of_table} WHERE id = ?", (entity_id,))
+
+    def select_by_category_name(self, name_of_table, name_of_category):
+        columns = ', '.join(f"e.{column}" for column in REPLICATED_TABLES[name_of_table])
+
+        return self._select(
+            f"SELECT {columns} FROM {name_of_table} e JOIN {name_of_table}_categories c ON c.id = e.category_id "
+            f"WHERE c.name = ?", (name_of_category,)
+        )
+
+    def select_by_substr(self, name_of_table, substr, cat_id=0, with_keywords=True):
+        columns = ', '.join(REPLICATED_TABLES[name_of_table])
+        pattern = f"%{substr.lower()}%"
+        sql = f"SELECT {columns} FROM {name_of_table} WHERE (py_lower(name) LIKE ?"
+        params = [pattern]
+        if with_keywords:
+            sql += " OR py_lower(keywords) LIKE ?"
+            params.append(pattern)
+        sql += ")"
+        if cat_id:
+            sql += " AND category_id = ?"
+            params.append(cat_id)
+
+        return self._select(sql, params)
+
+    def select_sections_by_name(self, name_of_section):
+        return self._select("SELECT id, name FROM sections WHERE name = ?", (name_of_section,))
+
+    def select_section_relations(self, section_id):
+        return self._select(
+            "SELECT category_id FROM section_work_category_relations WHERE section_id = ?", (section_id,)
+        )
+
+    def select_categories_by_section_id(self, section_id):
+        return self._select(
+            "SELECT c.id, c.name FROM section_work_category_relations r "
+            "JOIN works_categories c ON c.id = r.category_id WHERE r.section_id = ?", (section_id,)
+        )
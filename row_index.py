@@ -0,0 +1,103 @@
+class RowIndex:
+    """Дерево Фенвика по высотам элементов: номер первой строки и поиск элемента по строке за O(log n)"""
+
+    def __init__(self, sizes=()):
+        self.sizes = list(sizes)
+        self._tree = []
+        self._valid = False
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def _rebuild(self):
+        # Построение за O(n): каждый узел отдает свою сумму родителю
+        tree = [0] + self.sizes
+        n = len(self.sizes)
+        for i in range(1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+
+        self._tree = tree
+        self._valid = True
+
+    def _ensure_tree(self):
+        if not self._valid:
+            self._rebuild()
+
+    def prefix(self, index):
+        """Сумма высот элементов до index (не включая его) — смещение первой строки элемента"""
+        self._ensure_tree()
+        tree = self._tree
+        s = 0
+        while index > 0:
+            s += tree[index]
+            index -= index & -index
+
+        return s
+
+    def total(self):
+        return self.prefix(len(self.sizes))
+
+    def add(self, index, delta):
+        """Меняет высоту элемента на delta"""
+        self.sizes[index] += delta
+        if not self._valid:
+            return
+
+        tree = self._tree
+        n = len(self.sizes)
+        index += 1
+        while index <= n:
+            tree[index] += delta
+            index += index & -index
+
+    def append(self, size):
+        """Добавляет элемент в конец без перестройки дерева"""
+        self.sizes.append(size)
+        if not self._valid:
+            return
+
+        n = len(self.sizes)
+        low = n - (n & -n)
+        self._tree.append(self.prefix(n - 1) - self.prefix(low) + size)
+
+    def insert(self, index, size):
+        """Вставляет элемент; при вставке не в конец дерево перестроится при следующем запросе"""
+        if index == len(self.sizes):
+            self.append(size)
+            return
+
+        self.sizes.insert(index, size)
+        self._valid = False
+
+    def pop(self, index):
+        """Удаляет элемент и возвращает его высоту"""
+        if index == len(self.sizes) - 1:
+            if self._valid:
+                self._tree.pop()
+            return self.sizes.pop()
+
+        self._valid = False
+        return self.sizes.pop(index)
+
+    def find(self, offset):
+        """Индекс элемента, которому принадлежит строка со смещением offset, или None"""
+        if offset < 0:
+            return None
+
+        self._ensure_tree()
+        tree = self._tree
+        n = len(self.sizes)
+
+        # Спуск по степеням двойки: ищем наибольший индекс с суммой не больше offset
+        index = 0
+        step = 1 << n.bit_length()
+        while step:
+            next_index = index + step
+            if next_index <= n and tree[next_index] <= offset:
+                index = next_index
+                offset -= tree[next_index]
+            step >>= 1
+
+        return index if index < n else None
@@ -0,0 +1,75 @@
+# Сколько последних слов запроса хранить вместе с найденными строками
+MAX_CACHED_WORDS = 256
+
+
+class SearchIndex:
+    """Инвертированный индекс по словам строк: номера строк, содержащих все слова запроса"""
+
+    def __init__(self):
+        self.row_count = 0
+        self.postings = {}
+        self._tokens_cache = {}
+        self._matches_cache = {}
+
+    def clear(self):
+        self.row_count = 0
+        self.postings = {}
+        self._tokens_cache = {}
+        self._matches_cache = {}
+
+    def rebuild(self, texts):
+        """Строит индекс заново"""
+        self.clear()
+        self.add_rows(texts)
+
+    def add_rows(self, texts):
+        """Дописывает строки в индекс, номера продолжают уже проиндексированные"""
+        postings = self.postings
+        for row, text in enumerate(texts, self.row_count):
+            for token in set(text.lower().split()):
+                rows = postings.get(token)
+                if rows is None:
+                    postings[token] = [row]
+                else:
+                    rows.append(row)
+            self.row_count = row + 1
+
+        self._tokens_cache = {}
+        self._matches_cache = {}
+
+    def rows_with_substring(self, word):
+        """Строки, в одном из слов которых встречается word"""
+        rows = self._matches_cache.get(word)
+        if rows is None:
+            # При наборе слово растет: ищем только среди слов, подошедших под его часть
+            candidates = self.postings.keys()
+            for cached_word, tokens in self._tokens_cache.items():
+                if cached_word in word and len(tokens) < len(candidates):
+                    candidates = tokens
+
+            if len(self._matches_cache) > MAX_CACHED_WORDS:
+                self._tokens_cache = {}
+                self._matches_cache = {}
+
+            # Слово запроса без пробелов, значит оно целиком внутри одного слова строки
+            tokens = [token for token in candidates if word in token]
+            self._tokens_cache[word] = tokens
+            rows = set().union(*(self.postings[token] for token in tokens))
+            self._matches_cache[word] = rows
+
+        return rows
+
+    def search(self, query):
+        """Отсортированные номера строк, в которых встречаются все слова запроса"""
+        words = query.lower().split()
+        if not words:
+            return list(range(self.row_count))
+
+        row_sets = sorted((self.rows_with_substring(word) for word in set(words)), key=len)
+        result = set(row_sets[0])
+        for rows in row_sets[1:]:
+            result &= rows
+            if not result:
+                break
+
+        return sorted(result)
@@ -1,3 +1,6 @@
+from catalog_cache import catalog_cache
+
+
 def update_name_material_category(supabase, id, new_name):
   response = (
     supabase.table("materials_categories")
@@ -5,6 +8,7 @@ def update_name_material_category(supabase, id, new_name):
     .eq("id", id)
     .execute()
   )
+  catalog_cache.invalidate('materials_categories')
   
 def update_name_work_category(supabase, id, new_name):
   response = (
@@ -13,6 +17,7 @@ def update_name_work_category(supabase, id, new_name):
     .eq("id", id)
     .execute()
   )
+  catalog_cache.invalidate('works_categories')
   
 def update_name_section(supabase, id, new_name):
   response = (
@@ -21,6 +26,7 @@ def update_name_section(supabase, id, new_name):
     .eq("id", id)
     .execute()
   )
+  catalog_cache.invalidate('sections')
   
 def add_material_category(supabase, name):
   response = (
@@ -28,6 +34,7 @@ def add_material_category(supabase, name):
     .insert({"name": name})
     .execute()
   )
+  catalog_cache.invalidate('materials_categories')
 
 def add_work_category(supabase, name):
   response = (
@@ -35,6 +42,7 @@ def add_work_category(supabase, name):
     .insert({"name": name})
     .execute()
   )
+  catalog_cache.invalidate('works_categories')
   
 def add_section(supabase, name):
   response = (
@@ -42,6 +50,7 @@ def add_section(supabase, name):
     .insert({"name": name})
     .execute()
   )
+  catalog_cache.invalidate('sections')
   return response
 
 def add_relations(supabase, relation_data):
@@ -50,6 +59,7 @@ def add_relations(supabase, relation_data):
     .insert(relation_data)
     .execute()
   )
+  catalog_cache.invalidate('section_work_category_relations')
   
 def update_name_of_materials(supabase, id, new_name):
   response = (
@@ -58,6 +68,7 @@ def update_name_of_materials(supabase, id, new_name):
     .eq("id", id)
     .execute()
   )
+  catalog_cache.invalidate('materials')
   
 def update_name_of_work(supabase, id, new_name):
   response = (
@@ -66,6 +77,7 @@ def update_name_of_work(supabase, id, new_name):
     .eq("id", id)
     .execute()
   )
+  catalog_cache.invalidate('works')
   
 def update_category_id_of_material(supabase, id, new_category_id):
   response = (
@@ -74,6 +86,7 @@ def update_category_id_of_material(supabase, id, new_category_id):
     .eq("id", id)
     .execute()
   )
+  catalog_cache.invalidate('materials')
   
 def update_category_id_of_work(supabase, id, new_category_id):
   response = (
@@ -82,6 +95,7 @@ def update_category_id_of_work(supabase, id, new_category_id):
     .eq("id", id)
     .execute()
   )
+  catalog_cache.invalidate('works')
   
 def update_price_of_material(supabase, id, new_price):
   response = (
@@ -90,6 +104,7 @@ def update_price_of_material(supabase, id, new_price):
     .eq("id", id)
     .execute()
   )
+  catalog_cache.invalidate('materials')
   
 def update_price_of_work(supabase, id, new_price):
   response = (
@@ -98,6 +113,7 @@ def update_price_of_work(supabase, id, new_price):
     .eq("id", id)
     .execute()
   )
+  catalog_cache.invalidate('works')
   
 def update_unit_of_materials(supabase, id, new_unit):
   response = (
@@ -106,6 +122,7 @@ def update_unit_of_materials(supabase, id, new_unit):
     .eq("id", id)
     .execute()
   )
+  catalog_cache.invalidate('materials')
   
 def update_unit_of_works(supabase, id, new_unit):
   response = (
@@ -114,6 +131,7 @@ def update_unit_of_works(supabase, id, new_unit):
     .eq("id", id)
     .execute()
   )
+  catalog_cache.invalidate('works')
 
 def update_keywords_of_work(supabase, id, new_keywords):
   response = (
@@ -122,6 +140,7 @@ def update_keywords_of_work(supabase, id, new_keywords):
     .eq("id", id)
     .execute()
   )
+  catalog_cache.invalidate('works')
 
 def update_keywords_of_materials(supabase, id, new_keywords):
   response = (
@@ -130,6 +149,20 @@ def update_keywords_of_materials(supabase, id, new_keywords):
     .eq("id", id)
     .execute()
   )
+  catalog_cache.invalidate('materials')
+  
+def changed_fields(original: dict, new: dict):
+    """Возвращает только поля, значения которых отличаются от исходных"""
+    return {column: value for column, value in new.items() if original.get(column) != value}
+
+def update_entity(supabase, name_of_table: str, id, changes: dict):
+    """Обновляет измененные поля записи одним запросом"""
+    if not changes:
+        return None
+
+    response = supabase.table(name_of_table).update(changes).eq('id', id).execute()
+    catalog_cache.invalidate(name_of_table)
+    return response
   
 def add_material(supabase, category_id, name, price, unit, keywords):
   response = (
@@ -143,6 +176,7 @@ def add_material(supabase, category_id, name, price, unit, keywords):
             })
     .execute()
   )
+  catalog_cache.invalidate('materials')
   
 def add_work(supabase, category_id, name, price, unit, keywords):
   response = (
@@ -156,6 +190,7 @@ def add_work(supabase, category_id, name, price, unit, keywords):
             })
     .execute()
   )
+  catalog_cache.invalidate('works')
   
 def delete_material_category(supabase, id):
   response = (
@@ -164,6 +199,7 @@ def delete_material_category(supabase, id):
     .eq("id", id)
     .execute()
   )
+  catalog_cache.invalidate('materials_categories')
   
 def delete_work_category(supabase, id):
   response = (
@@ -172,6 +208,7 @@ def delete_work_category(supabase, id):
     .eq("id", id)
     .execute()
   )
+  catalog_cache.invalidate('works_categories')
   
 def delete_section(supabase, id):
   relations_response = (
@@ -187,6 +224,8 @@ def delete_section(supabase, id):
       .eq("id", id)
       .execute()
   )
+  catalog_cache.invalidate('section_work_category_relations')
+  catalog_cache.invalidate('sections')
 
 def delete_relation(supabase, section_id, category_id):
     response = (
@@ -196,6 +235,15 @@ def delete_relation(supabase, section_id, category_id):
       .eq("category_id", category_id)
       .execute()
     )
+    catalog_cache.invalidate('section_work_category_relations')
+
+def delete_relations(supabase, section_id, category_ids):
+    """Удаляет несколько связей раздела одним запросом"""
+    if not category_ids:
+        return
+
+    supabase.table("section_work_category_relations").delete().eq("section_id", section_id).in_("category_id", list(category_ids)).execute()
+    catalog_cache.invalidate('section_work_category_relations')
   
 def delete_material(supabase, id):
   repsonse = (
@@ -204,6 +252,7 @@ def delete_material(supabase, id):
     .eq("id", id)
     .execute()
   )
+  catalog_cache.invalidate('materials')
   
 def delete_work(supabase, id):
   repsonse = (
@@ -212,6 +261,7 @@ def delete_work(supabase, id):
     .eq("id", id)
     .execute()
   )
+  catalog_cache.invalidate('works')
   
 def clear_table(supabase, name_of_table: str):
   repsonse = (
@@ -220,6 +270,7 @@ def clear_table(supabase, name_of_table: str):
     .neq('id', '00000000-0000-0000-0000-000000000000')
     .execute()
   )
+  catalog_cache.invalidate(name_of_table)
   
 def clear_relations_table(supabase, name_of_table: str):
   repsonse = (
@@ -228,6 +279,7 @@ def clear_relations_table(supabase, name_of_table: str):
     .neq('section_id', '00000000-0000-0000-0000-000000000000')
     .execute()
   )
+  catalog_cache.invalidate(name_of_table)
   
 def upsert_work(supabase, category_id, name, price, unit, keywords):
     """Обновляет или создает работу (без указания ID)"""
@@ -238,6 +290,7 @@ def upsert_work(supabase, category_id, name, price, unit, keywords):
         'unit': unit,
         'keywords': keywords
     }).execute()
+    catalog_cache.invalidate('works')
 
 def upsert_material(supabase, category_id, name, price, unit, keywords):
     """Обновляет или создает материал (без указания ID)"""
@@ -248,18 +301,21 @@ def upsert_material(supabase, category_id, name, price, unit, keywords):
         'unit': unit,
         'keywords': keywords
     }).execute()
+    catalog_cache.invalidate('materials')
 
 def upsert_work_category(supabase, name):
     """Обновляет или создает категорию работ"""
     supabase.table('works_categories').upsert({
         'name': name
     }).execute()
+    catalog_cache.invalidate('works_categories')
 
 def upsert_material_category(supabase, name):
     """Обновляет или создает категорию материалов"""
     supabase.table('materials_categories').upsert({
         'name': name
     }).execute()
+    catalog_cache.invalidate('materials_categories')
     
 def batch_insert_works_fast(supabase, items):
     """Быстрая пакетная вставка работ"""
@@ -271,6 +327,7 @@ def batch_insert_works_fast(supabase, items):
         'keywords': item['keywords']
     } for item in items]
     supabase.table('works').insert(data, returning='minimal').execute()
+    catalog_cache.invalidate('works')
     
 def batch_insert_sections_fast(supabase, items):
     """Быстрая пакетная вставка разделов"""
@@ -279,6 +336,7 @@ def batch_insert_sections_fast(supabase, items):
         'name': item['name']
     } for item in items]
     supabase.table('sections').insert(data, returning='minimal').execute()
+    catalog_cache.invalidate('sections')
     
 def batch_insert_relations_sections_fast(supabase, items):
     """Быстрая пакетная вставка зависимостей разделов с категориями работ"""
@@ -287,6 +345,7 @@ def batch_insert_relations_sections_fast(supabase, items):
         'category_id': item['category_id']
     } for item in items]
     supabase.table('section_work_category_relations').insert(data, returning='minimal').execute()
+    catalog_cache.invalidate('section_work_category_relations')
 
 def batch_insert_materials_fast(supabase, items):
     """Быстрая пакетная вставка материалов"""
@@ -298,22 +357,26 @@ def batch_insert_materials_fast(supabase, items):
         'keywords': item['keywords']
     } for item in items]
     supabase.table('materials').insert(data, returning='minimal').execute()
+    catalog_cache.invalidate('materials')
 
 def batch_insert_work_categories_fast(supabase, items):
     """Быстрая пакетная вставка категорий работ"""
     data = [{'name': item['name']} for item in items]
     supabase.table('works_categories').insert(data, returning='minimal').execute()
+    catalog_cache.invalidate('works_categories')
 
 def batch_insert_material_categories_fast(supabase, items):
     """Быстрая пакетная вставка категорий материалов"""
     data = [{'name': item['name']} for item in items]
     supabase.table('materials_categories').insert(data, returning='minimal').execute()
+    catalog_cache.invalidate('materials_categories')
     
 def batch_insert_work_categories_with_ids(supabase, items):
     """Пакетная вставка категорий работ с сохранением ID"""
     response = supabase.rpc('batch_insert_work_categories_with_ids', {
         'items': items
     }).execute()
+    catalog_cache.invalidate('works_categories')
     return response
 
 def batch_insert_material_categories_with_ids(supabase, items):
@@ -321,4 +384,48 @@ def batch_insert_material_categories_with_ids(supabase, items):
     response = supabase.rpc('batch_insert_material_categories_with_ids', {
         'items': items
     }).execute()
-    return response
\ No newline at end of file
+    catalog_cache.invalidate('materials_categories')
+    return response
+
+def stage_restore_rows(supabase, restore_id, name_of_table, chunk, rows):
+    """Загружает часть строк копии в restore_staging (повтор той же части ее перезаписывает)"""
+    supabase.table('restore_staging').upsert({
+        'restore_id': restore_id,
+        'name_of_table': name_of_table,
+        'chunk': chunk,
+        'rows': rows
+    }, on_conflict='restore_id,name_of_table,chunk', returning='minimal').execute()
+
+def commit_restore(supabase, restore_id, groups):
+    """Одной транзакцией на сервере заменяет таблицы групп загруженными строками, возвращает число строк"""
+    response = supabase.rpc('commit_restore', {
+        'p_restore_id': restore_id,
+        'p_groups': list(groups)
+    }).execute()
+    # Восстановление меняет сразу несколько связанных таблиц
+    catalog_cache.invalidate()
+    return response.data
+
+def discard_restore(supabase, restore_id):
+    """Удаляет загруженные части незавершенного восстановления"""
+    supabase.table('restore_staging').delete().eq('restore_id', restore_id).execute()
+
+def check_restore_rows(supabase):
+    """Вызывает restore_rows с пустым списком: ничего не пишет, но падает, если функции нет на сервере"""
+    supabase.rpc('restore_rows', {'p_table': 'works', 'p_rows': []}).execute()
+
+def restore_rows(supabase, name_of_table: str, rows):
+    """Записывает часть строк копии с их id функцией restore_rows; повтор той же части ничего не дублирует"""
+    if not rows:
+        return
+
+    supabase.rpc('restore_rows', {'p_table': name_of_table, 'p_rows': rows}).execute()
+    catalog_cache.invalidate(name_of_table)
+
+def delete_rows_by_ids(supabase, name_of_table: str, ids):
+    """Удаляет несколько строк одним запросом"""
+    if not ids:
+        return
+
+    supabase.table(name_of_table).delete().in_('id', list(ids)).execute()
+    catalog_cache.invalidate(name_of_table)
@@ -0,0 +1,174 @@
+-- Восстановление справочников из резервной копии.
+--
+-- Атомарное: клиент частями загружает строки копии в restore_staging (повтор части безопасен — ключ включает
+-- номер части), затем одним вызовом commit_restore заменяет таблицы выбранных групп в одной транзакции.
+-- При любой ошибке транзакция откатывается и справочники остаются такими, какими были.
+--
+-- По частям: каждая часть записывается вызовом restore_rows, повтор той же части ничего не дублирует.
+--
+-- Выполнить один раз в SQL Editor проекта Supabase.
+
+create table if not exists restore_staging (
+    restore_id uuid not null,
+    name_of_table text not null,
+    chunk integer not null,
+    rows jsonb not null,
+    created_at timestamptz not null default now(),
+    primary key (restore_id, name_of_table, chunk)
+);
+
+
+create or replace function commit_restore(p_restore_id uuid, p_groups text[])
+returns jsonb
+language plpgsql
+as $$
+declare
+    counts jsonb := '{}'::jsonb;
+    inserted bigint;
+begin
+    if 'works' = any(p_groups) then
+        -- Очистка от зависимых таблиц к главным
+        delete from section_work_category_relations where true;
+        delete from works where true;
+        delete from sections where true;
+        delete from works_categories where true;
+
+        insert into works_categories (id, name) overriding system value
+        select r.id, r.name
+        from restore_staging s
+        cross join lateral jsonb_array_elements(s.rows) with ordinality as e(value, position)
+        cross join lateral jsonb_populate_record(null::works_categories, e.value) as r
+        where s.restore_id = p_restore_id and s.name_of_table = 'works_categories'
+        order by s.chunk, e.position;
+        get diagnostics inserted = row_count;
+        counts := counts || jsonb_build_object('works_categories', inserted);
+
+        -- Работы, как и при восстановлении по частям, сохраняют id из копии
+        insert into works (id, category_id, name, price, unit, keywords) overriding system value
+        select r.id, r.category_id, r.name, r.price, r.unit, r.keywords
+        from restore_staging s
+        cross join lateral jsonb_array_elements(s.rows) with ordinality as e(value, position)
+        cross join lateral jsonb_populate_record(null::works, e.value) as r
+        where s.restore_id = p_restore_id and s.name_of_table = 'works'
+        order by s.chunk, e.position;
+        get diagnostics inserted = row_count;
+        counts := counts || jsonb_build_object('works', inserted);
+
+        insert into sections (id, name) overriding system value
+        select r.id, r.name
+        from restore_staging s
+        cross join lateral jsonb_array_elements(s.rows) with ordinality as e(value, position)
+        cross join lateral jsonb_populate_record(null::sections, e.value) as r
+        where s.restore_id = p_restore_id and s.name_of_table = 'sections'
+        order by s.chunk, e.position;
+        get diagnostics inserted = row_count;
+        counts := counts || jsonb_build_object('sections', inserted);
+
+        insert into section_work_category_relations (section_id, category_id)
+        select r.section_id, r.category_id
+        from restore_staging s
+        cross join lateral jsonb_array_elements(s.rows) as e(value)
+        cross join lateral jsonb_populate_record(null::section_work_category_relations, e.value) as r
+        where s.restore_id = p_restore_id and s.name_of_table = 'section_work_category_relations';
+        get diagnostics inserted = row_count;
+        counts := counts || jsonb_build_object('section_work_category_relations', inserted);
+
+        -- Следующие записи должны получать id после восстановленных
+        perform setval(pg_get_serial_sequence('works_categories', 'id'),
+                       coalesce((select max(id) from works_categories), 0) + 1, false);
+        perform setval(pg_get_serial_sequence('works', 'id'),
+                       coalesce((select max(id) from works), 0) + 1, false);
+        perform setval(pg_get_serial_sequence('sections', 'id'),
+                       coalesce((select max(id) from sections), 0) + 1, false);
+    end if;
+
+    if 'materials' = any(p_groups) then
+        delete from materials where true;
+        delete from materials_categories where true;
+
+        insert into materials_categories (id, name) overriding system value
+        select r.id, r.name
+        from restore_staging s
+        cross join lateral jsonb_array_elements(s.rows) with ordinality as e(value, position)
+        cross join lateral jsonb_populate_record(null::materials_categories, e.value) as r
+        where s.restore_id = p_restore_id and s.name_of_table = 'materials_categories'
+        order by s.chunk, e.position;
+        get diagnostics inserted = row_count;
+        counts := counts || jsonb_build_object('materials_categories', inserted);
+
+        insert into materials (id, category_id, name, price, unit, keywords) overriding system value
+        select r.id, r.category_id, r.name, r.price, r.unit, r.keywords
+        from restore_staging s
+        cross join lateral jsonb_array_elements(s.rows) with ordinality as e(value, position)
+        cross join lateral jsonb_populate_record(null::materials, e.value) as r
+        where s.restore_id = p_restore_id and s.name_of_table = 'materials'
+        order by s.chunk, e.position;
+        get diagnostics inserted = row_count;
+        counts := counts || jsonb_build_object('materials', inserted);
+
+        perform setval(pg_get_serial_sequence('materials_categories', 'id'),
+                       coalesce((select max(id) from materials_categories), 0) + 1, false);
+        perform setval(pg_get_serial_sequence('materials', 'id'),
+                       coalesce((select max(id) from materials), 0) + 1, false);
+    end if;
+
+    -- Загруженные части больше не нужны; заодно убираем остатки брошенных восстановлений
+    delete from restore_staging where restore_id = p_restore_id or created_at < now() - interval '1 day';
+
+    return counts;
+end;
+$$;
+
+
+create or replace function restore_rows(p_table text, p_rows jsonb)
+returns void
+language plpgsql
+as $$
+declare
+    column_list text;
+    update_list text;
+begin
+    if jsonb_array_length(p_rows) = 0 then
+        return;
+    end if;
+
+    -- У связей нет id: добавляются только пары, которых еще нет
+    if p_table = 'section_work_category_relations' then
+        insert into section_work_category_relations (section_id, category_id)
+        select distinct r.section_id, r.category_id
+        from jsonb_populate_recordset(null::section_work_category_relations, p_rows) as r
+        where not exists (
+            select 1 from section_work_category_relations x
+            where x.section_id = r.section_id and x.category_id = r.category_id
+        );
+        return;
+    end if;
+
+    if p_table not in ('works_categories', 'materials_categories', 'works', 'materials', 'sections') then
+        raise exception 'restore_rows: таблица % не восстанавливается', p_table;
+    end if;
+
+    -- Записываются только колонки, которые есть в строках копии
+    select string_agg(quote_ident(a.attname), ', ' order by a.attnum),
+           string_agg(format('%1$I = excluded.%1$I', a.attname), ', ' order by a.attnum)
+               filter (where a.attname <> 'id')
+    into column_list, update_list
+    from pg_attribute a
+    where a.attrelid = p_table::regclass and a.attnum > 0 and not a.attisdropped and a.attgenerated = ''
+      and (p_rows -> 0) ? a.attname;
+
+    -- Строки вставляются с id из копии, существующие обновляются: повтор части ничего не дублирует
+    execute format(
+        'insert into %1$I (%2$s) overriding system value '
+        'select %2$s from jsonb_populate_recordset(null::%1$I, $1) '
+        'on conflict (id) do update set %3$s',
+        p_table, column_list, update_list
+    ) using p_rows;
+
+    -- Следующие записи должны получать id после восстановленных
+    execute format(
+        'select setval(pg_get_serial_sequence(%1$L, ''id''), coalesce(max(id), 0) + 1, false) from %1$I',
+        p_table
+    );
+end;
+$$;
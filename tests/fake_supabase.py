@@ -0,0 +1,181 @@
+"""Клиент Supabase в памяти для тестов: таблицы — списки словарей, запросы — цепочки как в postgrest-py"""
+
+
+class Response:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class Query:
+    def __init__(self, client, name_of_table):
+        self.client = client
+        self.name_of_table = name_of_table
+        self.filters = []
+        self.orders = []
+        self.bounds = None
+        self.columns = '*'
+        self.count = None
+        self.action = 'select'
+        self.payload = None
+
+    def select(self, columns='*', count=None):
+        self.columns = columns
+        self.count = count
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def neq(self, column, value):
+        self.filters.append(lambda row: row.get(column) != value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) > value)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) >= value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end + 1)
+        return self
+
+    def limit(self, count):
+        self.bounds = (0, count)
+        return self
+
+    def insert(self, rows, returning='representation'):
+        self.action, self.payload = 'insert', rows
+        return self
+
+    def upsert(self, rows, returning='representation', on_conflict='id'):
+        self.action, self.payload = 'upsert', rows
+        return self
+
+    def delete(self):
+        self.action = 'delete'
+        return self
+
+    def execute(self):
+        client = self.client
+        client.calls.append((self.name_of_table, self.action))
+        rows = client.tables.setdefault(self.name_of_table, [])
+        matched = [row for row in rows if all(condition(row) for condition in self.filters)]
+
+        if self.action == 'delete':
+            client.tables[self.name_of_table] = [row for row in rows if row not in matched]
+            return Response([dict(row) for row in matched])
+
+        if self.action in ('insert', 'upsert'):
+            payload = self.payload if isinstance(self.payload, list) else [self.payload]
+            by_id = {row['id']: row for row in rows if 'id' in row}
+            for item in payload:
+                item = dict(item)
+                if self.action == 'upsert' and item.get('id') in by_id:
+                    by_id[item['id']].update(item)
+                    continue
+                if 'id' not in item and self.name_of_table != 'section_work_category_relations':
+                    item['id'] = max((row['id'] for row in rows), default=0) + 1
+                rows.append(item)
+            return Response(None)
+
+        total = len(matched)
+        for column, desc in reversed(self.orders):
+            matched.sort(key=lambda row: row.get(column), reverse=desc)
+        if self.bounds is not None:
+            matched = matched[self.bounds[0]:self.bounds[1]]
+        # Как PostgREST с max-rows: больше max_rows строк за запрос не отдается
+        matched = matched[:client.max_rows]
+        if self.columns != '*':
+            columns = [column.strip() for column in self.columns.split(',')]
+            matched = [{column: row.get(column) for column in columns} for row in matched]
+
+        return Response([dict(row) for row in matched], total if self.count else None)
+
+
+class RpcCall:
+    def __init__(self, client, name, params):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        self.client.calls.append((self.name, 'rpc'))
+        if self.name not in self.client.functions:
+            raise RuntimeError(f"Could not find the function public.{self.name}")
+
+        return Response(self.client.functions[self.name](self.client, self.params))
+
+
+class FakeSupabase:
+    def __init__(self, tables=None, max_rows=1000):
+        self.tables = {name: [dict(row) for row in rows] for name, rows in (tables or {}).items()}
+        self.max_rows = max_rows
+        self.calls = []
+        self.functions = {}
+
+    def table(self, name_of_table):
+        return Query(self, name_of_table)
+
+    def rpc(self, name, params):
+        return RpcCall(self, name, params)
+
+
+def restore_rows(client, params):
+    """Поведение функции restore_rows из sql/restore_catalog.sql"""
+    name_of_table, rows = params['p_table'], params['p_rows']
+    table = client.tables.setdefault(name_of_table, [])
+
+    if name_of_table == 'section_work_category_relations':
+        pairs = {(row['section_id'], row['category_id']) for row in table}
+        for row in rows:
+            pair = (row['section_id'], row['category_id'])
+            if pair not in pairs:
+                pairs.add(pair)
+                table.append({'section_id': pair[0], 'category_id': pair[1]})
+        return None
+
+    by_id = {row['id']: row for row in table}
+    for row in rows:
+        if row['id'] in by_id:
+            by_id[row['id']].update(row)
+        else:
+            table.append(dict(row))
+
+    return None
+
+
+def catalog_tables(works_count=2500, materials_count=1200):
+    """Справочники, которые не помещаются в одну страницу выгрузки"""
+    return {
+        'works_categories': [{'id': i, 'name': f'Категория работ {i}'} for i in range(1, 21)],
+        'works': [
+            {'id': i, 'category_id': i % 20 + 1, 'name': f'Работа {i}', 'price': i * 1.5, 'unit': 'м2',
+             'keywords': f'работа {i}'}
+            for i in range(1, works_count + 1)
+        ],
+        'sections': [{'id': i, 'name': f'Раздел {i}'} for i in range(1, 11)],
+        'section_work_category_relations': [
+            {'section_id': section_id, 'category_id': category_id}
+            for section_id in range(1, 11) for category_id in range(section_id, section_id + 5)
+        ],
+        'materials_categories': [{'id': i, 'name': f'Категория материалов {i}'} for i in range(1, 11)],
+        'materials': [
+            {'id': i, 'category_id': i % 10 + 1, 'name': f'Материал {i}', 'price': i * 0.25, 'unit': 'шт',
+             'keywords': ''}
+            for i in range(1, materials_count + 1)
+        ],
+    }
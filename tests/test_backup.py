@@ -0,0 +1,159 @@
+import gzip
+import hashlib
+import json
+
+import pytest
+
+import backup
+from fake_supabase import FakeSupabase, catalog_tables, restore_rows
+
+
+def sorted_rows(name_of_table, rows):
+    return sorted(rows, key=backup.table_sort_key(name_of_table))
+
+
+@pytest.fixture
+def client():
+    return FakeSupabase(catalog_tables(), max_rows=1000)
+
+
+@pytest.mark.parametrize('file_name', ['catalog.ndjson', 'catalog.ndjson.gz'])
+def test_round_trip(client, tmp_path, file_name):
+    file_path = str(tmp_path / file_name)
+    progress = []
+
+    manifest = backup.write_backup(
+        client, file_path, ['works', 'materials'], progress=lambda name, rows: progress.append((name, rows))
+    )
+    data = backup.load_backup(file_path)
+
+    assert data['metadata']['type'] == 'full'
+    assert data['metadata']['tables'] == ['works', 'materials']
+    for name_of_table, rows in client.tables.items():
+        assert data[name_of_table] == sorted_rows(name_of_table, rows)
+        assert manifest[name_of_table]['rows'] == len(rows)
+        assert len(manifest[name_of_table]['hashes']) == len(rows)
+    assert data['metadata']['manifest'] == manifest
+    assert backup.read_manifest(file_path) == manifest
+    # Таблица больше страницы выгружается за несколько страниц, прогресс приходит после каждой
+    assert [rows for name, rows in progress if name == 'works'] == [1000, 2000, 2500]
+
+
+def test_manifest_checksum_covers_row_lines(client, tmp_path):
+    file_path = str(tmp_path / 'catalog.ndjson')
+    manifest = backup.write_backup(client, file_path, ['materials'])
+
+    digests = {}
+    current = None
+    with open(file_path, encoding='utf-8') as file:
+        for line in file:
+            record = json.loads(line)
+            if 'table' in record:
+                current = record['table']
+                digests[current] = hashlib.sha256()
+            elif 'row' in record:
+                digests[current].update(backup.row_to_json(record['row']).encode('utf-8'))
+
+    for name_of_table, digest in digests.items():
+        assert manifest[name_of_table]['sha256'] == digest.hexdigest()
+
+
+def test_gzip_file_is_compressed(client, tmp_path):
+    file_path = str(tmp_path / 'catalog.ndjson.gz')
+    backup.write_backup(client, file_path, ['works'])
+
+    with gzip.open(file_path, 'rt', encoding='utf-8') as file:
+        assert 'metadata' in json.loads(file.readline())
+
+
+def test_changed_row_is_detected(client, tmp_path):
+    file_path = tmp_path / 'catalog.ndjson'
+    backup.write_backup(client, str(file_path), ['materials'])
+
+    text = file_path.read_text(encoding='utf-8')
+    file_path.write_text(text.replace('"Материал 7"', '"Материал 8"', 1), encoding='utf-8')
+
+    with pytest.raises(backup.BackupError, match='контрольная сумма'):
+        backup.load_backup(str(file_path))
+
+
+def test_truncated_file_is_detected(client, tmp_path):
+    file_path = tmp_path / 'catalog.ndjson'
+    backup.write_backup(client, str(file_path), ['materials'])
+
+    lines = file_path.read_text(encoding='utf-8').splitlines(keepends=True)
+    file_path.write_text(''.join(lines[:-1]), encoding='utf-8')
+
+    with pytest.raises(backup.BackupError, match='нет манифеста'):
+        backup.load_backup(str(file_path))
+
+
+def test_cancelled_backup_leaves_no_file(client, tmp_path):
+    file_path = tmp_path / 'catalog.ndjson'
+
+    with pytest.raises(backup.BackupCancelled):
+        backup.write_backup(client, str(file_path), ['works'], is_cancelled=lambda: True)
+
+    assert not file_path.exists()
+
+
+def backup_data(client, tmp_path):
+    file_path = str(tmp_path / 'catalog.ndjson')
+    backup.write_backup(client, file_path, ['works', 'materials'])
+
+    return backup.load_backup(file_path)
+
+
+def test_restore_without_server_function_changes_nothing(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, 'RESTORE_RETRY_DELAY', 0)
+    data = backup_data(client, tmp_path)
+    before = {name: list(rows) for name, rows in client.tables.items()}
+
+    with pytest.raises(backup.BackupError, match='restore_rows'):
+        backup.run_restore(client, backup.restore_plan(data, ['works', 'materials']))
+
+    assert client.tables == before
+    assert not [call for call in client.calls if call[1] == 'delete']
+
+
+def test_cancelled_restore_returns_pending_steps(client, tmp_path):
+    client.functions['restore_rows'] = restore_rows
+    data = backup_data(client, tmp_path)
+    plan = backup.restore_plan(data, ['works'], chunk_size=500)
+    written = []
+
+    result = backup.run_restore(
+        client, plan, progress=lambda done, total, speed: written.append(done), is_cancelled=lambda: len(written) >= 2
+    )
+
+    assert result.errors == []
+    # Категории и первая часть работ записаны, остальное ждет повтора
+    assert result.rows == written[-1] == 20 + 500
+    assert set(result.pending) == {'works'}
+    assert len(client.tables['works']) == 500
+
+    resumed = backup.run_restore(client, result.pending)
+    assert not resumed.pending
+    for name_of_table in backup.BACKUP_GROUPS['works']:
+        assert sorted_rows(name_of_table, client.tables[name_of_table]) == data[name_of_table]
+
+
+def test_repeated_chunk_does_not_duplicate_rows(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, 'RESTORE_RETRY_DELAY', 0)
+    data = backup_data(client, tmp_path)
+    calls = []
+
+    def restore_rows_losing_responses(client, params):
+        # Строки записаны, но каждый второй ответ теряется по дороге
+        restore_rows(client, params)
+        calls.append(params['p_table'])
+        if params['p_rows'] and len(calls) % 2:
+            raise ConnectionError("ответ потерян")
+
+    client.functions['restore_rows'] = restore_rows_losing_responses
+    result = backup.run_restore(client, backup.restore_plan(data, ['works', 'materials'], chunk_size=300))
+
+    assert not result.pending
+    for name_of_table, rows in data.items():
+        if name_of_table != 'metadata':
+            assert sorted_rows(name_of_table, client.tables[name_of_table]) == rows
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+import backup
+from fake_supabase import FakeSupabase, catalog_tables
+
+
+@pytest.fixture
+def client():
+    return FakeSupabase(catalog_tables(works_count=1500, materials_count=300), max_rows=1000)
+
+
+def edit_catalog(client, step):
+    works = client.tables['works']
+    works[step]['price'] += 100
+    works.pop(10 + step)
+    works.append({'id': 5000 + step, 'category_id': 1, 'name': f'Новая работа {step}', 'price': 1.0, 'unit': 'м',
+                  'keywords': ''})
+    client.tables['section_work_category_relations'].pop(step)
+    client.tables['materials'][step]['name'] = f'Переименован {step}'
+
+
+def write_chain(client, directory):
+    full = str(directory / 'full.ndjson.gz')
+    backup.write_backup(client, full, ['works', 'materials'])
+    edit_catalog(client, 1)
+    first = str(directory / 'diff1.ndjson')
+    backup.write_backup(client, first, ['works', 'materials'], previous_path=full)
+    edit_catalog(client, 2)
+    second = str(directory / 'diff2.ndjson')
+    backup.write_backup(client, second, ['works', 'materials'], previous_path=first)
+
+    return full, first, second
+
+
+def test_chain_of_two_diffs_replays_to_full_backup(client, tmp_path):
+    full, first, second = write_chain(client, tmp_path)
+
+    assert backup.backup_chain(second) == [full, first, second]
+    # Разностные копии содержат только изменения
+    assert backup.read_manifest(second)['works']['rows'] == 3
+
+    replayed = backup.load_backup_chain(second)
+    reference_path = str(tmp_path / 'reference.ndjson')
+    backup.write_backup(client, reference_path, ['works', 'materials'])
+    reference = backup.load_backup(reference_path)
+
+    assert replayed['metadata']['chain'] == ['full.ndjson.gz', 'diff1.ndjson', 'diff2.ndjson']
+    for name_of_table in backup.BACKUP_GROUPS['works'] + backup.BACKUP_GROUPS['materials']:
+        assert replayed[name_of_table] == reference[name_of_table]
+
+
+def test_intermediate_state_replays_to_first_diff(client, tmp_path):
+    full, first, second = write_chain(client, tmp_path)
+
+    replayed = backup.load_backup_chain(first)
+
+    names = {row['id']: row['name'] for row in replayed['materials']}
+    assert names[2] == 'Переименован 1'
+    assert names[3] == 'Материал 3'
+
+
+def test_replaced_parent_is_rejected(client, tmp_path):
+    full, first, second = write_chain(client, tmp_path)
+
+    # На месте полной копии оказалась другая копия с тем же именем
+    client.tables['works'][0]['name'] = 'Подмена'
+    backup.write_backup(client, full, ['works', 'materials'])
+
+    with pytest.raises(backup.BackupError, match='заменена'):
+        backup.load_backup_chain(second)
+
+
+def test_diff_without_parent_hash_is_rejected(client, tmp_path):
+    full, first, second = write_chain(client, tmp_path)
+
+    with open(second, encoding='utf-8') as file:
+        lines = file.readlines()
+    header = json.loads(lines[0])
+    del header['metadata']['parent_sha256']
+    lines[0] = json.dumps(header, ensure_ascii=False) + '\n'
+    with open(second, 'w', encoding='utf-8') as file:
+        file.writelines(lines)
+
+    with pytest.raises(backup.BackupError, match='нет хэша'):
+        backup.backup_chain(second)
+
+
+def test_missing_parent_is_reported(client, tmp_path):
+    full, first, second = write_chain(client, tmp_path)
+    (tmp_path / 'diff1.ndjson').unlink()
+
+    with pytest.raises(backup.BackupError, match='Не найдена'):
+        backup.load_backup_chain(second)
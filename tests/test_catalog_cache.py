@@ -0,0 +1,103 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from catalog_cache import CatalogCache
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "условие не выполнилось"
+        time.sleep(0.001)
+
+
+def test_concurrent_callers_share_one_load():
+    cache = CatalogCache()
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return [{'id': 1, 'name': 'a'}]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [executor.submit(cache.get_or_load, ['works'], 'all', loader) for _ in range(8)]
+        wait_until(lambda: cache.coalesced == 7)
+        release.set()
+        results = [future.result(5) for future in futures]
+
+    assert len(calls) == 1
+    assert all(result == [{'id': 1, 'name': 'a'}] for result in results)
+    # Каждый получает свою копию строк
+    results[0][0]['name'] = 'changed'
+    assert results[1][0]['name'] == 'a'
+    assert cache.get_or_load(['works'], 'all', loader) == [{'id': 1, 'name': 'a'}]
+
+
+def test_failed_load_reaches_waiters_and_is_not_cached():
+    cache = CatalogCache()
+    release = threading.Event()
+
+    def failing_loader():
+        release.wait(5)
+        raise RuntimeError("нет связи")
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(cache.get_or_load, ['works'], 'all', failing_loader) for _ in range(3)]
+        wait_until(lambda: cache.coalesced == 2)
+        release.set()
+        for future in futures:
+            with pytest.raises(RuntimeError, match="нет связи"):
+                future.result(5)
+
+    assert cache.get(['works'], 'all') is None
+    assert cache.get_or_load(['works'], 'all', lambda: [{'id': 2}]) == [{'id': 2}]
+
+
+def test_invalidate_during_load_does_not_store_stale_result():
+    cache = CatalogCache()
+
+    def loader():
+        # Запись в таблицу, пока ответ еще в пути
+        cache.invalidate('works')
+        return [{'id': 1, 'price': 10}]
+
+    assert cache.get_or_load(['works'], 'all', loader) == [{'id': 1, 'price': 10}]
+    assert cache.get(['works'], 'all') is None
+
+    fresh = cache.get_or_load(['works'], 'all', lambda: [{'id': 1, 'price': 20}])
+    assert fresh == [{'id': 1, 'price': 20}]
+    assert cache.get(['works'], 'all') == [{'id': 1, 'price': 20}]
+
+
+def test_new_callers_do_not_join_load_started_before_invalidate():
+    cache = CatalogCache()
+    release = threading.Event()
+
+    def slow_loader():
+        release.wait(5)
+        return ['old']
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        stale = executor.submit(cache.get_or_load, ['works'], 'all', slow_loader)
+        wait_until(lambda: cache._in_flight)
+        cache.invalidate('works')
+
+        assert cache.get_or_load(['works'], 'all', lambda: ['new']) == ['new']
+        release.set()
+        assert stale.result(5) == ['old']
+
+    assert cache.get(['works'], 'all') == ['new']
+
+
+def test_invalidate_other_table_keeps_entry():
+    cache = CatalogCache()
+    cache.get_or_load(['works'], 'all', lambda: [{'id': 1}])
+
+    cache.invalidate('materials')
+
+    assert cache.get(['works'], 'all') == [{'id': 1}]
@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from design.classes import MaterialItem, SectionItem, WorkItem
+from estimate_batch import EstimateArrays, round_cents
+
+
+def to_cents(value):
+    return round(value * 100)
+
+
+def random_estimate(rng, sections_count=4, works_count=60):
+    # Половины копейки: количество кратно 0.5, цена с нечетным числом копеек
+    def quantity():
+        return rng.choice([round(rng.uniform(0, 50), 2), rng.randint(1, 40) / 2, 0.0])
+
+    def price():
+        return rng.choice([round(rng.uniform(0, 5000), 2), rng.randint(0, 999) / 100 + 0.01, 0.0])
+
+    estimate = [SectionItem() for _ in range(sections_count)]
+    for _ in range(works_count):
+        work = WorkItem()
+        work.quantity = quantity()
+        work.labor_cost = price()
+        work.materials = [MaterialItem() for _ in range(rng.randint(1, 4))]
+        for material in work.materials:
+            material.quantity = quantity()
+            material.price = price()
+        rng.choice(estimate).works.append(work)
+
+    return estimate
+
+
+def model_totals(estimate):
+    """Итоги так, как их построчно считает EstimateDataModel: round(..., 2) для каждой строки"""
+    section_cents = []
+    for section in estimate:
+        works_cents = materials_cents = 0
+        for work in section.works:
+            works_cents += to_cents(round(work.quantity * work.labor_cost, 2))
+            materials_total = 0
+            for material in work.materials:
+                materials_total += to_cents(round(material.quantity * material.price, 2))
+            materials_cents += materials_total
+        section_cents.append([works_cents, materials_cents])
+
+    return section_cents
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_compute_matches_model(seed):
+    estimate = random_estimate(random.Random(seed))
+    expected = model_totals(estimate)
+
+    arrays = EstimateArrays(estimate)
+    arrays.compute()
+
+    assert arrays.apply() == expected
+    for section in estimate:
+        for work in section.works:
+            assert work.total_work == round(work.quantity * work.labor_cost, 2)
+            for material in work.materials:
+                assert material.total == round(material.quantity * material.price, 2)
+            assert work.total_materials == round(sum(material.total for material in work.materials), 2)
+
+
+def test_round_cents_matches_round_on_half_cents():
+    values = [i / 1000 for i in range(-5000, 5000, 5)] + [0.125, 0.135, 1.005, 2.675, 1234.565, 0.285]
+
+    assert round_cents(values).tolist() == [round(round(value, 2) * 100) for value in values]
+
+
+def test_scale_prices_matches_round():
+    rng = random.Random(1)
+    estimate = random_estimate(rng)
+    prices = [material.price for section in estimate for work in section.works for material in work.materials]
+
+    arrays = EstimateArrays(estimate)
+    arrays.scale_prices(7.5)
+    arrays.compute()
+    arrays.apply()
+
+    scaled = [material.price for section in estimate for work in section.works for material in work.materials]
+    assert scaled == [round(price * 1.075, 2) for price in prices]
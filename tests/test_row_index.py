@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from row_index import RowIndex
+
+
+def expected_find(sizes, offset):
+    start = 0
+    for index, size in enumerate(sizes):
+        if start <= offset < start + size:
+            return index
+        start += size
+
+    return None
+
+
+def check(index, sizes):
+    assert len(index) == len(sizes)
+    for i in range(len(sizes) + 1):
+        assert index.prefix(i) == sum(sizes[:i])
+    for offset in range(-1, sum(sizes) + 2):
+        assert index.find(offset) == expected_find(sizes, offset)
+
+
+@pytest.mark.parametrize('count', [0, 1, 2, 7, 8, 9, 33])
+def test_prefix_and_find_match_list(count):
+    rng = random.Random(count)
+    sizes = [rng.randint(1, 5) for _ in range(count)]
+
+    check(RowIndex(sizes), sizes)
+
+
+def test_random_edits_match_list():
+    rng = random.Random(0)
+    sizes = [rng.randint(1, 4) for _ in range(10)]
+    index = RowIndex(sizes)
+
+    for _ in range(500):
+        action = rng.choice(['insert', 'append', 'pop', 'pop_last', 'add'])
+        if action == 'insert':
+            position, size = rng.randint(0, len(sizes)), rng.randint(1, 4)
+            sizes.insert(position, size)
+            index.insert(position, size)
+        elif action == 'append':
+            size = rng.randint(1, 4)
+            sizes.append(size)
+            index.append(size)
+        elif action == 'pop' and sizes:
+            position = rng.randrange(len(sizes))
+            assert index.pop(position) == sizes.pop(position)
+        elif action == 'pop_last' and sizes:
+            assert index.pop(len(sizes) - 1) == sizes.pop()
+        elif action == 'add' and sizes:
+            position = rng.randrange(len(sizes))
+            sizes[position] += 1
+            index.add(position, 1)
+
+        # Запрос после каждой правки: проверяется и обновление готового дерева, и ленивая перестройка
+        if rng.random() < 0.5:
+            check(index, sizes)
+
+    check(index, sizes)
+
+
+def test_append_to_built_tree_keeps_it_valid():
+    index = RowIndex([1, 2, 3])
+    assert index.total() == 6
+
+    for size in range(1, 20):
+        index.append(size)
+        assert index._valid
+        assert index.total() == 6 + size * (size + 1) // 2